@@ -0,0 +1,113 @@
+"""Memory / latency / recall benchmark for compressed FAISS index options.
+
+Compares index types (FAISS factory strings) at full and shortened embedding dimensions against the
+exact flat 3072-d baseline the service uses today.
+
+    python -m benchmarks.bench_index                                  # vectors from the hash embedder
+    python -m benchmarks.bench_index --embeddings data/chunks/index/embeddings.npz
+    python -m benchmarks.bench_index --replicas 8                     # simulate 8 rulebooks
+
+Shortened dimensions are produced the way text-embedding-3 `dimensions` works: keep the leading
+components and re-normalize. That is only meaningful for real OpenAI vectors; with the hash embedder
+the numbers show memory and latency, and recall is a pessimistic bound.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.build_index import build_faiss_index, make_chunks
+from src.embedders import HashEmbedder
+
+DEFAULT_DIMS = [3072, 1536, 1024, 512, 256]
+DEFAULT_FACTORIES = ["Flat", "SQfp16", "SQ8", "IVF16,Flat", "IVF16,SQ8", "HNSW32", "PQ{m}x4"]
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.embeddings:
+        with np.load(args.embeddings) as data:
+            return data["vectors"].astype(np.float32)
+    with open(args.normalized) as f:
+        chunks, _ = make_chunks([json.loads(line) for line in f if line.strip()])
+    return HashEmbedder(3072).embed([chunk["text"] for chunk in chunks])
+
+
+def shorten(vectors: np.ndarray, dim: int) -> np.ndarray:
+    short = np.ascontiguousarray(vectors[:, :dim])
+    norms = np.linalg.norm(short, axis=1, keepdims=True)
+    return short / np.where(norms == 0, 1, norms)
+
+
+def make_queries(vectors: np.ndarray, n: int, rng) -> np.ndarray:
+    """Queries near the corpus: a chunk, half of another chunk and a little noise."""
+    a = vectors[rng.integers(len(vectors), size=n)]
+    b = vectors[rng.integers(len(vectors), size=n)]
+    queries = a + 0.5 * b + rng.normal(scale=0.01, size=a.shape).astype(np.float32)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def replicate(vectors: np.ndarray, replicas: int, rng) -> np.ndarray:
+    """Stand-in for more rulebooks: perturbed copies of the corpus."""
+    copies = [vectors] + [vectors + rng.normal(scale=0.02, size=vectors.shape).astype(np.float32) for _ in range(replicas - 1)]
+    corpus = np.concatenate(copies)
+    return corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+
+
+def measure(index, queries: np.ndarray, k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies) * 1000
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", help="embeddings.npz written by src.build_index")
+    parser.add_argument("--normalized", default="data/normalized/rules.normalized.jsonl")
+    parser.add_argument("--dims", type=int, nargs="+", default=DEFAULT_DIMS)
+    parser.add_argument("--factories", nargs="+", default=DEFAULT_FACTORIES, help="{m} expands to dim // 32 PQ sub-quantizers")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)  # Per-request latency on one core, as in the service
+    rng = np.random.default_rng(0)
+    corpus = replicate(load_vectors(args), args.replicas, rng)
+    queries = make_queries(corpus, args.queries, rng)
+    baseline = build_faiss_index(corpus, "Flat")
+    truth, _ = measure(baseline, queries, args.k)
+    print(f"{len(corpus)} vectors, {args.queries} queries, recall@{args.k} against Flat @ {corpus.shape[1]}\n")
+    print(f"| {'index':<12} | {'dim':>4} | {'memory':>9} | {'bytes/vec':>9} | {'build s':>7} | {'p50 ms':>6} | {'p95 ms':>6} | recall@{args.k} |")
+    print(f"|{'-' * 14}|{'-' * 6}|{'-' * 11}|{'-' * 11}|{'-' * 9}|{'-' * 8}|{'-' * 8}|{'-' * 10}|")
+    for dim in args.dims:
+        vectors, dim_queries = shorten(corpus, dim), shorten(queries, dim)
+        for factory in args.factories:
+            spec = factory.format(m=max(1, dim // 32))
+            start = time.perf_counter()
+            index = build_faiss_index(vectors, spec)
+            build_seconds = time.perf_counter() - start
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is not None:
+                ivf.nprobe = args.nprobe
+            found, latencies = measure(index, dim_queries, args.k)
+            memory = len(faiss.serialize_index(index))
+            print(
+                f"| {spec:<12} | {dim:>4} | {memory / 2**20:>6.2f} MB | {memory / len(vectors):>9.0f} | {build_seconds:>7.2f} "
+                f"| {np.percentile(latencies, 50):>6.3f} | {np.percentile(latencies, 95):>6.3f} | {recall_at_k(found, truth):>8.3f} |"
+            )
+
+
+if __name__ == "__main__":
+    main()
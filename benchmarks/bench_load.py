@@ -0,0 +1,173 @@
+"""Load test: src.main under uvicorn against the local fake OpenAI server (benchmarks/fake_openai.py).
+
+Drives a fixed number of requests at a fixed concurrency into /query and /validate_call and reports
+latency percentiles, throughput and the per-stage timings from each response's Server-Timing header.
+Needs no network or API key, so it can gate CI:
+
+    python -m benchmarks.bench_load                                   # 200 requests, 16 in flight
+    python -m benchmarks.bench_load --requests 500 --concurrency 64 --chat-latency 0.8
+    python -m benchmarks.bench_load --max-p95-ms 1500                 # exit 1 when p95 regresses past 1.5 s
+    python -m benchmarks.bench_load --offline                         # USE_OPENAI=false: local embeddings and composed answers
+
+Questions get a unique suffix unless --repeat is given, so the embedding and answer caches miss.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_startup import REPO_DIR, build_bundle
+
+QUESTIONS = {
+    "/query": [
+        "What is the infield fly rule?",
+        "Can the pitcher fake a throw to first base?",
+        "What happens when a batted ball hits a runner?",
+        "How many innings does a pitcher need to rest after 66 pitches?",
+        "Rule 6.09(b)",
+        "Why do we have the dropped third strike rule?",
+    ],
+    "/validate_call": [
+        "Two outs, runner on first, dropped third strike, umpire called the batter out. Was that the right call?",
+        "No outs, bases loaded, the umpire called infield fly on a pop up to short. Correct call?",
+        "One out, runner on second, the umpire called a balk when the pitcher stepped off. Right call?",
+    ],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(app: str, port: int, cwd: str, env: dict, *uvicorn_args: str, stdout=subprocess.DEVNULL) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning", *uvicorn_args],
+        cwd=cwd, env=env, stdout=stdout, stderr=subprocess.PIPE,
+    )
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited: {process.stderr.read().decode()[-2000:]}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        timings[name] = float(duration)
+    return timings
+
+
+async def drive(base_url: str, args) -> list:
+    """(endpoint, status, latency ms, server timings) per request."""
+    plan = []
+    for i in range(args.requests):
+        # Spread the /validate_call share evenly through the run
+        endpoint = "/validate_call" if int((i + 1) * args.validate_share) > int(i * args.validate_share) else "/query"
+        questions = QUESTIONS[endpoint]
+        question = questions[i % len(questions)]
+        plan.append((endpoint, question if args.repeat else f"{question} (#{i})"))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one(endpoint, question):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(endpoint, params={"question": question})
+                except httpx.HTTPError:
+                    return endpoint, 0, (time.perf_counter() - start) * 1000, {}
+                return endpoint, response.status_code, (time.perf_counter() - start) * 1000, parse_server_timing(response.headers.get("server-timing", ""))
+        return await asyncio.gather(*(one(endpoint, question) for endpoint, question in plan))
+
+
+def report(results: list, elapsed: float) -> float:
+    print(f"{len(results)} requests in {elapsed:.2f}s: {len(results) / elapsed:.1f} req/s\n")
+    print(f"| {'endpoint':<15} | {'n':>5} | {'errors':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} |")
+    print(f"|{'-' * 17}|{'-' * 7}|{'-' * 8}|{'-' * 10}|{'-' * 10}|{'-' * 10}|")
+    groups = defaultdict(list)
+    for result in results:
+        groups[result[0]].append(result)
+    groups["all"] = results
+    for endpoint, rows in groups.items():
+        latencies = np.array([latency for _, status, latency, _ in rows if status == 200] or [np.nan])
+        errors = sum(1 for _, status, _, _ in rows if status != 200)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"| {endpoint:<15} | {len(rows):>5} | {errors:>6} | {p50:>8.1f} | {p95:>8.1f} | {p99:>8.1f} |")
+
+    stages = defaultdict(list)
+    for _, status, _, timings in results:
+        for stage, ms in timings.items():
+            stages[stage].append(ms)
+    print(f"\n| {'stage':<10} | {'requests':>8} | {'p50 ms':>8} | {'p95 ms':>8} |")
+    print(f"|{'-' * 12}|{'-' * 10}|{'-' * 10}|{'-' * 10}|")
+    for stage, values in sorted(stages.items(), key=lambda item: -np.median(item[1])):
+        print(f"| {stage:<10} | {len(values):>8} | {np.percentile(values, 50):>8.1f} | {np.percentile(values, 95):>8.1f} |")
+    ok = [latency for _, status, latency, _ in results if status == 200]
+    return float(np.percentile(ok, 95)) if ok else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--validate-share", type=float, default=0.25, help="Fraction of requests sent to /validate_call")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--repeat", action="store_true", help="Reuse the same questions (exercise the caches)")
+    parser.add_argument("--bundle", help="Bundle built with the hash embedder (default: build one)")
+    parser.add_argument("--normalized", default=os.path.join(REPO_DIR, "data/normalized/rules.normalized.jsonl"))
+    parser.add_argument("--max-p95-ms", type=float, help="Exit 1 if the overall p95 latency is higher")
+    parser.add_argument("--offline", action="store_true", help="Run the app with USE_OPENAI=false (no fake OpenAI server)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        bundle = os.path.abspath(args.bundle) if args.bundle else build_bundle(root, args.normalized)
+        fake_port, app_port = free_port(), free_port()
+        env = dict(
+            os.environ, PYTHONPATH=REPO_DIR, BUNDLE_PATH=bundle, OPENAI_API_KEY="sk-fake",
+            OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+            FAKE_OPENAI_EMBED_LATENCY=str(args.embed_latency), FAKE_OPENAI_CHAT_LATENCY=str(args.chat_latency),
+            EMBED_CACHE_PATH=os.path.join(root, "embedding_cache.db"), USE_OPENAI="false" if args.offline else "true",
+        )
+        processes = [] if args.offline else [start("benchmarks.fake_openai:app", fake_port, REPO_DIR, env)]
+        processes.append(start("src.main:app", app_port, root, env))
+        try:
+            if not args.offline:
+                asyncio.run(wait_ready(f"http://127.0.0.1:{fake_port}/docs", processes[0]))
+            asyncio.run(wait_ready(f"http://127.0.0.1:{app_port}/readyz", processes[-1]))
+            start_time = time.perf_counter()
+            results = asyncio.run(drive(f"http://127.0.0.1:{app_port}", args))
+            p95 = report(results, time.perf_counter() - start_time)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=30)
+    if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+        print(f"\np95 {p95:.1f} ms exceeds --max-p95-ms {args.max_p95_ms}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cold-start report for src.main: time until the app object exists (the port can be bound and
+/healthz answers) and the per-stage cost of load_services() until /readyz turns 200.
+
+Every run is a fresh interpreter, as on a Cloud Run cold start (the OS page cache stays warm).
+
+    python -m benchmarks.bench_startup                          # bundle built from the hash embedder
+    python -m benchmarks.bench_startup --bundle data/bundles --runs 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD = """
+import json, time
+start = time.perf_counter()
+import src.main as main
+imported = time.perf_counter() - start
+main.load_services()
+report = {"import src.main": imported, **{f"load: {k}": v for k, v in main.startup_report.items() if k != "total_since_import"}}
+report["ready"] = time.perf_counter() - start
+print(json.dumps(report))
+"""
+
+
+def build_bundle(root: str, normalized: str) -> str:
+    from src.build_index import build
+    from src.bundle import Bundle, write_bundle
+    from src.embedders import HashEmbedder
+    chunks_dir = os.path.join(root, "chunks")
+    build(normalized, chunks_dir, HashEmbedder(3072))
+    write_bundle(Bundle.from_build(chunks_dir), os.path.join(root, "bundles"))
+    return os.path.join(root, "bundles")
+
+
+def run(code: str, cwd: str, env: dict) -> str:
+    return subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True, capture_output=True, text=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bundle", help="Bundle dir or bundles root (default: build one with the hash embedder)")
+    parser.add_argument("--normalized", default=os.path.join(REPO_DIR, "data/normalized/rules.normalized.jsonl"))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        bundle = os.path.abspath(args.bundle) if args.bundle else build_bundle(root, args.normalized)
+        env = dict(os.environ, PYTHONPATH=REPO_DIR, BUNDLE_PATH=bundle, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-bench"))
+        reports = [json.loads(run(CHILD, root, env).strip().splitlines()[-1]) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts, bundle {bundle}\n")
+    print(f"| {'stage':<22} | {'median s':>8} | {'max s':>8} |")
+    print(f"|{'-' * 24}|{'-' * 10}|{'-' * 10}|")
+    for stage in reports[0]:
+        values = np.array([report[stage] for report in reports])
+        print(f"| {stage:<22} | {np.median(values):>8.3f} | {values.max():>8.3f} |")
+
+
+if __name__ == "__main__":
+    main()
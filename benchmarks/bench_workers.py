@@ -0,0 +1,162 @@
+"""Multi-worker scaling: memory per uvicorn worker and throughput as WEB_CONCURRENCY grows.
+
+For each worker count (and index mode) this starts `uvicorn src.main:app --workers N` on a hash-embedder
+bundle against the local fake OpenAI server, waits until every worker has loaded the bundle, reads each
+worker's RSS and PSS from /proc/<pid>/smaps_rollup and then drives a fixed load (as bench_load does).
+
+PSS charges a shared page to each of the processes mapping it in equal parts, so total PSS is the
+container's real footprint. With INDEX_MMAP=true the vectors' pages are shared by all workers (the
+"vectors" columns: RSS stays at one copy per worker while PSS drops as 1/N); with INDEX_MMAP=false every
+worker reads its own faiss copy. Linux only.
+
+    python -m benchmarks.bench_workers                                  # 1, 2 and 4 workers, mmap and heap
+    python -m benchmarks.bench_workers --workers 1,2,4,8 --modes mmap --requests 1000 --concurrency 128
+
+Throughput only scales up to the container's CPU count (and the fake OpenAI server's, a single process);
+the defaults use short fake latencies so the app's own CPU time is what limits it.
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_load import drive, free_port, start, wait_ready
+from benchmarks.bench_startup import REPO_DIR, build_bundle
+
+VECTORS_FILE = "rules.vectors.npy"
+
+
+def worker_pids(parent: int) -> list:
+    """uvicorn's worker processes: the children of the supervisor, minus multiprocessing's resource tracker."""
+    pids = []
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        if ppid == parent and b"resource_tracker" not in cmdline:
+            pids.append(int(pid))
+    return sorted(pids)
+
+
+def memory(pid: int) -> dict:
+    """MB of RSS, PSS and private memory for the process, and RSS/PSS of its vectors file mapping."""
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        rollup = {key: int(kb) for key, kb in re.findall(r"^(\w+):\s+(\d+) kB", f.read(), re.M)}
+    vectors = {"Rss": 0, "Pss": 0}
+    with open(f"/proc/{pid}/smaps") as f:
+        mapping = None
+        for line in f:
+            if re.match(r"^[0-9a-f]+-[0-9a-f]+ ", line):
+                mapping = line.rstrip().endswith(VECTORS_FILE)
+            elif mapping and line.split(":")[0] in vectors:
+                vectors[line.split(":")[0]] += int(line.split()[1])
+    return {
+        "rss": rollup["Rss"] / 1024, "pss": rollup["Pss"] / 1024,
+        "private": (rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0)) / 1024,
+        "vectors_rss": vectors["Rss"] / 1024, "vectors_pss": vectors["Pss"] / 1024,
+    }
+
+
+def wait_for_workers(log_path: str, workers: int, process, timeout: float = 120.0):
+    """Until every worker has printed that its services are ready (readyz only reaches one of them)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited: {process.stderr.read().decode()[-2000:]}")
+        with open(log_path) as f:
+            if f.read().count("DEBUG: Services ready") >= workers:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"{workers} workers not ready after {timeout}s")
+
+
+def run(workers: int, mode: str, root: str, env: dict, args) -> dict:
+    port = free_port()
+    log_path = os.path.join(root, f"uvicorn-{workers}-{mode}.log")
+    env = dict(env, INDEX_MMAP="true" if mode == "mmap" else "false", WEB_CONCURRENCY=str(workers),
+               EMBED_CACHE_PATH=os.path.join(root, f"embedding_cache-{workers}-{mode}.db"))  # Every run starts cold
+    with open(log_path, "w") as log:
+        process = start("src.main:app", port, root, env, "--workers", str(workers), stdout=log)
+    try:
+        asyncio.run(wait_ready(f"http://127.0.0.1:{port}/healthz", process))
+        wait_for_workers(log_path, workers, process)
+        pids = worker_pids(process.pid) if workers > 1 else [process.pid]  # One worker runs in the uvicorn process itself
+        before = [memory(pid) for pid in pids]
+        start_time = time.perf_counter()
+        results = asyncio.run(drive(f"http://127.0.0.1:{port}", args))
+        elapsed = time.perf_counter() - start_time
+        after = [memory(pid) for pid in pids]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    ok = [latency for _, status, latency, _ in results if status == 200]
+    return {
+        "workers": workers, "mode": mode, "pids": len(pids),
+        "rps": len(ok) / elapsed, "errors": len(results) - len(ok),
+        "p95": float(np.percentile(ok, 95)) if ok else float("nan"),
+        "idle": {key: np.mean([m[key] for m in before]) for key in before[0]},
+        "loaded": {key: np.mean([m[key] for m in after]) for key in after[0]},
+        "total_pss": sum(m["pss"] for m in after),
+    }
+
+
+def report(rows: list):
+    print(f"| {'workers':>7} | {'index':<5} | {'req/s':>7} | {'errors':>6} | {'p95 ms':>8} | {'RSS/worker':>10} | {'PSS/worker':>10} "
+          f"| {'private':>8} | {'vectors RSS':>11} | {'vectors PSS':>11} | {'total PSS':>9} |")
+    print(f"|{'-' * 9}|{'-' * 7}|{'-' * 9}|{'-' * 8}|{'-' * 10}|{'-' * 12}|{'-' * 12}|{'-' * 10}|{'-' * 13}|{'-' * 13}|{'-' * 11}|")
+    for row in rows:
+        m = row["loaded"]
+        print(f"| {row['workers']:>7} | {row['mode']:<5} | {row['rps']:>7.1f} | {row['errors']:>6} | {row['p95']:>8.1f} "
+              f"| {m['rss']:>7.1f} MB | {m['pss']:>7.1f} MB | {m['private']:>5.1f} MB | {m['vectors_rss']:>8.1f} MB "
+              f"| {m['vectors_pss']:>8.1f} MB | {row['total_pss']:>6.1f} MB |")
+    print("\nMemory after the load run, averaged over workers; idle (before the run) RSS/PSS per worker:")
+    for row in rows:
+        print(f"  {row['workers']} x {row['mode']}: {row['idle']['rss']:.1f} / {row['idle']['pss']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--modes", default="mmap,heap", help="mmap (INDEX_MMAP=true) and/or heap (each worker reads the faiss index)")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--validate-share", type=float, default=0.25, help="Fraction of requests sent to /validate_call")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--repeat", action="store_true", help="Reuse the same questions (exercise the caches)")
+    parser.add_argument("--bundle", help="Bundle built with the hash embedder (default: build one)")
+    parser.add_argument("--normalized", default=os.path.join(REPO_DIR, "data/normalized/rules.normalized.jsonl"))
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs\n")
+    with tempfile.TemporaryDirectory() as root:
+        bundle = os.path.abspath(args.bundle) if args.bundle else build_bundle(root, args.normalized)
+        fake_port = free_port()
+        env = dict(
+            os.environ, PYTHONPATH=REPO_DIR, BUNDLE_PATH=bundle, OPENAI_API_KEY="sk-fake",
+            OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+            FAKE_OPENAI_EMBED_LATENCY=str(args.embed_latency), FAKE_OPENAI_CHAT_LATENCY=str(args.chat_latency),
+            SESSION_DB_PATH=os.path.join(root, "sessions.db"),
+        )
+        fake = start("benchmarks.fake_openai:app", fake_port, REPO_DIR, env)
+        try:
+            asyncio.run(wait_ready(f"http://127.0.0.1:{fake_port}/docs", fake))
+            rows = [run(int(workers), mode, root, env, args) for workers in args.workers.split(",") for mode in args.modes.split(",")]
+        finally:
+            fake.terminate()
+            fake.wait(timeout=30)
+    report(rows)
+
+
+if __name__ == "__main__":
+    main()
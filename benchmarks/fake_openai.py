@@ -0,0 +1,93 @@
+"""Local stand-in for the OpenAI API, for load tests without a network or an API key.
+
+Serves /v1/embeddings (float or base64 encoding, `dimensions`) and /v1/chat/completions (plain and
+streamed) with deterministic output and a configurable latency per call:
+
+    FAKE_OPENAI_EMBED_LATENCY=0.05 FAKE_OPENAI_CHAT_LATENCY=0.5 uvicorn benchmarks.fake_openai:app --port 8100
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 uvicorn src.main:app
+
+Embeddings come from the hash embedder, so they match an index built with `--embedder hash`.
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from src.embedders import HashEmbedder
+
+EMBED_LATENCY = float(os.getenv("FAKE_OPENAI_EMBED_LATENCY", "0.05"))  # Seconds per embeddings call
+CHAT_LATENCY = float(os.getenv("FAKE_OPENAI_CHAT_LATENCY", "0.5"))  # Seconds per completion (spread over a stream)
+STREAM_CHUNKS = 20
+
+app = FastAPI()
+embedders = {}
+
+
+def completion_text(messages) -> str:
+    if messages[0]["content"].startswith("You are a baseball coach classifying"):
+        return "rule_reference"
+    question = messages[-1]["content"].rsplit("Question:", 1)[-1].strip().splitlines()[0][:200]
+    return (
+        f"**Ruling**: Deterministic ruling for: {question}\n**Why**: The fake OpenAI server always agrees with the rulebook.\n"
+        "**Rule References**: Rule 6.09(b)\n**Key Conditions Recap**: - None\n**Live/Dead Ball**: Live\n"
+        "**Example**: Two outs, runner on first.\n**Division Note**: Same in all divisions."
+    )
+
+
+def usage(messages, text: str) -> dict:
+    prompt_tokens = sum(len(message["content"].split()) for message in messages)
+    completion_tokens = len(text.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dim = body.get("dimensions") or 3072
+    embedder = embedders.setdefault(dim, HashEmbedder(dim))
+    await asyncio.sleep(EMBED_LATENCY)
+    vectors = embedder.embed(inputs)
+    if body.get("encoding_format") == "base64":
+        encode = lambda vector: base64.b64encode(vector.astype("<f4").tobytes()).decode()
+    else:
+        encode = lambda vector: vector.tolist()
+    tokens = sum(len(text.split()) for text in inputs)
+    return {
+        "object": "list",
+        "data": [{"object": "embedding", "index": i, "embedding": encode(vector)} for i, vector in enumerate(vectors)],
+        "model": body["model"],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    text = completion_text(body["messages"])
+    base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body["model"]}
+    if not body.get("stream"):
+        await asyncio.sleep(CHAT_LATENCY)
+        return {
+            **base, "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(body["messages"], text),
+        }
+
+    async def events():
+        words = text.split(" ")
+        step = max(1, len(words) // STREAM_CHUNKS)
+        for start in range(0, len(words), step):
+            await asyncio.sleep(CHAT_LATENCY / STREAM_CHUNKS)
+            piece = " ".join(words[start:start + step]) + (" " if start + step < len(words) else "")
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage(body['messages'], text)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import faiss
+import httpx
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DIM = 3072
+
+
+def fake_vector(text, dim=DIM):
+    """Deterministic unit vector for a piece of text."""
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+def doc(id, citation, div, text, **fields):
+    """A retrieved chunk of rule `citation` for the `div` tag, with any other `fields` (chapter, ...)."""
+    return {"id": id, "citation": citation, "title": f"rule.{citation} • rule • {div}", "text": text, **fields}
+
+
+@asynccontextmanager
+async def app_client(app):
+    """An httpx client that sends its requests to the ASGI `app` in process."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def request(app, method, path, **kwargs):
+    """Send one request to the ASGI `app` and return the response; `kwargs` as for httpx (params, json, ...)."""
+    async def send():
+        async with app_client(app) as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(send())
+
+
+class FakeOpenAI:
+    """Stand-in for AsyncOpenAI with a fixed per-call latency and deterministic responses."""
+
+    def __init__(self, latency=0.0, intent="rule_reference"):
+        self.latency = latency
+        self.intent = intent
+        self.calls = {"embeddings": 0, "chat": 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.overlapped = False  # An embedding and a chat call were in flight together
+        self.embedded = []  # `input` of each embeddings call
+        self._active = {"embeddings": 0, "chat": 0}
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _call(self, kind):
+        self.calls[kind] += 1
+        self.in_flight += 1
+        self._active[kind] += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.overlapped = self.overlapped or all(self._active.values())
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+            self._active[kind] -= 1
+
+    async def _embed(self, input, model, **kwargs):
+        self.embedded.append(list(input))
+        await self._call("embeddings")
+        return SimpleNamespace(data=[SimpleNamespace(embedding=fake_vector(text).tolist()) for text in input])
+
+    async def _chat(self, model, messages, **kwargs):
+        await self._call("chat")
+        if messages[0]["content"].startswith("You are a baseball coach classifying"):
+            content = self.intent
+        else:
+            content = "**Ruling**: Fake answer.\n**Rule References**: Rule 6.09(b)"
+        if kwargs.get("stream"):
+            return self._stream(content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(total_tokens=42),
+        )
+
+
+    async def _stream(self, content):
+        """Chunks like a streamed chat completion: a few words each, then a usage-only chunk."""
+        words = content.split(" ")
+        for start in range(0, len(words), 3):
+            text = " ".join(words[start:start + 3]) + (" " if start + 3 < len(words) else "")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+        yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=42))
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory):
+    """Copy of the repo's chunk data plus a FAISS index built from deterministic fake embeddings."""
+    root = tmp_path_factory.mktemp("umpiregpt")
+    shutil.copytree(os.path.join(REPO_DIR, "data"), root / "data")
+    with open(root / "data" / "chunks" / "rules.chunks.jsonl") as f:
+        vectors = np.stack([fake_vector(json.loads(line)["text"]) for line in f])
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors)
+    faiss.write_index(index, str(root / "data" / "chunks" / "index" / "rules.faiss"))
+    return root
+
+
+@pytest.fixture
+def cold_main(data_dir, tmp_path, monkeypatch):
+    """Freshly imported src.main running against the fixture data, before load_services() has run."""
+    os.symlink(data_dir / "data", tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY") or "sk-test")
+    sys.modules.pop("src.main", None)
+    yield importlib.import_module("src.main")
+    sys.modules.pop("src.main", None)
+
+
+@pytest.fixture
+def main(cold_main):
+    """src.main with its services loaded and OpenAI replaced by FakeOpenAI."""
+    cold_main.load_services()
+    fake = FakeOpenAI()
+    cold_main.rag.client = fake
+    cold_main.retriever.client = fake
+    cold_main.fake_openai = fake
+    return cold_main
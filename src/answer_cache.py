@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from .metrics import CACHE_LOOKUPS
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, threshold: float = 0.95):
+        """Semantic answer cache keyed on (division, intent, retrieved chunk ids) plus question similarity."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # entry id -> (key, unit vector, answer, tokens, created)
+        self._buckets = {}  # key -> set of entry ids
+        self._ids = count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(division: str, intent: str, chunk_ids: Iterable[str]) -> Tuple:
+        return (division, intent, frozenset(chunk_ids))
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self._buckets.clear()
+            self.version = version
+
+    def _drop(self, entry_id: int):
+        key = self._entries.pop(entry_id)[0]
+        bucket = self._buckets[key]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._buckets[key]
+
+    def lookup(self, division: str, intent: str, chunk_ids: Iterable[str], vector: np.ndarray, version=None) -> Optional[Tuple[str, int]]:
+        """Return (answer, tokens_used) of the most similar live entry above the threshold, if any."""
+        query = self._unit(vector)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(self._key(division, intent, chunk_ids), ())):
+                entry = self._entries[entry_id]
+                if now - entry[4] > self.ttl:
+                    self._drop(entry_id)
+                    continue
+                score = float(np.dot(query, entry[1]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            _, _, answer, tokens_used, _ = self._entries[best_id]
+            return answer, tokens_used
+
+    def store(self, division: str, intent: str, chunk_ids: Iterable[str], vector: np.ndarray, answer: str, tokens_used: int, version=None):
+        key = self._key(division, intent, chunk_ids)
+        with self._lock:
+            self._check_version(version)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (key, self._unit(vector), answer, tokens_used, time.time())
+            self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
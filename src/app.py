@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 from requests.adapters import HTTPAdapter
@@ -63,39 +64,49 @@ for msg in st.session_state.chat_history:
 # Chat input
 question = st.chat_input(placeholder="What do you want to know?")
 
+def stream_answer(session, url, question, division):
+    """Yield answer text from the server-sent `token` events of a /stream endpoint as they arrive.
+
+    Only the new question is sent; the server keeps the conversation under the session id it returns.
+    """
+    # Always send the division: "No Filters" clears the one the session last used
+    params = {"question": question, "session_id": st.session_state.get("session_id"), "division": division}
+    with session.get(url, params=params, stream=True, timeout=(10, 60)) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "token":
+                yield json.loads(line[len("data: "):])["text"]
+            elif line.startswith("data: ") and event == "done":
+                st.session_state.session_id = json.loads(line[len("data: "):])["session_id"]
+
 # Handle submission
 if question:
-    with st.spinner("Checking the rulebook..."):
-        try:
-            # Build context from last 3 messages
-            context = "\n".join(
-                [f"Q: {msg['question']}\nA: {msg['answer']}"
-                 for msg in st.session_state.chat_history[-3:]]
-            )
-            # Include division in the prompt
-            prompt = f"Division: {st.session_state.division}\nPrevious conversation:\n{context}\n\nCurrent question: {question}"
-            # Set up retry logic
-            session = requests.Session()
-            retries = Retry(total=3, backoff_factor=1, status_forcelist=[502, 503, 504])
-            session.mount('https://', HTTPAdapter(max_retries=retries))
-            # Use /validate_call for scenario-based questions, /query otherwise
-            endpoint = "/validate_call" if "umpire" in question.lower() or "call" in question.lower() else "/query"
-            response = session.get(
-                f"https://umpiregpt-v1-543806448733.us-central1.run.app{endpoint}",
-                params={"question": prompt},
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            if not result.get("answer"):
-                st.error("Received an empty response from the server. Please try again.")
-            else:
-                st.session_state.chat_history.append({
-                    "question": question,
-                    "answer": result["answer"]
-                })
-                st.rerun()
-        except requests.RequestException as e:
-            st.error(f"Error: Couldn't reach the server ({str(e)}). Try again!")
-        except ValueError as e:
-            st.error(f"Error: Invalid response format ({str(e)}). Try again!")
+    with st.chat_message("user"):
+        st.markdown(question)
+    try:
+        # Set up retry logic
+        session = requests.Session()
+        # Retry connection failures and 502/503/504 (after their Retry-After), but never a slow answer:
+        # the server answers within its own budget, and re-asking would only add load
+        retries = Retry(total=2, read=0, backoff_factor=1, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+        session.mount('https://', HTTPAdapter(max_retries=retries))
+        # Use /validate_call for scenario-based questions, /query otherwise
+        endpoint = "/validate_call" if "umpire" in question.lower() or "call" in question.lower() else "/query"
+        # Render tokens as the model produces them instead of waiting for the whole answer
+        with st.chat_message("assistant"):
+            answer = st.write_stream(stream_answer(session, f"https://umpiregpt-v1-543806448733.us-central1.run.app{endpoint}/stream", question, st.session_state.division))
+        if not answer:
+            st.error("Received an empty response from the server. Please try again.")
+        else:
+            st.session_state.chat_history.append({
+                "question": question,
+                "answer": answer
+            })
+            st.rerun()
+    except requests.RequestException as e:
+        st.error(f"Error: Couldn't reach the server ({str(e)}). Try again!")
+    except ValueError as e:
+        st.error(f"Error: Invalid response format ({str(e)}). Try again!")
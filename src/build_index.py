@@ -0,0 +1,176 @@
+"""Offline build of the retrieval artifacts from data/normalized/rules.normalized.jsonl.
+
+Writes, under --out-dir (default data/chunks):
+    rules.chunks.jsonl      one chunk per line, row i == FAISS id i
+    rules.idmap.csv         source_file,source_line,base_id,new_id
+    index/meta.json         ids, titles, citations, chapters, dim and the embedder used
+    index/embeddings.npz    chunk vectors with their content hashes, reused by the next build for unchanged chunks
+    index/rules.faiss       the FAISS index
+
+Usage:
+    python -m src.build_index                    # OpenAI text-embedding-3-large
+    python -m src.build_index --embedder hash    # deterministic local stand-in, no API key needed
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+MAX_CHUNK_CHARS = 1500
+
+
+def split_text(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """A record's text as is when it fits in max_chars, else split at sentence boundaries into pieces of at most max_chars.
+
+    Whitespace inside a piece is kept as in the source (line breaks in tables and lists carry meaning).
+    """
+    if len(text) <= max_chars:
+        return [text]
+    pieces, current = [], ""
+    sentences = re.split(r"(?<=[.;:])(\s+)", text)
+    for sentence, space in zip(sentences[::2], sentences[1::2] + [""]):
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current.rstrip())
+            current = ""
+        current += sentence + space
+    pieces.append(current.rstrip())
+    return pieces
+
+
+def make_chunks(records: List[Dict]) -> Tuple[List[Dict], List[List]]:
+    """Chunks (row order == FAISS id order) and the idmap rows for the normalized records."""
+    chunks, idmap_rows = [], []
+    for record in records:
+        meta = record.get("meta", {})
+        base_id = re.sub(r"-h[0-9a-f]{8}$", "", record["id"])  # Drop the de-duplication hash suffix
+        idmap_rows.append([meta.get("source_file", ""), meta.get("source_line", ""), base_id, record["id"]])
+        for n, text in enumerate(split_text(record.get("text", ""))):
+            chunks.append({
+                "id": f"{record['id']}#{n}",
+                "base_id": record["id"],
+                "title": record.get("title", ""),
+                "chapter": record.get("chapter", ""),
+                "citation": record.get("citation", ""),
+                "text": text,
+            })
+    return chunks, idmap_rows
+
+
+def content_hash(chunk: Dict, embedder_name: str) -> str:
+    """Hash of everything that affects a chunk's vector; a change means it must be re-embedded."""
+    return hashlib.sha1(f"{embedder_name}\x00{chunk['text']}".encode("utf-8")).hexdigest()
+
+
+def load_previous_vectors(index_dir: str) -> Dict[str, np.ndarray]:
+    """Content hash -> vector from the last build's embeddings.npz, if there is one."""
+    try:
+        with np.load(os.path.join(index_dir, "embeddings.npz")) as previous:
+            return dict(zip(previous["hashes"].tolist(), previous["vectors"]))
+    except (FileNotFoundError, KeyError, ValueError):
+        return {}
+
+
+def embed_chunks(chunks: List[Dict], embedder, previous: Dict[str, np.ndarray]) -> Tuple[np.ndarray, List[str], int]:
+    """Vectors for all chunks, embedding only those whose content hash is not in `previous`."""
+    hashes = [content_hash(chunk, embedder.name) for chunk in chunks]
+    todo = sorted({h: i for i, h in enumerate(hashes) if h not in previous}.values())
+    fresh = embedder.embed([chunks[i]["text"] for i in todo]) if todo else None
+    vectors_by_hash = dict(previous)
+    for n, i in enumerate(todo):
+        vectors_by_hash[hashes[i]] = fresh[n]
+    vectors = np.stack([vectors_by_hash[h] for h in hashes]).astype(np.float32) if hashes else np.zeros((0, 0), np.float32)
+    return vectors, hashes, len(todo)
+
+
+def build_faiss_index(vectors: np.ndarray, factory: str = "Flat"):
+    """FAISS index from a factory string: "Flat", "SQfp16", "SQ8", "PQ64x4", "IVF16,Flat", "IVF16,SQ8", "HNSW32"."""
+    import faiss
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def _replace(path: str, write):
+    """Write to a temp file and rename, so a crashed build never leaves a half-written artifact."""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build(normalized_path: str, out_dir: str, embedder, index_factory: str = "Flat") -> Dict:
+    import faiss
+    with open(normalized_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    chunks, idmap_rows = make_chunks(records)
+    index_dir = os.path.join(out_dir, "index")
+    os.makedirs(index_dir, exist_ok=True)
+
+    vectors, hashes, embedded = embed_chunks(chunks, embedder, load_previous_vectors(index_dir))
+    print(f"DEBUG: {len(chunks)} chunks, {embedded} embedded, {len(chunks) - embedded} reused")
+
+    def write_chunks(path):
+        with open(path, "w") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+
+    def write_idmap(path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["source_file", "source_line", "base_id", "new_id"])
+            writer.writerows(idmap_rows)
+
+    def write_meta(path):
+        with open(path, "w") as f:
+            json.dump({
+                "ids": [chunk["id"] for chunk in chunks],
+                "source_ids": ["" for _ in chunks],
+                "titles": [chunk["title"] for chunk in chunks],
+                "citations": [chunk["citation"] for chunk in chunks],
+                "chapters": [chunk["chapter"] for chunk in chunks],
+                "dim": int(vectors.shape[1]),
+                "embedder": embedder.name,
+                "index_factory": index_factory,
+            }, f)
+
+    def write_vectors(path):
+        with open(path, "wb") as f:
+            np.savez(f, vectors=vectors, hashes=np.array(hashes))
+
+    _replace(os.path.join(out_dir, "rules.chunks.jsonl"), write_chunks)
+    _replace(os.path.join(out_dir, "rules.idmap.csv"), write_idmap)
+    _replace(os.path.join(index_dir, "meta.json"), write_meta)
+    _replace(os.path.join(index_dir, "embeddings.npz"), write_vectors)
+    _replace(os.path.join(index_dir, "rules.faiss"), lambda path: faiss.write_index(build_faiss_index(vectors, index_factory), path))
+    return {"chunks": len(chunks), "embedded": embedded, "dim": int(vectors.shape[1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build rules.chunks.jsonl, rules.idmap.csv, meta.json and rules.faiss.")
+    parser.add_argument("--normalized", default="data/normalized/rules.normalized.jsonl")
+    parser.add_argument("--out-dir", default="data/chunks")
+    parser.add_argument("--embedder", choices=["openai", "hash"], default="openai")
+    parser.add_argument("--model", default="text-embedding-3-large")
+    parser.add_argument("--dim", type=int, default=None, help="Embedding dimensions (default: model native, 3072 for hash)")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--index-factory", default="Flat", help='FAISS index_factory string, e.g. "SQ8", "SQfp16", "IVF16,Flat", "HNSW32"')
+    args = parser.parse_args()
+
+    if args.embedder == "hash":
+        from .embedders import HashEmbedder
+        embedder = HashEmbedder(dim=args.dim or 3072)
+    else:
+        from .embedders import OpenAIEmbedder
+        embedder = OpenAIEmbedder(model=args.model, dimensions=args.dim, batch_size=args.batch_size)
+    stats = build(args.normalized, args.out_dir, embedder, args.index_factory)
+    print(f"Built {stats['chunks']} chunks ({stats['embedded']} embedded) at dim {stats['dim']} into {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
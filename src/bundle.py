@@ -0,0 +1,115 @@
+"""Versioned, prebuilt retrieval artifact bundles.
+
+A bundle is one directory holding everything the service loads at startup, plus a manifest:
+
+    data/bundles/CURRENT                    name of the live bundle
+    data/bundles/<version>/manifest.json    version, per-file sha1, FAISS size and dimension
+    data/bundles/<version>/rules.faiss
+    data/bundles/<version>/meta.json
+    data/bundles/<version>/rules.chunks.jsonl
+    data/bundles/<version>/rules.idmap.csv
+    data/bundles/<version>/rules.vectors.npy    flat indexes only: the vectors, mmapped by every worker
+
+The version is a hash of the file contents, so an unchanged build maps to the same bundle and
+CURRENT only moves when the artifacts change. Bundles are never modified in place, which keeps them
+safe to mmap while a new one is being written; all worker processes map the same pages.
+
+Usage:
+    python -m src.bundle                       # package data/chunks (after src.build_index) into data/bundles
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Optional
+
+# Bundle role -> file name, and where src.build_index writes it under data/chunks
+BUNDLE_FILES = {"index": "rules.faiss", "meta": "meta.json", "chunks": "rules.chunks.jsonl", "idmap": "rules.idmap.csv"}
+BUILD_LAYOUT = {"index": "index/rules.faiss", "meta": "index/meta.json", "chunks": "rules.chunks.jsonl", "idmap": "rules.idmap.csv"}
+
+
+class Bundle:
+    def __init__(self, paths: Dict[str, str], version: Optional[str] = None):
+        """Paths of the index, meta, chunks and idmap files the service loads (plus "vectors" when the bundle
+        has them); `version` is None for a plain build dir."""
+        self.paths = paths
+        self.version = version
+
+    @classmethod
+    def open(cls, path: str) -> "Bundle":
+        """A bundle directory, or a bundles root whose CURRENT file names the live bundle."""
+        current = os.path.join(path, "CURRENT")
+        if os.path.exists(current):
+            with open(current) as f:
+                path = os.path.join(path, f.read().strip())
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        paths = {role: os.path.join(path, name) for role, name in BUNDLE_FILES.items()}
+        if manifest.get("vectors"):
+            paths["vectors"] = os.path.join(path, manifest["vectors"])
+        return cls(paths, manifest["version"])
+
+    @classmethod
+    def from_build(cls, chunks_dir: str = "data/chunks", chunks_path: Optional[str] = None) -> "Bundle":
+        """The unversioned src.build_index output layout."""
+        paths = {role: os.path.join(chunks_dir, name) for role, name in BUILD_LAYOUT.items()}
+        if chunks_path:
+            paths["chunks"] = chunks_path
+        return cls(paths)
+
+
+def file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_bundle(source: Bundle, bundles_root: str) -> Bundle:
+    """Copy `source`'s files into a new versioned bundle under `bundles_root` and make it CURRENT."""
+    import faiss
+    from .mmap_index import VECTORS_FILE, flat_vectors, write_vectors
+    hashes = {role: file_sha1(source.paths[role]) for role in BUNDLE_FILES}
+    version = hashlib.sha1("".join(hashes[role] for role in sorted(hashes)).encode()).hexdigest()[:12]
+    bundle_dir = os.path.join(bundles_root, version)
+    if not os.path.exists(bundle_dir):
+        tmp_dir = f"{bundle_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for role, name in BUNDLE_FILES.items():
+            shutil.copyfile(source.paths[role], os.path.join(tmp_dir, name))
+        index = faiss.read_index(source.paths["index"])
+        vectors = flat_vectors(index)
+        if vectors is not None:
+            write_vectors(vectors, os.path.join(tmp_dir, VECTORS_FILE))
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+            json.dump({
+                "version": version,
+                "created": datetime.utcnow().isoformat(),
+                "files": {BUNDLE_FILES[role]: sha1 for role, sha1 in hashes.items()},
+                "ntotal": int(index.ntotal),
+                "dim": int(index.d),
+                "vectors": VECTORS_FILE if vectors is not None else None,
+            }, f, indent=2)
+        os.replace(tmp_dir, bundle_dir)
+    current_tmp = os.path.join(bundles_root, "CURRENT.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(current_tmp, os.path.join(bundles_root, "CURRENT"))
+    return Bundle.open(bundle_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Package the src.build_index output into a versioned bundle.")
+    parser.add_argument("--chunks-dir", default="data/chunks")
+    parser.add_argument("--out", default="data/bundles")
+    args = parser.parse_args()
+    bundle = write_bundle(Bundle.from_build(args.chunks_dir), args.out)
+    print(f"Bundle {bundle.version} is CURRENT in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
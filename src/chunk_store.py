@@ -0,0 +1,31 @@
+import hashlib
+import json
+import mmap
+from typing import Dict
+
+import numpy as np
+
+
+class ChunkStore:
+    def __init__(self, data_path: str):
+        """Memory-map the chunks file and index the byte offset of every line by FAISS row id."""
+        self.data_path = data_path
+        starts, ends = [], []
+        with open(data_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    starts.append(offset)
+                    ends.append(offset + len(line.rstrip(b'\r\n')))
+                offset += len(line)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offset else b''
+        self._starts = np.array(starts, dtype=np.int64)
+        self._ends = np.array(ends, dtype=np.int64)
+        self.version = hashlib.sha1(self._mm[:]).hexdigest()[:12]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def get(self, row: int) -> Dict:
+        """Return a fresh copy of the chunk stored at FAISS row `row`."""
+        return json.loads(self._mm[self._starts[row]:self._ends[row]])
@@ -0,0 +1,100 @@
+"""Deterministic answers without a completion, in the response structure of prompt.SYSTEM_PROMPT.
+
+Used when USE_OPENAI is false and when a completion misses its deadline. The retrieved chunks are
+selected as for the prompt (repeats, near-duplicates and other divisions' variants dropped), then:
+
+    **Ruling**           the sentence sharing the most words with the question (ties: higher-ranked chunk,
+                         and without a division, a chunk for every division before a division variant)
+    **Why**              the rest of that chunk and the lead sentences of the others, up to WHY_WORDS words
+    **Rule References**  each selected chunk's label and chapter
+    **Division Note**    which divisions the cited rules cover, from the chunks' `div` tags
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .divisions import LEVELS, chunk_div, division_level, tag_levels
+from .lexical import tokenize
+from .prompt import select_chunks
+
+LEVEL_NAMES = {"tb": "Tee Ball", "min": "Minors", "maj": "Majors", "int": "Intermediate (50/70)", "jr": "Juniors", "sr": "Seniors"}
+MAX_REFERENCES = 4  # Chunks the answer is drawn from
+MIN_RULING_WORDS = 12  # Shorter ruling sentences ("(1) first base is unoccupied or") run on into the next
+WHY_WORDS = 80
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"“])")
+
+NO_CONTEXT_ANSWER = "Hey there! I couldn't find any relevant rules in the rulebook for that one. Can you clarify or ask something else?"
+
+
+def describe_levels(tag: str) -> str:
+    """'all divisions', 'Majors and up', 'Minors and below', 'Intermediate (50/70) to Juniors' or one division."""
+    levels = [level for level in LEVELS if level in tag_levels(tag)]
+    first, last = LEVELS.index(levels[0]), LEVELS.index(levels[-1])
+    if len(levels) == len(LEVELS):
+        return "all divisions"
+    if len(levels) == 1:
+        return LEVEL_NAMES[levels[0]]
+    if last == len(LEVELS) - 1:
+        return f"{LEVEL_NAMES[levels[0]]} and up"
+    if first == 0:
+        return f"{LEVEL_NAMES[levels[-1]]} and below"
+    return f"{LEVEL_NAMES[levels[0]]} to {LEVEL_NAMES[levels[-1]]}"
+
+
+def _sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_RE.split(text.strip()) if sentence.strip()]
+
+
+def _ruling(docs: List[List[str]], scoped: List[bool], query_terms: set) -> Tuple[int, int, int]:
+    """(chunk, first sentence, end sentence) of the ruling among the chunks' sentences."""
+    _, n, i = min(
+        ((-len(query_terms & set(tokenize(sentence))), is_scoped), n, i)
+        for n, (sentences, is_scoped) in enumerate(zip(docs, scoped)) for i, sentence in enumerate(sentences)
+    )
+    end = i + 1
+    while end < len(docs[n]) and len(" ".join(docs[n][i:end]).split()) < MIN_RULING_WORDS:
+        end += 1
+    return n, i, end
+
+
+def _division_note(docs: List[Dict], context: List[Dict], division: Optional[str], label: Callable[[Dict], str]) -> str:
+    if division_level(division) is not None:
+        cited = {label(doc) for doc in docs}
+        others = sorted({f"{label(doc)} ({describe_levels(chunk_div(doc))})" for doc in context
+                         if doc not in docs and label(doc) in cited and division_level(division) not in tag_levels(chunk_div(doc))})
+        note = f"These rules apply to {division}."
+        return f"{note} Other divisions have their own version of {', '.join(others)}." if others else note
+    scoped = [doc for doc in docs if chunk_div(doc) != "all"]
+    if not scoped:
+        return "These rules apply to all divisions."
+    return "Rules differ by division: " + "; ".join(f"{label(doc)} covers {describe_levels(chunk_div(doc))}" for doc in scoped) + "."
+
+
+def compose_answer(query: str, context: List[Dict], division: Optional[str] = None,
+                   label: Callable[[Dict], str] = lambda doc: f"Rule {doc.get('citation', '')}".strip()) -> str:
+    """The structured answer to `query` drawn only from the ranked `context` chunks."""
+    docs = select_chunks(context, division)[:MAX_REFERENCES]
+    if not docs:
+        return NO_CONTEXT_ANSWER
+    sentences = [_sentences(doc['text']) or [doc['text']] for doc in docs]
+    no_division = division_level(division) is None
+    n, first, end = _ruling(sentences, [no_division and chunk_div(doc) != "all" for doc in docs], set(tokenize(query)))
+    ruling = " ".join(sentences[n][first:end])
+    why, words = [], 0
+    rest = sentences[n][:first] + sentences[n][end:] + [chunk[0] for m, chunk in enumerate(sentences) if m != n]
+    for sentence in rest:
+        if words + len(sentence.split()) > WHY_WORDS and why:
+            break
+        why.append(sentence)
+        words += len(sentence.split())
+
+    references = []
+    for doc in docs:
+        reference = f"{label(doc)} ({doc['chapter']})" if doc.get('chapter') else label(doc)
+        if reference not in references:
+            references.append(reference)
+    return "\n\n".join([
+        f"**Ruling**: {label(docs[n])}: {ruling}",
+        f"**Why**: {' '.join(why) if why else f'{label(docs[n])} is the rule that covers this.'}",
+        f"**Rule References**: {'; '.join(references)}",
+        f"**Division Note**: {_division_note(docs, context, division, label)}",
+    ])
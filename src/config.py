@@ -1,6 +1,42 @@
 import os
 # Load from environment variables or set defaults
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'your-secret:latest') # Use Secret Manager in production
-USE_OPENAI = os.getenv('USE_OPENAI', 'true').lower() == 'true'
+USE_OPENAI = os.getenv('USE_OPENAI', 'true').lower() == 'true'  # false: no API calls; local or BM25 retrieval and answers composed from the rules
 KB_PATH = os.getenv('KB_PATH', 'data/chunks/rules.chunks.jsonl')  # Updated to match /data
+EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', 'logs/embedding_cache.db')  # Point at a mounted volume to survive restarts
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '1024'))  # In-process LRU entries
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '86400'))  # Seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))  # Cosine similarity to reuse an answer
+INTENT_MODEL_PATH = os.getenv('INTENT_MODEL_PATH', 'data/intent/intent_model.npz')  # Trained with `python -m src.intent`
+INTENT_CONFIDENCE = float(os.getenv('INTENT_CONFIDENCE', '0.7'))  # Below this, ask gpt-4o-mini
+EMBED_DIM = int(os.getenv('EMBED_DIM', '3072'))  # text-embedding-3 `dimensions`; must match the built index
+FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', '8'))  # IVF lists probed per query
+FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', '64'))  # HNSW search breadth
+BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', '500'))  # Per POST /query/batch
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))  # Answers generated in parallel per batch
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Interactions waiting to be written; overflow is dropped and counted
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '100'))  # Rows per executemany
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))  # Max seconds a row waits in the queue
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '5000'))  # Rows held in memory per export step
+BUNDLE_PATH = os.getenv('BUNDLE_PATH', '')  # Versioned bundle (or bundles root with CURRENT) from `python -m src.bundle`; empty: data/chunks
+INDEX_MMAP = os.getenv('INDEX_MMAP', 'true').lower() == 'true'  # Search a bundle's flat index through its mmapped rules.vectors.npy, one copy for all workers
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))  # uvicorn worker processes (uvicorn's --workers default); see the Dockerfile
+PROMPT_CONTEXT_TOKENS = int(os.getenv('PROMPT_CONTEXT_TOKENS', '1200'))  # Rulebook context packed into each answer prompt
+SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))  # Conversations kept in memory
+SESSION_TTL = float(os.getenv('SESSION_TTL', '1800'))  # Seconds of inactivity before a conversation is forgotten
+SESSION_MAX_TURNS = int(os.getenv('SESSION_MAX_TURNS', '3'))  # Earlier Q&A pairs passed to answer generation
+# Optional SQLite file backing the sessions; empty: memory only. Workers share conversations through it, so it defaults on with several
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'logs/sessions.db' if WEB_CONCURRENCY > 1 else '')
+OPENAI_EMBED_CONCURRENCY = int(os.getenv('OPENAI_EMBED_CONCURRENCY', '16'))  # Embedding calls in flight per process
+OPENAI_CHAT_CONCURRENCY = int(os.getenv('OPENAI_CHAT_CONCURRENCY', '32'))  # Chat completions in flight per process
+EMBED_QUEUE_TIMEOUT = float(os.getenv('EMBED_QUEUE_TIMEOUT', '2.0'))  # Max seconds an embedding call queues before a 503
+CHAT_QUEUE_TIMEOUT = float(os.getenv('CHAT_QUEUE_TIMEOUT', '5.0'))  # Max seconds a completion queues before a 503
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '64'))  # Pooled keep-alive connections to OpenAI per process
+OPENAI_KEEPALIVE = float(os.getenv('OPENAI_KEEPALIVE', '60'))  # Seconds an idle pooled connection is kept open
+REQUEST_BUDGET = float(os.getenv('REQUEST_BUDGET', '25'))  # Seconds per question for OpenAI calls (under the Streamlit client's 30 s); past it, answers fall back to the rule text
+EMBED_TIMEOUT = float(os.getenv('EMBED_TIMEOUT', '3'))  # Max seconds per embeddings call (per 100 inputs); past it, retrieval is BM25 only
+INTENT_TIMEOUT = float(os.getenv('INTENT_TIMEOUT', '2'))  # Max seconds for the gpt-4o-mini intent check; past it, the local prediction is used
+CHAT_TIMEOUT = float(os.getenv('CHAT_TIMEOUT', '20'))  # Max seconds until a completion (or a stream's first token) arrives
+EMBED_HEDGE_DELAY = float(os.getenv('EMBED_HEDGE_DELAY', '0'))  # Seconds before a slow embeddings call is raced by a second identical one; 0: no hedging
 # Add more config as needed (e.g., model settings)
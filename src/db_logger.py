@@ -1,17 +1,53 @@
 import sqlite3
 import os
+import argparse
+import csv
+import json
+import atexit
+import queue
+import threading
+import time
 from datetime import datetime
 import uuid
+from .config import LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, EXPORT_CHUNK_SIZE
+from .metrics import LOG_ROWS
+
+COLUMNS = (
+    "query_text", "division", "response", "timestamp", "session_id", "response_time",
+    "query_type", "api_used", "tokens_used", "thumbs_up", "thumbs_down", "feedback_text", "rule_reference", "interaction_id",
+    "stage_timings"
+)
+INSERT_SQL = f"INSERT INTO interactions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+# Only the fields the user sent; the rest keep their logged values
+FEEDBACK_SQL = """
+    UPDATE interactions SET thumbs_up = COALESCE(?, thumbs_up), thumbs_down = COALESCE(?, thumbs_down),
+        feedback_text = COALESCE(?, feedback_text)
+    WHERE interaction_id = ?
+"""
+_STOP = object()
+ERROR_REPORT_INTERVAL = 60.0  # Seconds between printed write failures; every row is counted in LOG_ROWS
 
 class DBLogger:
-    def __init__(self):
-        self.db_path = os.path.join("logs", "app_data.db")
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+    def __init__(self, db_path=None, queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        """Write-behind interaction logger: requests enqueue rows, one background thread inserts them in batches."""
+        self.db_path = db_path or os.path.join("logs", "app_data.db")
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0  # Rows lost to a full queue or a failed write
+        self.written = 0
+        self.unmatched_feedback = 0  # Feedback whose interaction id matched no row
+        self._last_error_report = None
         self._create_table()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._run, name="db-logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def _create_table(self):
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")  # Persistent: readers (exports) no longer block the writer
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS interactions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -27,31 +63,197 @@ class DBLogger:
                     thumbs_up INTEGER,
                     thumbs_down INTEGER,
                     feedback_text TEXT,
-                    rule_reference TEXT
+                    rule_reference TEXT,
+                    interaction_id TEXT,
+                    stage_timings TEXT
                 )
             ''')
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(interactions)")]
+            if "interaction_id" not in columns:  # Tables created before feedback was keyed by interaction
+                cursor.execute("ALTER TABLE interactions ADD COLUMN interaction_id TEXT")
+            if "stage_timings" not in columns:  # Tables created before per-stage timings were stored
+                cursor.execute("ALTER TABLE interactions ADD COLUMN stage_timings TEXT")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_interactions_interaction_id ON interactions (interaction_id)")
+            # Analytics filters and incremental exports
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_session_id ON interactions (session_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_interactions_query_type ON interactions (query_type)")
+            cursor.execute("CREATE TABLE IF NOT EXISTS export_marks (name TEXT PRIMARY KEY, last_id INTEGER, exported_at TEXT)")
             conn.commit()
 
-    def log_interaction(self, query_text, division, response, session_id, response_time, query_type, api_used, tokens_used, thumbs_up=None, thumbs_down=None, feedback_text=None, rule_reference=None):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO interactions (
-                    query_text, division, response, timestamp, session_id, response_time,
-                    query_type, api_used, tokens_used, thumbs_up, thumbs_down, feedback_text, rule_reference
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                query_text, division, response, datetime.utcnow().isoformat(), session_id, response_time,
-                query_type, api_used, tokens_used, thumbs_up, thumbs_down, feedback_text, rule_reference
-            ))
-            conn.commit()
+    def log_interaction(self, query_text, division, response, session_id, response_time, query_type, api_used, tokens_used, thumbs_up=None, thumbs_down=None, feedback_text=None, rule_reference=None, interaction_id=None, stage_timings=None):
+        """Queue an interaction row without blocking; it is written by the background thread. Returns its interaction id.
+
+        `stage_timings` (stage -> ms) is stored as JSON.
+        """
+        interaction_id = interaction_id or str(uuid.uuid4())
+        row = (
+            query_text, division, response, datetime.utcnow().isoformat(), session_id, response_time,
+            query_type, api_used, tokens_used, thumbs_up, thumbs_down, feedback_text, rule_reference, interaction_id,
+            json.dumps(stage_timings) if stage_timings is not None else None
+        )
+        self._enqueue(INSERT_SQL, row)
+        return interaction_id
+
+    def log_feedback(self, interaction_id, thumbs_up=None, thumbs_down=None, feedback_text=None):
+        """Queue thumbs/feedback for a logged interaction; applied after every row queued before it."""
+        self._enqueue(FEEDBACK_SQL, (thumbs_up, thumbs_down, feedback_text, interaction_id))
+
+    def _enqueue(self, sql, values):
+        try:
+            self._queue.put_nowait((sql, values))
+        except queue.Full:
+            self.dropped += 1
+            LOG_ROWS.inc(outcome="dropped")
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far is committed."""
+        done = threading.Event()
+        if self._writer.is_alive():
+            self._queue.put(done, timeout=timeout)
+            done.wait(timeout)
+
+    def close(self):
+        """Write what is queued and stop the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    def _run(self):
+        # One long-lived connection, owned by this thread
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; commits skip the per-transaction fsync
+        batch = []
+        deadline = None
+        while True:
+            try:
+                item = self._queue.get(timeout=None if not batch else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None  # Time threshold reached
+            if isinstance(item, tuple):
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            self._write(conn, batch)
+            batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                break
+        conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        try:
+            with conn:
+                # Inserts first: feedback in this batch may refer to a row inserted in it
+                conn.executemany(INSERT_SQL, [values for sql, values in batch if sql is INSERT_SQL])
+                feedback = [values for sql, values in batch if sql is FEEDBACK_SQL]
+                updated = conn.executemany(FEEDBACK_SQL, feedback).rowcount if feedback else 0
+            self.written += len(batch)
+            LOG_ROWS.inc(len(batch), outcome="written")
+            if updated < len(feedback):
+                self.unmatched_feedback += len(feedback) - updated
+                LOG_ROWS.inc(len(feedback) - updated, outcome="unmatched_feedback")
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            LOG_ROWS.inc(len(batch), outcome="dropped")
+            now = time.monotonic()
+            if self._last_error_report is None or now - self._last_error_report >= ERROR_REPORT_INTERVAL:
+                self._last_error_report = now
+                print(f"DEBUG: Failed to write {len(batch)} interactions: {e} ({self.dropped} dropped so far)")
 
     def export_to_csv(self, output_path="logs/interactions.csv"):
+        return self.export(output_path, "csv")
+
+    def export(self, output_path, fmt="csv", since_id=None, since_timestamp=None, mark=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """Stream interactions to CSV or Parquet, `chunk_size` rows at a time, in id order.
+
+        Only rows after `since_id` / at or after `since_timestamp` are exported. With `mark`, the export
+        starts after the id stored under that name by the previous export and stores the new high-water
+        mark once the file is complete. Parquet needs pyarrow. Returns {"rows", "last_id"}.
+        """
+        self.flush()
         with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM interactions")
-            rows = cursor.fetchall()
-            with open(output_path, 'w') as f:
-                f.write("id,query_text,division,response,timestamp,session_id,response_time,query_type,api_used,tokens_used,thumbs_up,thumbs_down,feedback_text,rule_reference\n")
-                for row in rows:
-                    f.write(','.join(str(x) if x is not None else '' for x in row) + '\n')
+            if mark is not None and since_id is None:
+                stored = conn.execute("SELECT last_id FROM export_marks WHERE name = ?", (mark,)).fetchone()
+                since_id = stored[0] if stored else None
+            where, params = [], []
+            if since_id is not None:
+                where.append("id > ?")
+                params.append(since_id)
+            if since_timestamp is not None:
+                where.append("timestamp >= ?")
+                params.append(since_timestamp)
+            cursor = conn.execute(
+                f"SELECT * FROM interactions {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY id", params
+            )
+            columns = [column[0] for column in cursor.description]
+            chunks = iter(lambda: cursor.fetchmany(chunk_size), [])
+            tmp_path = f"{output_path}.tmp"
+            if fmt == "csv":
+                rows, last_id = _write_csv(tmp_path, columns, chunks)
+            elif fmt == "parquet":
+                rows, last_id = _write_parquet(tmp_path, columns, chunks)
+            else:
+                raise ValueError(f"Unknown export format: {fmt}")
+            os.replace(tmp_path, output_path)
+            last_id = since_id if last_id is None else last_id
+            if mark is not None and last_id is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO export_marks (name, last_id, exported_at) VALUES (?, ?, ?)",
+                    (mark, last_id, datetime.utcnow().isoformat())
+                )
+        print(f"DEBUG: Exported {rows} interactions to {output_path}")
+        return {"rows": rows, "last_id": last_id}
+
+def _write_csv(path, columns, chunks):
+    rows, last_id = 0, None
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)  # Quotes commas, quotes and newlines in answers
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(chunk)
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+    return rows, last_id
+
+PARQUET_TYPES = {"id": "int64", "response_time": "float64", "tokens_used": "int64", "thumbs_up": "int64", "thumbs_down": "int64"}
+
+def _write_parquet(path, columns, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+    schema = pa.schema([(column, getattr(pa, PARQUET_TYPES.get(column, "string"))()) for column in columns])
+    rows, last_id = 0, None
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            # One row group per chunk, so memory stays at one chunk
+            writer.write_table(pa.Table.from_arrays([pa.array(list(values), type=field.type) for values, field in zip(zip(*chunk), schema)], schema=schema))
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+        if not rows:
+            writer.write_table(schema.empty_table())
+    return rows, last_id
+
+def main():
+    parser = argparse.ArgumentParser(description="Export logged interactions to CSV or Parquet.")
+    parser.add_argument("output")
+    parser.add_argument("--db", default=None, help="Default logs/app_data.db")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--since-id", type=int, default=None)
+    parser.add_argument("--since-timestamp", default=None, help="ISO timestamp, e.g. 2025-04-01T00:00:00")
+    parser.add_argument("--mark", default=None, help="Incremental: resume after, and then store, this named high-water mark")
+    args = parser.parse_args()
+    logger = DBLogger(args.db)
+    stats = logger.export(args.output, args.format, since_id=args.since_id, since_timestamp=args.since_timestamp, mark=args.mark)
+    logger.close()
+    print(f"Exported {stats['rows']} interactions (last id {stats['last_id']}) to {args.output}")
+
+if __name__ == "__main__":
+    main()
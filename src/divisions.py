@@ -0,0 +1,51 @@
+from typing import Dict, Optional, Set
+
+# Little League divisions from youngest to oldest, as abbreviated in the chunk `div` tags
+LEVELS = ["tb", "min", "maj", "int", "jr", "sr"]
+
+# Keywords in the division names the Streamlit apps send ("Majors A (11U-12U)", "Tee Ball", ...)
+UI_KEYWORDS = [
+    ("tee", "tb"),
+    ("rookie", "min"),
+    ("supreme", "min"),
+    ("minor", "min"),
+    ("major", "maj"),
+    ("intermediate", "int"),
+    ("50/70", "int"),
+    ("junior", "jr"),
+    ("senior", "sr"),
+]
+
+
+def division_level(division: Optional[str]) -> Optional[str]:
+    """Map a UI division name to a level in LEVELS; None means search every division."""
+    name = (division or "").lower()
+    for keyword, level in UI_KEYWORDS:
+        if keyword in name:
+            return level
+    return None
+
+
+def tag_levels(tag: str) -> Set[str]:
+    """Expand a chunk `div` tag ('all', 'maj_up', 'min_down', 'int_jr', 'tb', ...) to the levels it covers."""
+    tag = (tag or "all").lower()
+    if tag == "all":
+        return set(LEVELS)
+    if tag.endswith("_up") and tag[:-3] in LEVELS:
+        return set(LEVELS[LEVELS.index(tag[:-3]):])
+    if tag.endswith("_down") and tag[:-5] in LEVELS:
+        return set(LEVELS[:LEVELS.index(tag[:-5]) + 1])
+    low, _, high = tag.partition("_")
+    if low in LEVELS and high in LEVELS:
+        return set(LEVELS[LEVELS.index(low):LEVELS.index(high) + 1])
+    if tag in LEVELS:
+        return {tag}
+    return set(LEVELS)  # Unknown tags are never filtered out
+
+
+def chunk_div(doc: Dict) -> str:
+    """The `div` tag of a chunk: meta.div when present, else the last segment of its title."""
+    div = doc.get("meta", {}).get("div")
+    if div:
+        return div
+    return doc.get("title", "").rsplit("•", 1)[-1].strip() or "all"
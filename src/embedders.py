@@ -0,0 +1,66 @@
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class OpenAIEmbedder:
+    def __init__(self, model: str = "text-embedding-3-large", dimensions: Optional[int] = None, batch_size: int = 128, client=None):
+        """Batched OpenAI embeddings for offline index builds."""
+        if client is None:
+            from openai import OpenAI
+            from .config import OPENAI_API_KEY
+            client = OpenAI(api_key=OPENAI_API_KEY)
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.dimensions}" if self.dimensions else self.model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+            response = self.client.embeddings.create(input=batch, model=self.model, **kwargs)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+            print(f"DEBUG: Embedded {min(start + self.batch_size, len(texts))}/{len(texts)} chunks")
+        return np.array(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+
+class HashEmbedder:
+    def __init__(self, dim: int = 3072):
+        """Deterministic local stand-in: signed feature hashing of word unigrams and bigrams, L2-normalized.
+
+        Needs no network or API key, so offline builds, tests and benchmarks are reproducible. Texts that
+        share words get nearby vectors, which is enough for lexical-quality retrieval.
+        """
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hash@{self.dim}"
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = TOKEN_RE.findall(text.lower())
+        for gram in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            h = zlib.crc32(gram.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self.embed_one(text) for text in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+def local_embedder(name: Optional[str], dim: int) -> Optional[HashEmbedder]:
+    """A HashEmbedder matching an index built by embedder `name` (meta.json's "hash@3072"), else None."""
+    embedder = HashEmbedder(dim)
+    return embedder if name == embedder.name else None
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .metrics import CACHE_LOOKUPS
+
+SQL_BATCH = 500  # Keys per SELECT, under SQLite's host parameter limit
+
+
+def normalize_query(text: str) -> str:
+    """Normalize query text for cache keys: case-folded, single-spaced, no trailing punctuation."""
+    return " ".join(text.lower().split()).strip(" ?!.")
+
+
+class EmbeddingCache:
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 1024):
+        """Two-tier query embedding cache: in-process LRU backed by a SQLite file."""
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._create_table()
+
+    def _create_table(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    dim INTEGER,
+                    vector BLOB
+                )
+            ''')
+            conn.commit()
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        return hashlib.sha1(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the cached vector for (text, model), promoting disk hits into the LRU."""
+        return self.get_many([text], model)[0]
+
+    def get_many(self, texts: List[str], model: str, disk: bool = True) -> List[Optional[np.ndarray]]:
+        """get() for many texts, reading the LRU misses from SQLite in one query.
+
+        With `disk` false only the LRU is read, so it is safe on the event loop; its misses are not
+        counted, as the caller looks them up on disk next.
+        """
+        keys = [self.key(text, model) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache="embedding", result="memory_hit")
+                    vectors[i] = vector
+        if not disk:
+            return vectors
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        found = {}
+        if missing and self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                for start in range(0, len(missing), SQL_BATCH):
+                    batch = missing[start:start + SQL_BATCH]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({', '.join('?' * len(batch))})", [model, *batch]
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+        for i, key in enumerate(keys):
+            if vectors[i] is not None:
+                continue
+            vectors[i] = found.get(key)
+            with self._lock:
+                if vectors[i] is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._remember(key, vectors[i])
+            CACHE_LOOKUPS.inc(cache="embedding", result="miss" if vectors[i] is None else "disk_hit")
+        return vectors
+
+    def put(self, text: str, model: str, vector: np.ndarray):
+        """Store a vector in both tiers."""
+        key = self.key(text, model)
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                    (key, model, int(vector.shape[0]), vector.tobytes())
+                )
+                conn.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self._lru)}
@@ -0,0 +1,127 @@
+import argparse
+import os
+import re
+import sqlite3
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+INTENTS = ["scenario_based", "rule_reference", "philosophical", "opinion", "off_topic"]
+
+# Keyword automaton: one compiled alternation per intent. The scenario list mirrors the
+# keyword fallback that used to override the LLM's answer in RAG.classify_intent, including its
+# 'out ': a bare "out" ends a definition question ("What is a force out?") more often than a scenario.
+PATTERNS = {
+    "scenario_based": r"\b(?:outs?(?= )|no outs|one out|two outs|runners?|on first|on second|on third|bases loaded|call|called|umpire|correct|right|wrong)\b",
+    "rule_reference": r"\b(?:what is|what's|what are|define|definition|meaning|rule\s*\d+\.\d+|explain the rule|how many|how long|allowed)\b",
+    "philosophical": r"\b(?:why|purpose|reason|intent of|point of)\b",
+    "opinion": r"\b(?:opinion|story|stories|favorite|favourite|do you think|best|worst|funniest)\b",
+}
+BASEBALL_VOCAB = re.compile(
+    r"\b(?:ball|balls|bat|bats|batter|base|bases|pitch|pitcher|pitches|strike|strikes|inning|innings|rule|rules|umpire|runner|catcher|fly|foul|balk|glove|league|division|tee|coach|manager|game|field|plate|mound|hit|slide|tag)\b"
+)
+COMPILED = {intent: re.compile(pattern) for intent, pattern in PATTERNS.items()}
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+N_HASHED = 4096
+
+
+def featurize(query: str) -> np.ndarray:
+    """Hashed unigram/bigram counts plus automaton hits, L2-normalized."""
+    query_lower = query.lower()
+    tokens = TOKEN_RE.findall(query_lower)
+    features = np.zeros(N_HASHED + len(COMPILED) + 1, dtype=np.float32)
+    for gram in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        features[zlib.crc32(gram.encode("utf-8")) % N_HASHED] += 1.0
+    for offset, pattern in enumerate(COMPILED.values()):
+        features[N_HASHED + offset] = len(pattern.findall(query_lower))
+    features[-1] = 1.0 if BASEBALL_VOCAB.search(query_lower) else 0.0
+    norm = np.linalg.norm(features)
+    return features / norm if norm else features
+
+
+class IntentClassifier:
+    def __init__(self, model_path: Optional[str] = None):
+        """Local intent classifier: keyword automaton, optionally refined by an offline-trained linear model."""
+        self.model_path = model_path
+        self.weights = None
+        self.bias = None
+        self.labels = INTENTS
+        if model_path:
+            try:
+                model = np.load(model_path)
+                self.weights, self.bias = model["weights"], model["bias"]
+                self.labels = [str(label) for label in model["labels"]]
+            except FileNotFoundError:
+                print(f"DEBUG: No intent model at {model_path}, using keyword rules only")
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        """Return (intent, confidence in [0, 1])."""
+        query_lower = query.lower()
+        hits = {intent: len(pattern.findall(query_lower)) for intent, pattern in COMPILED.items()}
+        if hits["scenario_based"]:
+            # Game-situation vocabulary always wins, as it did in the old LLM keyword fallback
+            return "scenario_based", 0.95
+        if self.weights is not None:
+            logits = featurize(query) @ self.weights + self.bias
+            probs = np.exp(logits - logits.max())
+            probs /= probs.sum()
+            best = int(probs.argmax())
+            return self.labels[best], float(probs[best])
+        on_topic = BASEBALL_VOCAB.search(query_lower) is not None
+        total = sum(hits.values())
+        if total:
+            intent = max(hits, key=hits.get)
+            # Question words without any baseball vocabulary may well be off topic
+            return intent, (0.9 if on_topic else 0.5) * hits[intent] / total
+        return ("rule_reference", 0.5) if on_topic else ("off_topic", 0.6)
+
+
+def train(rows: List[Tuple[str, str]], epochs: int = 300, lr: float = 0.5, l2: float = 1e-4) -> Dict[str, np.ndarray]:
+    """Fit a softmax regression over `featurize` features with full-batch gradient descent."""
+    labels = sorted({label for _, label in rows})
+    X = np.stack([featurize(text) for text, _ in rows])
+    y = np.array([labels.index(label) for _, label in rows])
+    Y = np.eye(len(labels), dtype=np.float32)[y]
+    W = np.zeros((X.shape[1], len(labels)), dtype=np.float32)
+    b = np.zeros(len(labels), dtype=np.float32)
+    for _ in range(epochs):
+        logits = X @ W + b
+        P = np.exp(logits - logits.max(axis=1, keepdims=True))
+        P /= P.sum(axis=1, keepdims=True)
+        grad = (P - Y) / len(rows)
+        W -= lr * (X.T @ grad + l2 * W)
+        b -= lr * grad.sum(axis=0)
+    return {"weights": W, "bias": b, "labels": np.array(labels)}
+
+
+def load_interactions(db_path: str) -> List[Tuple[str, str]]:
+    """Labelled (query_text, query_type) pairs from the interactions table."""
+    placeholders = ", ".join("?" for _ in INTENTS)
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            f"SELECT query_text, query_type FROM interactions WHERE query_text != '' AND query_type IN ({placeholders})",
+            INTENTS
+        ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from logged interactions.")
+    parser.add_argument("--db", default="logs/app_data.db")
+    parser.add_argument("--out", default="data/intent/intent_model.npz")
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    rows = load_interactions(args.db)
+    if len({label for _, label in rows}) < 2:
+        raise SystemExit(f"Need at least two labelled intents in {args.db}, found {len(rows)} rows")
+    model = train(rows, epochs=args.epochs)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    np.savez(args.out, **model)
+    classifier = IntentClassifier(args.out)
+    accuracy = np.mean([classifier.predict(text)[0] == label for text, label in rows])
+    print(f"Trained on {len(rows)} interactions (training accuracy {accuracy:.2%}), wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .chunk_store import ChunkStore
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "if", "in",
+    "is", "it", "of", "on", "or", "say", "says", "the", "that", "this", "to", "was", "what", "when", "which",
+    "who", "why", "with", "rule", "rules",
+}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# "Rule 6.09(b)", "7.13 NOTE", "rule 2.00", "§5.09(a)(4) exception"
+CITATION_RE = re.compile(
+    r"(?P<prefix>\brules?\s+|§\s*)?\b(?P<major>\d{1,2})\.(?P<minor>\d{1,2})\b(?P<subsections>(?:\s*\([a-z0-9]{1,3}\))*)"
+    r"(?:\s+(?P<suffix>note|exception|penalty|approved ruling|example)\b)?",
+    re.IGNORECASE,
+)
+# Between two citations of a list: "Rules 6.09, 7.13 and 7.14"
+CITATION_LIST_RE = re.compile(r"\s*(?:,|,?\s*(?:and|or))\s*", re.IGNORECASE)
+# Chunk type segment of the title ("rule.7.13 • note(1) • all") for each citation suffix word
+CITATION_TYPES = {"note": "note", "exception": "exc", "penalty": "pen", "approved ruling": "ar", "example": "ex"}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def find_citations(text: str) -> List[re.Match]:
+    """CITATION_RE matches in `text` that name a rule: after "Rule"/"§", before a suffix word, or listed after one.
+
+    A bare decimal ("delayed 1.5 hours", "a 3.25 ERA") is not a citation.
+    """
+    found = []
+    for match in CITATION_RE.finditer(text):
+        listed = found and CITATION_LIST_RE.fullmatch(text, found[-1].end(), match.start())
+        if match.group("prefix") or match.group("suffix") or listed:
+            found.append(match)
+    return found
+
+
+def normalize_citation(citation: str) -> str:
+    """Canonical key of a chunk's citation: '6.09 (B)' -> '6.09(b)'; '1.1' (a mangled 1.10) -> '1.10'; '2' -> '2.00'.
+
+    Citations typed in questions pad a one-digit minor on the left instead ('6.9(b)' is 6.09(b)), see match_citations.
+    """
+    citation = re.sub(r"\s+", "", citation.lower())
+    match = re.match(r"(\d+)(?:\.(\d+))?(.*)", citation)
+    if not match:
+        return citation
+    major, minor, rest = match.groups()
+    return f"{int(major)}.{(minor or '00').ljust(2, '0')}{rest}"
+
+
+class LexicalIndex:
+    def __init__(self, store: ChunkStore, k1: float = 1.2, b: float = 0.75):
+        """BM25 inverted index over chunk text, titles and citations, plus a citation lookup table."""
+        self.k1 = k1
+        self.b = b
+        self.size = len(store)
+        self.citations: Dict[str, List[int]] = defaultdict(list)
+        self.chunk_types: List[str] = []
+        postings = defaultdict(list)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for row in range(self.size):
+            doc = store.get(row)
+            citation = normalize_citation(doc.get("citation", ""))
+            self.citations[citation].append(row)
+            title_parts = [part.strip() for part in doc.get("title", "").split("•")]
+            self.chunk_types.append(title_parts[1].split("(")[0] if len(title_parts) > 1 else "rule")
+            tokens = tokenize(f"{doc.get('title', '')} {doc.get('chapter', '')} {doc.get('text', '')}") + [citation]
+            lengths[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((row, tf))
+        self.avg_length = float(lengths.mean()) if self.size else 0.0
+        self._norms = self.k1 * (1 - self.b + self.b * lengths / (self.avg_length or 1.0))
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            rows = np.array([row for row, _ in entries], dtype=np.int64)
+            tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+            idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            self._postings[term] = (rows, tfs, idf)
+
+    def match_citations(self, query: str, mask: Optional[np.ndarray] = None, k: Optional[int] = None) -> List[int]:
+        """Rows whose citation the query names (find_citations: 'Rule 6.09(b)', 'rule 6.9(b)', '7.13 NOTE'), in rulebook order.
+
+        With more than `k` of them (Rule 2.00 alone has 150 definitions), the k that BM25 ranks best for
+        the rest of the question, then rulebook order for rows it does not score.
+        """
+        rows = []
+        cited_spans = find_citations(query)
+        for match in cited_spans:
+            major, minor, subsections, suffix = match.group("major", "minor", "subsections", "suffix")
+            prefix = normalize_citation(f"{major}.{minor.zfill(2)}{subsections}")
+            chunk_type = CITATION_TYPES.get(suffix.lower()) if suffix else None
+            for citation, citation_rows in self.citations.items():
+                if citation == prefix or citation.startswith(prefix + "("):
+                    rows.extend(row for row in citation_rows if chunk_type is None or self.chunk_types[row] == chunk_type)
+        rows = sorted(set(rows))
+        if mask is not None:
+            rows = [row for row in rows if mask[row]]
+        if k is not None and len(rows) > k:
+            cited = np.zeros(self.size, dtype=bool)
+            cited[rows] = True
+            rest = query
+            for match in reversed(cited_spans):
+                rest = f"{rest[:match.start()]} {rest[match.end():]}"
+            ranked = [row for row, _ in self.search(rest, k, cited)]
+            rows = ranked + [row for row in rows if row not in ranked][:k - len(ranked)]
+        return rows
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, BM25 score) pairs, optionally restricted to rows where `mask` is true."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs, idf = posting
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + self._norms[rows])
+        if mask is not None:
+            scores[~mask] = 0.0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = sorted(candidates, key=lambda row: -scores[row])
+        return [(int(row), float(scores[row])) for row in ranked]
@@ -1,69 +1,203 @@
 from fastapi import FastAPI, HTTPException
-from .rag import RAG
-from .retriever import Retriever
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from .answer_cache import AnswerCache
+from .bundle import Bundle
 from .db_logger import DBLogger
-import pandas as pd
+from .divisions import division_level
+from .embedding_cache import normalize_query
+from .scheduler import CHAT, Overloaded
+from .sessions import SessionStore, standalone_query
+from .single_flight import SingleFlight
+from . import metrics
+from .openai_client import start_deadline
+from .timing import record as record_timing, request_timings, server_timing_header, timed, timings_ms
+import numpy as np
 import json
-from .config import OPENAI_API_KEY, USE_OPENAI
+from .config import OPENAI_API_KEY, USE_OPENAI, KB_PATH, BUNDLE_PATH, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD, BATCH_MAX_QUESTIONS, BATCH_CONCURRENCY, SESSION_MAX, SESSION_TTL, SESSION_MAX_TURNS, SESSION_DB_PATH
+import asyncio
+import threading
 import time
 import uuid
 import os
 
-app = FastAPI()
-logger = DBLogger()
+@asynccontextmanager
+async def lifespan(app):
+    # Load in the background: the port is bound and /healthz answers while openai/faiss import and the bundle loads
+    loading = asyncio.create_task(load_in_background())
+    yield
+    loading.cancel()
+    # Write the queued interactions before the process exits
+    logger.close()
+    print(f"DEBUG: Logger closed ({logger.written} written, {logger.dropped} dropped)")
 
-# Load meta.json for additional context
-print("DEBUG: Loading meta.json")
-try:
-    with open('data/chunks/index/meta.json', 'r') as f:
-        meta = json.load(f)
-except Exception as e:
-    print(f"DEBUG: Failed to load meta.json: {e}")
-    raise Exception(f"Failed to load meta.json: {e}")
-
-# Initialize RAG and Retriever with file paths
-print("DEBUG: Initializing RAG")
-try:
-    rag = RAG(data_path="data/chunks/rules.chunks.jsonl", index_path="data/chunks/index/rules.faiss", meta=meta)
-except Exception as e:
-    print(f"DEBUG: Failed to initialize RAG: {e}")
-    raise Exception(f"Failed to initialize RAG: {e}")
-
-print("DEBUG: Initializing Retriever")
-try:
-    retriever = Retriever(index_path="data/chunks/index/rules.faiss", idmap_path="data/chunks/rules.idmap.csv")
-except Exception as e:
-    print(f"DEBUG: Failed to initialize Retriever: {e}")
-    raise Exception(f"Failed to initialize Retriever: {e}")
+app = FastAPI(lifespan=lifespan)
+logger = DBLogger()
+answer_cache = AnswerCache(max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD)
+in_flight = SingleFlight()  # Identical /query and /validate_call questions being answered right now
+sessions = SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL, max_turns=SESSION_MAX_TURNS, db_path=SESSION_DB_PATH or None)
 
 # Set OpenAI API key from config
 os.environ['OPENAI_API_KEY'] = OPENAI_API_KEY
 
-@app.get("/query")
-async def query_rule(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None):
-    print(f"DEBUG: Received question: {question}")
-    if not question:
-        raise HTTPException(status_code=400, detail="No question provided")
-   
-    start_time = time.time()
-    print("DEBUG: Loading idmap")
-    try:
-        idmap = pd.read_csv("data/chunks/rules.idmap.csv")
-    except Exception as e:
-        print(f"DEBUG: Failed to load idmap: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to load idmap: {e}")
-   
-    print("DEBUG: Classifying intent")
+# Filled in by load_services()
+bundle = meta = store = catalog = rag = retriever = None
+startup_report = {}  # Stage -> seconds, served by /readyz
+startup_error = None
+_load_lock = threading.Lock()
+_import_started = time.perf_counter()
+
+def load_services():
+    """Import the heavy modules and load the artifact bundle once; safe to call from any thread."""
+    global bundle, meta, store, catalog, rag, retriever, startup_error
+    with _load_lock:
+        if retriever is not None:
+            return
+        startup_error = None
+        stage_start = time.perf_counter()
+
+        def stage(name):
+            nonlocal stage_start
+            now = time.perf_counter()
+            startup_report[name] = round(now - stage_start, 4)
+            stage_start = now
+
+        try:
+            print("DEBUG: Importing RAG and Retriever")
+            from .chunk_store import ChunkStore
+            from .rule_catalog import RuleCatalog
+            from .rag import RAG
+            from .retriever import Retriever
+            stage("imports")
+
+            print("DEBUG: Loading artifact bundle")
+            bundle = Bundle.open(BUNDLE_PATH) if BUNDLE_PATH else Bundle.from_build(chunks_path=KB_PATH)
+            with open(bundle.paths["meta"], 'r') as f:
+                meta = json.load(f)
+            stage("meta")
+
+            # Load the chunk store once; RAG and Retriever share it
+            store = ChunkStore(bundle.paths["chunks"])
+            stage("chunk_store")
+
+            # One rule catalog (row -> chunk id, citation, label) shared by RAG and Retriever
+            catalog = RuleCatalog.from_meta(meta, bundle.paths["idmap"])
+            stage("catalog")
+
+            print("DEBUG: Initializing RAG")
+            loaded_rag = RAG(data_path=bundle.paths["chunks"], index_path=bundle.paths["index"], meta=meta, store=store, catalog=catalog)
+            stage("rag")
+
+            print("DEBUG: Initializing Retriever")
+            loaded_retriever = Retriever(index_path=bundle.paths["index"], idmap_path=bundle.paths["idmap"], store=store, catalog=catalog,
+                                         vectors_path=bundle.paths.get("vectors"), embedder_name=meta.get("embedder"))
+            stage("retriever")
+        except Exception as e:
+            print(f"DEBUG: Failed to load services: {e}")
+            startup_error = f"{type(e).__name__}: {e}"
+            raise
+        rag, retriever = loaded_rag, loaded_retriever
+        startup_report["total_since_import"] = round(time.perf_counter() - _import_started, 4)
+        print(f"DEBUG: Services ready (bundle {bundle.version or 'unversioned'}): {startup_report}")
+
+async def load_in_background():
     try:
-        intent = rag.classify_intent(question)
-        print(f"DEBUG: Intent classified: {intent}")
-    except Exception as e:
-        print(f"DEBUG: Failed to classify intent: {e}")
-        intent = "other"
-   
-    # Extract division and session_id
+        await asyncio.to_thread(load_services)
+    except Exception:
+        pass  # Reported by /readyz; the next request retries
+
+async def ensure_loaded():
+    """Wait for load_services() (starting it if no lifespan did); 503 if it failed."""
+    if retriever is None:
+        try:
+            await asyncio.to_thread(load_services)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Service not ready: {e}")
+
+# Probes and scrapes: counted in the request histogram but not logged
+QUIET_ROUTES = {"/healthz", "/readyz", "/metrics"}
+
+@app.middleware("http")
+async def add_server_timing(request, call_next):
+    """Time each request's stages: Server-Timing header, request histogram and one JSON log line per request.
+
+    Streams report the stages before the first byte; their stored interaction row has the full set.
+    """
+    timings = {}
+    request_timings.set(timings)
+    start_deadline()  # OpenAI calls past REQUEST_BUDGET give up and fall back to local answers
+    start = time.perf_counter()
+    response = await call_next(request)
+    timings["total"] = time.perf_counter() - start
+    route = getattr(request.scope.get("route"), "path", "unmatched")  # The template, so ids in paths don't add series
+    metrics.REQUEST_SECONDS.observe(timings["total"], route=route, status=response.status_code)
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    if route not in QUIET_ROUTES:
+        # One structured line (Cloud Logging parses JSON stdout) instead of a print per stage
+        print(json.dumps({"severity": "INFO", "message": "request", "route": route, "status": response.status_code, "stages_ms": timings_ms(timings)}))
+    return response
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: stage and request latency histograms, answers and tokens per intent,
+    cache lookups and OpenAI errors, all since this process started."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, e):
+    """Shed load fast: 503 (this process is saturated) or 429 (OpenAI rate limit), both with Retry-After."""
+    return JSONResponse(status_code=e.status_code, content={"detail": str(e)}, headers={"Retry-After": e.retry_after_header})
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whether or not the bundle has loaded."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the bundle is loaded, with the startup timings; 503 while loading or after a failure."""
+    if retriever is not None:
+        return {"status": "ready", "bundle": bundle.version, "startup": startup_report}
+    if startup_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_error})
+    return JSONResponse(status_code=503, content={"status": "loading", "startup": startup_report})
+
+async def answer_cache_key(question, context):
+    """Chunk ids and question vector the answer cache matches on; None when the question was not embedded."""
+    if all(doc.get('match') == 'citation' for doc in context):
+        # Citation lookups never embedded the question: only the same question about the same rules reuses an answer
+        return [f"citation:{doc['id']}" for doc in context] + [f"question:{normalize_query(question)}"], np.ones(1, dtype=np.float32)
+    if all(doc.get('distance') is None for doc in context):
+        return None  # BM25-only fallback after the embedding ran out of time
+    return [doc['id'] for doc in context], await retriever.embed(question)  # Served from the embedding cache filled by retrieve()
+
+async def generate_or_reuse_answer(question, context, division, intent, history=()):
+    """Serve a cached answer for a near-identical question over the same chunks, else generate one.
+
+    Follow-ups (non-empty `history`) always generate, and their answers are not cached.
+    """
+    with timed("generate"):
+        return await _generate_or_reuse_answer(question, context, division, intent, history)
+
+async def _generate_or_reuse_answer(question, context, division, intent, history):
+    if not (context and USE_OPENAI):
+        return await rag.generate_answer(question, context, intent=intent, division=division, history=history)
+    # An answer written with one conversation as context is not the answer to the standalone question
+    cache_key = None if history else await answer_cache_key(question, context)
+    cached = cache_key and answer_cache.lookup(division, intent, *cache_key, version=retriever.index_version)
+    if cached:
+        return cached[0], 0, "AnswerCache"
+    CHAT.admit()  # Only a generating request can be shed: fixed and cached answers need no completion
+    answer, tokens_used, api_used = await rag.generate_answer(question, context, intent=intent, division=division, history=history)
+    if cache_key and api_used == "OpenAI":  # Not canned replies, error messages or deadline fallbacks
+        answer_cache.store(division, intent, *cache_key, answer, tokens_used, version=retriever.index_version)
+    return answer, tokens_used, api_used
+
+def parse_division(question):
+    """Split the 'Division:' line sent by the Streamlit app off the question."""
     division = "All"
-    session_id = str(uuid.uuid4())
     query_text = question
     if "Division:" in question:
         parts = question.split("\n")
@@ -71,203 +205,334 @@ async def query_rule(question: str, thumbs_up: int = None, thumbs_down: int = No
             if part.startswith("Division:"):
                 division = part.replace("Division:", "").strip()
                 query_text = "\n".join([p for p in parts if not p.startswith("Division:")]).strip()
-   
-    if intent == "scenario_based":
-        print("DEBUG: Checking scenario slots")
-        try:
-            missing_slots = rag.check_scenario_slots(query_text)
-        except Exception as e:
-            print(f"DEBUG: Failed to check scenario slots: {e}")
-            missing_slots = []
-        
-        if missing_slots:
-            answer = f"Hey coach, I need a bit more info to nail this call! Can you tell me about {', '.join(missing_slots)}? For example, how many outs are there, and who's on base?"
-            response_time = time.time() - start_time
-            print(f"DEBUG: Logging interaction: query_type={intent}, api_used=Cached")
-            try:
-                logger.log_interaction(
-                    query_text=query_text,
-                    division=division,
-                    response=answer,
-                    session_id=session_id,
-                    response_time=response_time,
-                    query_type=intent,
-                    api_used="Cached",
-                    tokens_used=0,
-                    thumbs_up=thumbs_up,
-                    thumbs_down=thumbs_down,
-                    feedback_text=feedback_text,
-                    rule_reference=None
-                )
-                print("DEBUG: Interaction logged")
-            except Exception as e:
-                print(f"DEBUG: Failed to log interaction: {e}")
-            return {"question": question, "answer": answer}
-   
-    print("DEBUG: Retrieving context")
-    try:
-        context = retriever.retrieve(question)
-        print(f"DEBUG: Retrieved {len(context)} docs")
-    except Exception as e:
-        print(f"DEBUG: Failed to retrieve context: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {e}")
-   
-    print("DEBUG: Generating answer")
-    try:
-        answer, tokens_used = rag.generate_answer(question, context, idmap)
-    except Exception as e:
-        print(f"DEBUG: Failed to generate answer: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate answer: {e}")
-   
-    response_time = time.time() - start_time
-    query_type = intent
-    api_used = "OpenAI" if USE_OPENAI and context else "Cached"
-    print(f"DEBUG: Logging interaction: query_type={query_type}, api_used={api_used}, tokens_used={tokens_used}")
+    return division, query_text
+
+def current_question(query_text):
+    """The newest question in a Streamlit prompt that carries 'Previous conversation' history."""
+    return query_text.rsplit("Current question:", 1)[-1].strip()
+
+async def start_turn(question, session_id=None, division=None):
+    """Open the question's session and work out what to search for.
+
+    Returns (session_id, division, query_text, search_query, history). The division is the `division`
+    parameter, else a 'Division:' line in the question, else the one the session last used; an explicit
+    "No Filters" or "All" clears the session's division. Only the current question is searched for,
+    rewritten into a standalone query when it follows up on the previous turn. The history is returned
+    (for answer generation) only then: a question that stands on its own is answered, cached and
+    coalesced like a first question.
+    """
+    parsed_division, query_text = parse_division(question)
+    session_id = session_id or str(uuid.uuid4())
+    if division is not None and division_level(division) is None:
+        division = "All"
+    division = division or (parsed_division if parsed_division != "All" else None)
+    open_session = lambda: sessions.open(session_id, division)
+    session = await asyncio.to_thread(open_session) if sessions.db_path else open_session()
+    history = list(session["turns"])
+    search_query = standalone_query(current_question(query_text), history)
+    if search_query == current_question(query_text):
+        history = []
+    return session_id, session["division"] or "All", query_text, search_query, history
+
+async def classify_and_retrieve(question, search_query, division):
+    """Classify intent once per request, concurrently with embedding + FAISS search; they are independent.
+
+    The intent is the asked `question`'s own; retrieval uses the (possibly rewritten) `search_query`.
+    """
+    async def classify():
+        with timed("intent"):
+            return await rag.classify_intent(question)
+
+    async def retrieve():
+        with timed("retrieve"):
+            return await retriever.retrieve(search_query, division=division, citation_text=question)
+
+    intent, context = await asyncio.gather(classify(), retrieve(), return_exceptions=True)
+    if isinstance(intent, Exception):
+        print(f"DEBUG: Failed to classify intent: {intent}")
+        intent = "other"
+    return intent, context
+
+def require_context(context):
+    """Unwrap the retrieval result, turning a retrieval failure into a 500 (or the 503/429 it was shed with)."""
+    if isinstance(context, Overloaded):
+        raise context
+    if isinstance(context, Exception):
+        print(f"DEBUG: Failed to retrieve context: {context}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {context}")
+    return context
+
+async def log_interaction(search_query=None, **fields):
+    """Queue the interaction row for the logger's background writer; never waits on SQLite.
+
+    Returns the interaction id that POST /feedback attaches thumbs and comments to. The row carries the
+    request's stage timings so far (everything but the log stage itself). With a `search_query`, the
+    turn is also added to the session's history.
+    """
+    if search_query is not None:
+        remember = lambda: sessions.append(fields['session_id'], current_question(fields['query_text']), search_query, fields['response'])
+        await asyncio.to_thread(remember) if sessions.db_path else remember()
+    metrics.ANSWERS.inc(intent=fields['query_type'], api_used=fields['api_used'])
+    if fields['tokens_used']:
+        metrics.TOKENS.inc(fields['tokens_used'], intent=fields['query_type'])
+    interaction_id = str(uuid.uuid4())
+    timings = request_timings.get()
     try:
-        logger.log_interaction(
-            query_text=query_text,
-            division=division,
-            response=answer,
-            session_id=session_id,
-            response_time=response_time,
-            query_type=query_type,
-            api_used=api_used,
-            tokens_used=tokens_used,
-            thumbs_up=thumbs_up,
-            thumbs_down=thumbs_down,
-            feedback_text=feedback_text,
-            rule_reference=None
-        )
-        print("DEBUG: Interaction logged")
+        with timed("log"):
+            logger.log_interaction(interaction_id=interaction_id, stage_timings=timings_ms(timings) if timings is not None else None, **fields)
     except Exception as e:
         print(f"DEBUG: Failed to log interaction: {e}")
-   
-    return {"question": question, "answer": answer if answer else "Sorry, I couldn't find a rule matching your query."}
+    return interaction_id
 
-@app.get("/validate_call")
-async def validate_call(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None):
-    print(f"DEBUG: Received validate_call question: {question}")
-    if not question:
-        raise HTTPException(status_code=400, detail="No question provided")
-   
-    start_time = time.time()
-    print("DEBUG: Loading idmap")
-    try:
-        idmap = pd.read_csv("data/chunks/rules.idmap.csv")
-    except Exception as e:
-        print(f"DEBUG: Failed to load idmap: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to load idmap: {e}")
-   
-    print("DEBUG: Classifying intent")
-    try:
-        intent = rag.classify_intent(question)
-        print(f"DEBUG: Intent classified: {intent}")
-    except Exception as e:
-        print(f"DEBUG: Failed to classify intent: {e}")
-        intent = "other"
-   
-    # Extract division and session_id
-    division = "All"
-    session_id = str(uuid.uuid4())
-    query_text = question
-    if "Division:" in question:
-        parts = question.split("\n")
-        for part in parts:
-            if part.startswith("Division:"):
-                division = part.replace("Division:", "").strip()
-                query_text = "\n".join([p for p in parts if not p.startswith("Division:")]).strip()
-   
-    if intent != "scenario_based":
-        answer = "This endpoint is for validating umpire calls in specific game scenarios. Please describe a game situation (e.g., outs, runners, call made)."
-        response_time = time.time() - start_time
-        print(f"DEBUG: Logging interaction: query_type={intent}, api_used=Cached")
-        try:
-            logger.log_interaction(
-                query_text=query_text,
-                division=division,
-                response=answer,
-                session_id=session_id,
-                response_time=response_time,
-                query_type=intent,
-                api_used="Cached",
-                tokens_used=0,
-                thumbs_up=thumbs_up,
-                thumbs_down=thumbs_down,
-                feedback_text=feedback_text,
-                rule_reference=None
-            )
-            print("DEBUG: Interaction logged")
-        except Exception as e:
-            print(f"DEBUG: Failed to log interaction: {e}")
-        return {"question": question, "answer": answer}
-   
-    print("DEBUG: Checking scenario slots")
+def missing_slots_answer(missing_slots):
+    return f"Hey coach, I need a bit more info to nail this call! Can you tell me about {', '.join(missing_slots)}? For example, how many outs are there, and who's on base?"
+
+def scenario_slots_answer(query_text):
+    """Ask for the missing outs/runners/call details of a scenario question, or None when it has them all."""
     try:
         missing_slots = rag.check_scenario_slots(query_text)
     except Exception as e:
         print(f"DEBUG: Failed to check scenario slots: {e}")
         missing_slots = []
+    return missing_slots_answer(missing_slots) if missing_slots else None
+
+def validate_call_answer(intent, query_text):
+    """/validate_call's reply when the question is not a complete game scenario, else None."""
+    if intent != "scenario_based":
+        return "This endpoint is for validating umpire calls in specific game scenarios. Please describe a game situation (e.g., outs, runners, call made)."
+    return scenario_slots_answer(query_text)
+
+def sse(event, data):
+    """One server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def fixed_answer_events(question, answer, log_fields):
+    """Stream an answer that needed no generation, as a single token event."""
+    interaction_id = await log_interaction(response=answer, api_used="Cached", tokens_used=0, **log_fields)
+    yield sse("token", {"text": answer})
+    yield sse("done", {
+        "question": question, "answer": answer, "tokens_used": 0,
+        "interaction_id": interaction_id, "session_id": log_fields["session_id"]
+    })
+
+async def answer_events(question, search_query, context, division, intent, history, log_fields, start_time):
+    """Stream the answer as `token` events while gpt-4o-mini produces it, then a `done` event with the full answer.
+
+    The interaction (with the token count from the final chunk) is logged once the stream ends.
+    """
+    cache_key = await answer_cache_key(search_query, context) if context and USE_OPENAI and not history else None
+    cached = cache_key and answer_cache.lookup(division, intent, *cache_key, version=retriever.index_version)
+    answer, tokens_used, api_used = "", 0, "Cached"
+    if cached:
+        answer, api_used = cached[0], "AnswerCache"
+        yield sse("token", {"text": answer})
+    else:
+        with timed("generate"):  # Includes the time the client takes to read the tokens
+            async for text, tokens, api_used in rag.stream_answer(search_query, context, intent=intent, division=division, history=history):
+                answer += text
+                tokens_used = tokens or tokens_used
+                if text:
+                    yield sse("token", {"text": text})
+        if cache_key and api_used == "OpenAI":
+            answer_cache.store(division, intent, *cache_key, answer, tokens_used, version=retriever.index_version)
+    log_fields = dict(log_fields, response_time=time.time() - start_time)
+    interaction_id = await log_interaction(response=answer, api_used=api_used, tokens_used=tokens_used, **log_fields)
+    yield sse("done", {
+        "question": question, "answer": answer or "Sorry, I couldn't find a rule matching your query.", "tokens_used": tokens_used,
+        "interaction_id": interaction_id, "session_id": log_fields["session_id"]
+    })
+
+def query_fixed_answer(intent, question):
+    """/query's reply when a scenario question is missing details, else None."""
+    return scenario_slots_answer(question) if intent == "scenario_based" else None
+
+async def compute_answer(question, search_query, division, intent, context, history, fixed_answer):
+    """(answer, tokens_used, api_used) for a classified question: `fixed_answer(intent, question)`, else a cached or generated answer."""
+    answer = fixed_answer(intent, question)
+    if answer:
+        return answer, 0, "Cached"
    
-    if missing_slots:
-        answer = f"Hey coach, I need a bit more info to nail this call! Can you tell me about {', '.join(missing_slots)}? For example, how many outs are there, and who's on base?"
-        response_time = time.time() - start_time
-        print(f"DEBUG: Logging interaction: query_type={intent}, api_used=Cached")
-        try:
-            logger.log_interaction(
-                query_text=query_text,
-                division=division,
-                response=answer,
-                session_id=session_id,
-                response_time=response_time,
-                query_type=intent,
-                api_used="Cached",
-                tokens_used=0,
-                thumbs_up=thumbs_up,
-                thumbs_down=thumbs_down,
-                feedback_text=feedback_text,
-                rule_reference=None
-            )
-            print("DEBUG: Interaction logged")
-        except Exception as e:
-            print(f"DEBUG: Failed to log interaction: {e}")
-        return {"question": question, "answer": answer}
-   
-    print("DEBUG: Retrieving context")
-    try:
-        context = retriever.retrieve(question)
-        print(f"DEBUG: Retrieved {len(context)} docs")
-    except Exception as e:
-        print(f"DEBUG: Failed to retrieve context: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {e}")
+    context = require_context(context)
    
-    print("DEBUG: Generating answer")
     try:
-        answer, tokens_used = rag.generate_answer(question, context, idmap)
+        return await generate_or_reuse_answer(search_query, context, division, intent, history)
+    except Overloaded:
+        raise
     except Exception as e:
         print(f"DEBUG: Failed to generate answer: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate answer: {e}")
-   
-    response_time = time.time() - start_time
-    query_type = intent
-    api_used = "OpenAI" if USE_OPENAI and context else "Cached"
-    print(f"DEBUG: Logging interaction: query_type={query_type}, api_used={api_used}, tokens_used={tokens_used}")
+
+async def respond(question, query_text, search_query, division, intent, session_id, start_time, feedback, answer, tokens_used, api_used):
+    """Log the interaction and build the JSON response."""
+    interaction_id = await log_interaction(
+        query_text=query_text, division=division, response=answer, session_id=session_id, search_query=search_query,
+        response_time=time.time() - start_time, query_type=intent, api_used=api_used, tokens_used=tokens_used, **feedback
+    )
+    return {
+        "question": question, "answer": answer if answer else "Sorry, I couldn't find a rule matching your query.",
+        "interaction_id": interaction_id, "session_id": session_id
+    }
+
+async def answer_query(question, query_text, search_query, division, intent, context, session_id, start_time, feedback, history=()):
+    """Answer a classified /query question from its retrieved context and log the interaction."""
+    answer, tokens_used, api_used = await compute_answer(search_query, search_query, division, intent, context, history, query_fixed_answer)
+    return await respond(question, query_text, search_query, division, intent, session_id, start_time, feedback, answer, tokens_used, api_used)
+
+async def answer_request(endpoint, question, session_id, division, feedback, fixed_answer):
+    """Shared body of /query and /validate_call.
+
+    Identical questions in flight at the same time (same endpoint, division and normalized standalone
+    query, and no conversation history) are classified, retrieved and answered once; every request
+    still logs its own interaction row, the joiners with api_used "Coalesced" and no tokens. Under
+    load only the one computing an answer is shed, right before it generates; joiners share its fate.
+    """
+    start_time = time.time()
+    session_id, division, query_text, search_query, history = await start_turn(question, session_id, division)
+    asked = current_question(query_text)
+
+    async def compute():
+        intent, context = await classify_and_retrieve(asked, search_query, division)
+        return intent, await compute_answer(asked, search_query, division, intent, context, history, fixed_answer)
+
+    if history:
+        (intent, (answer, tokens_used, api_used)), shared = await compute(), False
+    else:
+        wait_start = time.perf_counter()
+        (intent, (answer, tokens_used, api_used)), shared = await in_flight.run((endpoint, division, normalize_query(search_query)), compute)
+        if shared:
+            record_timing("coalesced", time.perf_counter() - wait_start)
+            metrics.COALESCED.inc(endpoint=endpoint)
+            tokens_used, api_used = 0, "Coalesced"
+    return await respond(question, query_text, search_query, division, intent, session_id, start_time, feedback, answer, tokens_used, api_used)
+
+@app.get("/query")
+async def query_rule(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None,
+                     session_id: str = None, division: str = None):
+    """Answer a rule question. Pass back the returned session_id to ask follow-ups in the same conversation."""
+    if not question:
+        raise HTTPException(status_code=400, detail="No question provided")
+    await ensure_loaded()
+    feedback = dict(thumbs_up=thumbs_up, thumbs_down=thumbs_down, feedback_text=feedback_text, rule_reference=None)
+    return await answer_request("/query", question, session_id, division, feedback, query_fixed_answer)
+
+async def stream_response(question, thumbs_up, thumbs_down, feedback_text, session_id, division, fixed_answer):
+    """Shared body of the /stream endpoints; `fixed_answer(intent, question)` short-circuits generation."""
+    if not question:
+        raise HTTPException(status_code=400, detail="No question provided")
+    await ensure_loaded()
+
+    start_time = time.time()
+    session_id, division, query_text, search_query, history = await start_turn(question, session_id, division)
+    asked = current_question(query_text)
+    intent, context = await classify_and_retrieve(asked, search_query, division)
+    log_fields = dict(
+        query_text=query_text, division=division, session_id=session_id, search_query=search_query, response_time=0.0, query_type=intent,
+        thumbs_up=thumbs_up, thumbs_down=thumbs_down, feedback_text=feedback_text, rule_reference=None
+    )
+    answer = fixed_answer(intent, asked)
+    if answer:
+        events = fixed_answer_events(question, answer, dict(log_fields, response_time=time.time() - start_time))
+    else:
+        CHAT.admit()  # Once streaming starts the status is sent, so shed before
+        events = answer_events(question, search_query, require_context(context), division, intent, history, log_fields, start_time)
+    # No proxy buffering, so each token reaches the client as soon as it is produced
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/query/stream")
+async def query_rule_stream(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None,
+                            session_id: str = None, division: str = None):
+    """/query as server-sent events: `token` events with answer text, then `done` with the full answer."""
+    return await stream_response(
+        question, thumbs_up, thumbs_down, feedback_text, session_id, division,
+        query_fixed_answer
+    )
+
+@app.get("/validate_call/stream")
+async def validate_call_stream(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None,
+                               session_id: str = None, division: str = None):
+    """/validate_call as server-sent events."""
+    return await stream_response(question, thumbs_up, thumbs_down, feedback_text, session_id, division, validate_call_answer)
+
+class BatchQuery(BaseModel):
+    questions: List[str]
+
+@app.post("/query/batch")
+async def query_batch(batch: BatchQuery):
+    """Answer many /query questions at once: one embeddings call, one matrix FAISS search per division,
+    identical questions answered once, and answers generated BATCH_CONCURRENCY at a time.
+
+    Returns one result per question, in order, each with either an "answer" or an "error".
+    """
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    await ensure_loaded()
+
+    start_time = time.time()
+    session_id = str(uuid.uuid4())  # One session for the whole batch
+    feedback = dict(thumbs_up=None, thumbs_down=None, feedback_text=None, rule_reference=None)
+    questions = [question for question in dict.fromkeys(batch.questions) if question]
+    parsed = [parse_division(question) for question in questions]
+    search_queries = [current_question(query_text) for _, query_text in parsed]
+
+    with timed("intent"):
+        intents = await asyncio.gather(*(rag.classify_intent(search_query) for search_query in search_queries), return_exceptions=True)
     try:
-        logger.log_interaction(
-            query_text=query_text,
-            division=division,
-            response=answer,
-            session_id=session_id,
-            response_time=response_time,
-            query_type=query_type,
-            api_used=api_used,
-            tokens_used=tokens_used,
-            thumbs_up=thumbs_up,
-            thumbs_down=thumbs_down,
-            feedback_text=feedback_text,
-            rule_reference=None
-        )
-        print("DEBUG: Interaction logged")
+        with timed("retrieve"):
+            contexts = await retriever.retrieve_batch(search_queries, divisions=[division for division, _ in parsed])
     except Exception as e:
-        print(f"DEBUG: Failed to log interaction: {e}")
-   
-    return {"question": question, "answer": answer}
+        contexts = [e] * len(questions)
+    shared_timings = dict(request_timings.get() or {})
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer_one(question, division, query_text, search_query, intent, context):
+        if isinstance(intent, Exception):
+            print(f"DEBUG: Failed to classify intent: {intent}")
+            intent = "other"
+        # Each answer's row gets the batch's shared stages plus its own generate/log (gather runs it in a copied context)
+        request_timings.set(dict(shared_timings))
+        async with semaphore:
+            start_deadline()  # Each answer gets the full budget from when its generation starts
+            try:
+                return await answer_query(question, query_text, search_query, division, intent, context, session_id, start_time, feedback)
+            except HTTPException as e:
+                return {"question": question, "error": e.detail}
+            except Overloaded as e:
+                return {"question": question, "error": str(e), "retry_after": e.retry_after_header}
+
+    answers = await asyncio.gather(*(
+        answer_one(question, division, query_text, search_query, intent, context)
+        for question, (division, query_text), search_query, intent, context in zip(questions, parsed, search_queries, intents, contexts)
+    ))
+    by_question = dict(zip(questions, answers))
+    results = [by_question.get(question) or {"question": question, "error": "No question provided"} for question in batch.questions]
+    return {"results": results}
+
+@app.get("/validate_call")
+async def validate_call(question: str, thumbs_up: int = None, thumbs_down: int = None, feedback_text: str = None,
+                        session_id: str = None, division: str = None):
+    if not question:
+        raise HTTPException(status_code=400, detail="No question provided")
+    await ensure_loaded()
+    feedback = dict(thumbs_up=thumbs_up, thumbs_down=thumbs_down, feedback_text=feedback_text, rule_reference=None)
+    return await answer_request("/validate_call", question, session_id, division, feedback, validate_call_answer)
+
+class Feedback(BaseModel):
+    interaction_id: str
+    thumbs_up: Optional[int] = None
+    thumbs_down: Optional[int] = None
+    feedback_text: Optional[str] = None
+
+@app.post("/feedback", status_code=202)
+async def record_feedback(feedback: Feedback):
+    """Attach thumbs/feedback to the interaction a /query or /validate_call response returned; no RAG re-run.
+
+    Accepted, not yet applied: the logger's writer applies it behind the request, and counts feedback
+    for interaction ids that match no logged row (logger.unmatched_feedback).
+    """
+    print(f"DEBUG: Received feedback for interaction {feedback.interaction_id}")
+    if feedback.thumbs_up is None and feedback.thumbs_down is None and not feedback.feedback_text:
+        raise HTTPException(status_code=400, detail="No feedback provided")
+    logger.log_feedback(feedback.interaction_id, feedback.thumbs_up, feedback.thumbs_down, feedback.feedback_text or None)
+    return {"interaction_id": feedback.interaction_id, "status": "queued"}
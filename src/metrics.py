@@ -0,0 +1,125 @@
+"""Process-wide Prometheus-style counters and histograms, served as text by GET /metrics.
+
+Kept dependency-free: the service exposes a handful of series, so the text exposition format is
+written directly instead of pulling in prometheus_client. Counts are per process; scrape every
+worker (or sum them in the dashboard) when running more than one.
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Seconds; covers a cached FAISS search (sub-ms) up to a slow gpt-4o-mini completion
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labels))
+        return series[-1] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, series):
+                    cumulative += bucket_count
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("umpiregpt_stage_seconds", "Time spent in each request stage (intent, embed, faiss, bm25, generate, log, ...).", ["stage"])
+REQUEST_SECONDS = Histogram("umpiregpt_request_seconds", "Request latency until the response headers are sent.", ["route", "status"])
+ANSWERS = Counter("umpiregpt_answers_total", "Logged answers by intent and source (OpenAI, Local, AnswerCache, Cached, Coalesced, Error).", ["intent", "api_used"])
+TOKENS = Counter("umpiregpt_tokens_total", "OpenAI tokens spent on answers, by intent.", ["intent"])
+CACHE_LOOKUPS = Counter("umpiregpt_cache_lookups_total", "Embedding and answer cache lookups by result.", ["cache", "result"])
+OPENAI_ERRORS = Counter("umpiregpt_openai_errors_total", "Failed OpenAI calls by operation and exception type.", ["operation", "error"])
+COALESCED = Counter("umpiregpt_coalesced_total", "Requests answered by joining an identical request already in flight.", ["endpoint"])
+UPSTREAM_IN_FLIGHT = Gauge("umpiregpt_upstream_in_flight", "OpenAI calls running now, by upstream (embeddings, chat).", ["upstream"])
+UPSTREAM_QUEUE_DEPTH = Gauge("umpiregpt_upstream_queue_depth", "Calls waiting for an OpenAI slot, by upstream; scale out on this.", ["upstream"])
+UPSTREAM_WAIT_SECONDS = Histogram("umpiregpt_upstream_wait_seconds", "Time calls waited for an OpenAI slot.", ["upstream"])
+SHED = Counter("umpiregpt_shed_total", "Calls refused instead of queued past the latency budget, by upstream and reason.", ["upstream", "reason"])
+HEDGES = Counter("umpiregpt_openai_hedges_total", "Second requests raced against a slow OpenAI call (sent), and how many finished first (won).", ["operation", "outcome"])
+FALLBACKS = Counter("umpiregpt_fallbacks_total", "OpenAI calls given up at their deadline and served locally (retrieve: BM25 only, generate: rule text).", ["stage"])
+LOG_ROWS = Counter("umpiregpt_log_rows_total", "Interaction log rows and feedback updates by outcome (written, dropped, unmatched_feedback).", ["outcome"])
+REGISTRY = (STAGE_SECONDS, REQUEST_SECONDS, ANSWERS, TOKENS, CACHE_LOOKUPS, OPENAI_ERRORS, COALESCED,
+            UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_WAIT_SECONDS, SHED, HEDGES, FALLBACKS)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
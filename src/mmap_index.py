@@ -0,0 +1,51 @@
+"""Exact L2 search over a memory-mapped float32 matrix, shared by every worker process.
+
+faiss reads a flat index into each process's heap (IO_FLAG_MMAP only maps IVF inverted lists), so N
+uvicorn workers hold N copies of the vectors. A bundle therefore also carries the flat index's
+vectors as rules.vectors.npy; each worker maps it read-only and the OS page cache keeps one physical
+copy however many workers there are. Results match faiss.IndexFlatL2, including -1 padding.
+"""
+import os
+
+import numpy as np
+
+VECTORS_FILE = "rules.vectors.npy"
+
+
+def flat_vectors(index):
+    """The (ntotal, d) float32 vectors of an exact L2 index, or None for any other index type."""
+    import faiss
+    if type(index) not in (faiss.IndexFlat, faiss.IndexFlatL2) or index.metric_type != faiss.METRIC_L2:
+        return None
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+
+def write_vectors(vectors: np.ndarray, path: str):
+    """Save `vectors` as a C-ordered float32 .npy, written to a temp file and renamed into place."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+class MmapFlatIndex:
+    def __init__(self, path: str):
+        """Map `path` (from write_vectors) read-only; only the row norms live in this process."""
+        self.vectors = np.load(path, mmap_mode="r")
+        self.ntotal, self.d = self.vectors.shape
+        self._norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    def search(self, x: np.ndarray, k: int, params=None):
+        """(distances, indices) like faiss Index.search; `params` is an optional boolean row mask."""
+        x = np.asarray(x, dtype=np.float32)
+        distances = (x * x).sum(axis=1, keepdims=True) - 2 * (x @ self.vectors.T) + self._norms
+        if params is not None:
+            distances[:, ~params] = np.inf
+        k = min(k, self.ntotal)
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < self.ntotal else np.tile(np.arange(self.ntotal), (len(x), 1))
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        indices = np.take_along_axis(top, order, axis=1).astype(np.int64)
+        top_distances = np.take_along_axis(top_distances, order, axis=1)
+        indices[~np.isfinite(top_distances)] = -1  # Filtered out, as faiss pads short result lists
+        return np.maximum(top_distances, 0).astype(np.float32), indices
@@ -0,0 +1,109 @@
+"""The process's one pooled OpenAI client, and the per-request deadline its calls run under.
+
+Every request starts a deadline REQUEST_BUDGET seconds out; each OpenAI call gets the smaller of its
+own cap (EMBED_TIMEOUT, INTENT_TIMEOUT, CHAT_TIMEOUT) and what is left of the request's budget, and
+raises DeadlineExceeded past it. Callers then fall back to a local answer instead of erroring. The
+client itself never retries: a retry spends the budget the fallback needs.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from .config import OPENAI_MAX_CONNECTIONS, OPENAI_KEEPALIVE, REQUEST_BUDGET
+from .metrics import HEDGES
+
+MIN_CALL_SECONDS = 0.05  # Not worth starting a call with less time than this left
+
+# time.monotonic() by which the current request's OpenAI calls must finish; None outside a request
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+_client = None
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def shared_client():
+    """The AsyncOpenAI client shared by RAG and Retriever: one keep-alive connection pool per process."""
+    global _client
+    if _client is None:
+        # Imported here: src.main imports this module before the heavy imports run in the background
+        import httpx
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            timeout=httpx.Timeout(60.0, connect=5.0),  # Backstop only; call deadlines are enforced by deadline()
+            http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS, keepalive_expiry=OPENAI_KEEPALIVE,
+            )),
+        )
+    return _client
+
+
+def start_deadline(budget: float = REQUEST_BUDGET):
+    """Give the current request (or batch item) `budget` seconds for its OpenAI calls."""
+    request_deadline.set(time.monotonic() + budget)
+
+
+def remaining() -> float:
+    """Seconds left of the current request's budget (infinite outside a request)."""
+    deadline = request_deadline.get()
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+@asynccontextmanager
+async def deadline(cap: float):
+    """Run the block for at most `cap` seconds or what is left of the request's budget, whichever is less.
+
+    Raises DeadlineExceeded when that runs out, or at once when less than MIN_CALL_SECONDS is left.
+    """
+    seconds = min(cap, remaining())
+    if seconds < MIN_CALL_SECONDS:
+        raise DeadlineExceeded("Request budget exhausted")
+    timeout = asyncio.timeout(seconds)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError as e:
+        if not timeout.expired():
+            raise  # The call's own timeout error, not ours
+        raise DeadlineExceeded(f"No response within {seconds:.1f}s") from e
+
+
+async def hedged(call: Callable[[], Awaitable], delay: float, operation: str, can_hedge: Callable[[], bool] = lambda: True,
+                 hedge: Optional[Callable[[], Awaitable]] = None):
+    """await call(), racing hedge() (default: call() again) against it if it has not finished after `delay` seconds.
+
+    The first successful result wins and the other call is cancelled; if both fail, the first call's
+    error is raised. No hedge is sent when `delay` is 0 or `can_hedge()` is false (e.g. no free slot).
+    """
+    if not delay:
+        return await call()
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not can_hedge():
+            return await first
+        HEDGES.inc(operation=operation, outcome="sent")
+        tasks.append(asyncio.ensure_future((hedge or call)()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    if task is not first:
+                        HEDGES.inc(operation=operation, outcome="won")
+                    return task.result()
+        return first.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # Retrieved: the losing call's error is not "never retrieved"
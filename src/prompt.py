@@ -0,0 +1,136 @@
+"""Prompt assembly for RAG answers: the system prompt once, then the rulebook context packed to a token budget.
+
+Earlier turns of a follow-up take up to HISTORY_SHARE of PROMPT_CONTEXT_TOKENS, newest first; retrieved
+chunks are packed in rank order into what is left. Chunks that add nothing are dropped first: repeats
+of a chunk already packed, chunks whose text is (nearly) contained in a higher-ranked one, and division
+variants of a rule that do not apply to the asker's division.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .divisions import chunk_div, division_level, tag_levels
+
+SYSTEM_PROMPT = (
+    "You are UmpGPT, an authoritative but approachable instructor and umpire for Little League Baseball International (LLI). "
+    "Your mission is to give the correct ruling and a brief, clear explanation that a manager can act on immediately. "
+    "Always cite exact sources from the Official Little League Rulebook (e.g., Rule 7.13 NOTE or Rule 6.09(b)). "
+    "NEVER invent a rule or section number. If a rule number is unavailable, cite the section title (e.g., Interference—LL Rulebook). "
+    "Assume Baseball unless Softball is specified. Match the user’s division (Tee Ball, Minors, Majors, etc.) if provided, or default to Majors/Minors. "
+    "Use a professional, confident, and supportive tone, like a trusted umpire at a plate meeting. "
+    "Structure your response with: **Ruling**: One-sentence call (e.g., safe/out). **Why**: Short, plain-English explanation. **Rule References**: Exact rule/section identifiers. **Key Conditions Recap**: Bullet points listing critical conditions. **Live/Dead Ball**: Status of the ball. **Example**: Practical scenarios. **Division Note**: Clarify if rules differ by division (e.g., Minors vs. Majors). "
+    "For philosophical questions, explain the rule’s purpose with citations. For opinion questions, use teaching examples or admit if outside the rulebook. For off-topic questions, redirect to baseball rules. "
+    "For scenario-based queries, ensure rulings are precise, especially for dropped third strike scenarios (Rule 6.09(b)): with two outs, the batter is not automatically out and can attempt to reach first base if the catcher drops the third strike, regardless of runners on base."
+)
+
+# What each intent adds to the shared response structure in SYSTEM_PROMPT
+INTENT_INSTRUCTIONS = {
+    "rule_reference": "Define the rule or give the call, with exact rule numbers (e.g., Rule 2.00, 6.05(d)).",
+    "philosophical": "Explain the rule’s purpose in plain language, with exact rule citations.",
+    "opinion": "Use teaching examples or stories, and say so if the answer is outside the rulebook; cite rules where they apply.",
+}
+DEFAULT_INSTRUCTION = "Give the call for this situation, with exact rule numbers (e.g., Rule 2.00, 6.05(d))."
+
+HISTORY_SHARE = 0.5  # Of the prompt token budget, at most this much for earlier turns
+# A packed chunk whose words are at least this much contained in a higher-ranked one adds nothing
+OVERLAP_THRESHOLD = 0.8
+WORD_RE = re.compile(r"\w+")
+PIECE_RE = re.compile(r"[^\W\d]+|\d{1,3}|[^\w\s]")
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    """gpt-4o-mini's tokenizer when tiktoken (and its encoding file) is available, else None."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of `text`: exact with tiktoken, else an estimate from words, digit groups and punctuation."""
+    encoder = _encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    # Common English words are one BPE token; long words split about every 6 characters
+    return sum(1 + (len(piece) - 1) // 6 for piece in PIECE_RE.findall(text))
+
+
+def _words(text: str) -> set:
+    return set(WORD_RE.findall(text.lower()))
+
+
+def select_chunks(context: List[Dict], division: Optional[str] = None) -> List[Dict]:
+    """The ranked `context` without repeats, chunks (nearly) contained in a higher-ranked one, and
+    division variants of a rule that do not apply to `division`."""
+    level = division_level(division)
+    selected, kept, seen = [], [], set()
+    for doc in context:
+        key = doc.get('id') or doc['text']
+        if key in seen:
+            continue
+        seen.add(key)
+        if level is not None and level not in tag_levels(chunk_div(doc)):
+            continue  # A variant of the rule for other divisions
+        words = _words(doc['text'])
+        if any(len(words & other) >= OVERLAP_THRESHOLD * len(words) for other in kept):
+            continue
+        selected.append(doc)
+        kept.append(words)
+    return selected
+
+
+def pack_context(context: List[Dict], budget: int, division: Optional[str] = None,
+                 label: Callable[[Dict], str] = lambda doc: f"Rule {doc.get('citation', '')}".strip(),
+                 count: Callable[[str], int] = count_tokens) -> List[str]:
+    """'<label>: <text>' lines for the select_chunks() of the ranked `context`, cut to `budget` tokens.
+
+    The top chunk is always kept (truncated to the budget if it alone is longer).
+    """
+    no_division = division_level(division) is None
+    lines, used = [], 0
+    for doc in select_chunks(context, division):
+        name = label(doc)
+        div = chunk_div(doc)
+        if div != "all" and no_division:
+            name = f"{name} [{div}]"  # Keep division variants of one rule apart when the asker gave no division
+        line = f"{name}: {doc['text']}"
+        tokens = count(line)
+        if used + tokens > budget:
+            if lines:
+                continue  # A shorter, lower-ranked chunk may still fit
+            line = " ".join(line.split()[:max(1, budget * 3 // 4)])
+            tokens = count(line)
+        lines.append(line)
+        used += tokens
+    return lines
+
+
+def fit_history(history: Sequence[Tuple[str, str, str]], budget: int,
+                count: Callable[[str], int] = count_tokens) -> Tuple[List[Tuple[str, str, str]], int]:
+    """The most recent `history` turns whose question and answer fit in `budget` tokens, oldest first, and their tokens."""
+    turns, used = [], 0
+    for turn in reversed(history):
+        tokens = count(turn[0]) + count(turn[2])
+        if used + tokens > budget:
+            break
+        turns.insert(0, turn)
+        used += tokens
+    return turns, used
+
+
+def build_messages(query: str, context_lines: List[str], intent: Optional[str],
+                   history: Sequence[Tuple[str, str, str]] = ()) -> List[Dict[str, str]]:
+    """System message with the instructions, the conversation so far, then a user message with the
+    context, question and intent instruction. `history` holds (question, search query, answer) turns."""
+    instruction = INTENT_INSTRUCTIONS.get(intent, DEFAULT_INSTRUCTION)
+    context_text = "\n".join(context_lines)
+    turns = []
+    for question, _, answer in history:
+        turns += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *turns,
+        {"role": "user", "content": f"Relevant rulebook context:\n{context_text}\n\nQuestion: {query}\n\n{instruction} Use the response structure from your instructions."},
+    ]
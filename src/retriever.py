@@ -1,44 +1,232 @@
+import asyncio
+import math
 import faiss
 import numpy as np
-import json
-from typing import Dict, List
-from openai import OpenAI
+from typing import Dict, List, Optional
+from openai import APITimeoutError, RateLimitError
 import os
 from dotenv import load_dotenv
+from .chunk_store import ChunkStore
+from .embedders import local_embedder
+from .embedding_cache import EmbeddingCache
+from .divisions import LEVELS, chunk_div, division_level, tag_levels
+from .lexical import LexicalIndex
+from .mmap_index import MmapFlatIndex
+from .rule_catalog import RuleCatalog
+from .metrics import FALLBACKS, OPENAI_ERRORS
+from .openai_client import DeadlineExceeded, deadline, hedged, shared_client
+from .scheduler import EMBEDDINGS, rate_limited
+from .timing import timed
+from .config import USE_OPENAI, EMBED_CACHE_PATH, EMBED_CACHE_SIZE, EMBED_DIM, FAISS_NPROBE, FAISS_EF_SEARCH, INDEX_MMAP, EMBED_TIMEOUT, EMBED_HEDGE_DELAY
+
+RRF_K = 60  # Reciprocal rank fusion damping constant
+INPUTS_PER_TIMEOUT = 100  # An embeddings call gets EMBED_TIMEOUT per this many inputs
+NATIVE_DIM = 3072  # text-embedding-3-large
 
 class Retriever:
-    def __init__(self, index_path: str, idmap_path: str):
-        """Initialize the retriever with FAISS index and ID mapping."""
+    def __init__(self, index_path: str, idmap_path: str, store: Optional[ChunkStore] = None, cache: Optional[EmbeddingCache] = None,
+                 catalog: Optional[RuleCatalog] = None, vectors_path: Optional[str] = None, embedder_name: Optional[str] = None):
+        """Initialize the retriever with FAISS index, (shared) chunk store and (shared) rule catalog.
+
+        `vectors_path` is a bundle's rules.vectors.npy: with INDEX_MMAP the flat index is searched through
+        it, so every worker process shares one copy of the vectors instead of reading its own.
+        Without OpenAI (USE_OPENAI=false), queries are embedded locally when `embedder_name` (meta.json's
+        "embedder") says the index was built with the hash embedder, else retrieval is BM25 only.
+        """
         load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = shared_client() if USE_OPENAI else None
         self.data_path = os.getenv("KB_PATH", "data/chunks/rules.chunks.jsonl")
         self.index_path = index_path
         self.idmap_path = idmap_path
-        self.index = faiss.read_index(index_path)
-        if self.index.d != 3072:  # Matches text-embedding-3-large
-            raise ValueError(f"FAISS index dimension {self.index.d} does not match expected 3072")
-        self.idmap = {}
-        with open(idmap_path, 'r') as f:
-            next(f)  # Skip header row
-            for line in f:
-                fields = line.strip().split(',')
-                id_val, doc_id = fields[0], fields[-1]  # Use first (source_file) and last (new_id) columns
-                self.idmap[id_val] = doc_id  # Store source_file as key
+        self.store = store if store is not None else ChunkStore(self.data_path)
+        self.cache = cache if cache is not None else EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_SIZE)
+        if vectors_path and INDEX_MMAP:
+            self.index = MmapFlatIndex(vectors_path)
+        else:
+            # IVF inverted lists are mmapped instead of read (other index types load as usual); artifacts are replaced, never rewritten
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        self.dim = EMBED_DIM
+        self.local_embedder = None if USE_OPENAI else local_embedder(embedder_name, self.dim)
+        if self.index.d != self.dim:
+            raise ValueError(f"FAISS index dimension {self.index.d} does not match EMBED_DIM {self.dim}; rebuild with `python -m src.build_index --dim {self.dim}`")
+        self.catalog = catalog if catalog is not None else RuleCatalog.from_store(self.store, idmap_path)
+        if not len(self.catalog) == len(self.store) == self.index.ntotal:
+            raise ValueError(f"Rule catalog ({len(self.catalog)}), chunk store ({len(self.store)}) and FAISS index ({self.index.ntotal}) sizes differ")
         self.model = 'text-embedding-3-large'
+        # Shortened embeddings are different vectors, so they get their own cache namespace
+        self.model_key = self.model if self.dim == NATIVE_DIM else f"{self.model}@{self.dim}"
+        self._build_division_selectors()
+        self.lexical = LexicalIndex(self.store)
+        stat = os.stat(index_path)
+        self.index_version = f"{self.store.version}-{self.index.ntotal}-{stat.st_size}-{int(stat.st_mtime)}"
+
+    def _build_division_selectors(self):
+        """Precompute one FAISS id-selector bitmap per division level from the chunk `div` tags."""
+        row_levels = [tag_levels(chunk_div(self.store.get(i))) for i in range(len(self.store))]
+        self._masks = {}
+        self._bitmaps = {}
+        self._search_params = {}
+        for level in LEVELS:
+            mask = np.array([level in levels for levels in row_levels], dtype=bool)
+            self._masks[level] = mask
+            if isinstance(self.index, MmapFlatIndex):
+                self._search_params[level] = mask  # Filters by the mask itself
+                continue
+            # The selector only holds a pointer, so keep the packed bitmap alive alongside it
+            self._bitmaps[level] = np.packbits(mask, bitorder='little')
+            selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(self._bitmaps[level]))
+            self._search_params[level] = self._make_search_params(selector)
+        try:
+            self.index.search(np.zeros((1, self.index.d), dtype='float32'), 1, params=self._search_params[LEVELS[0]])
+        except RuntimeError:
+            # e.g. IndexPQ: no id-selector support, so retrieve() over-fetches and filters by mask instead
+            print(f"DEBUG: {type(self.index).__name__} does not support id selectors, post-filtering divisions")
+            self._search_params = {}
+
+    def _make_search_params(self, selector):
+        """Search parameters carrying `selector` plus the index type's own knobs (IVF nprobe, HNSW efSearch)."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = FAISS_NPROBE  # Also the default for unfiltered searches
+            return faiss.SearchParametersIVF(sel=selector, nprobe=FAISS_NPROBE)
+        if isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = FAISS_EF_SEARCH
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_EF_SEARCH)
+        return faiss.SearchParameters(sel=selector)
+
+    async def embed(self, query: str) -> np.ndarray:
+        """Embed a query, serving repeats from the embedding cache."""
+        return (await self.embed_batch([query]))[0]
+
+    async def embed_batch(self, queries: List[str]) -> np.ndarray:
+        """Embed queries as one matrix, with a single API call for all the cache misses."""
+        if self.local_embedder is not None:
+            with timed("embed"):
+                return self.local_embedder.embed(queries)  # Microseconds per query: not worth caching
+        vectors = self.cache.get_many(queries, self.model_key, disk=False)
+        unseen = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+        if unseen:
+            # The LRU misses are read from SQLite off the event loop, in one query
+            found = dict(zip(unseen, await asyncio.to_thread(self.cache.get_many, unseen, self.model_key)))
+            vectors = [found[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+        missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+        if missing:
+            kwargs = {"dimensions": self.dim} if self.dim != NATIVE_DIM else {}
+            create = lambda: self.client.embeddings.create(input=missing, model=self.model, **kwargs)
+
+            async def hedge():
+                # A hedge claims a slot of its own, and only a free one, so it never adds to a queue
+                async with EMBEDDINGS.slot(budget=0):
+                    return await create()
+
+            has_free_slot = lambda: EMBEDDINGS.in_flight < EMBEDDINGS.limit and not EMBEDDINGS.waiting
+            async with EMBEDDINGS.slot():
+                try:
+                    with timed("embed"):
+                        async with deadline(EMBED_TIMEOUT * math.ceil(len(missing) / INPUTS_PER_TIMEOUT)):
+                            embedding_response = await hedged(create, EMBED_HEDGE_DELAY, "embeddings", has_free_slot, hedge)
+                except Exception as e:
+                    OPENAI_ERRORS.inc(operation="embeddings", error=type(e).__name__)
+                    raise rate_limited(e) if isinstance(e, RateLimitError) else e
+            fresh = {query: np.array(item.embedding, dtype='float32') for query, item in zip(missing, embedding_response.data)}
+            await asyncio.to_thread(lambda: [self.cache.put(query, self.model_key, vector) for query, vector in fresh.items()])
+            vectors = [fresh[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+        return np.stack(vectors)
 
-    def retrieve(self, query: str, k: int = 5) -> List[Dict]:
-        """Retrieve top-k relevant documents using FAISS index."""
-        embedding_response = self.client.embeddings.create(input=[query], model=self.model)
-        query_vector = np.array(embedding_response.data[0].embedding).reshape(1, -1).astype('float32')
-        if query_vector.shape[1] != self.index.d:
-            raise ValueError(f"Query vector dimension {query_vector.shape[1]} does not match index dimension {self.index.d}")
-        distances, indices = self.index.search(query_vector, k)
+    async def retrieve(self, query: str, k: int = 5, division: Optional[str] = None, citation_text: Optional[str] = None) -> List[Dict]:
+        """Retrieve top-k relevant documents for `division`, fusing BM25 and FAISS rankings.
+
+        Questions that name a rule ("Rule 6.09(b)", "7.13 NOTE") in `citation_text` (default: the query)
+        are answered straight from the citation index without an embedding call.
+        """
+        return (await self.retrieve_batch([query], k, [division], [citation_text]))[0]
+
+    async def retrieve_batch(self, queries: List[str], k: int = 5, divisions: Optional[List[Optional[str]]] = None,
+                             citation_texts: Optional[List[Optional[str]]] = None) -> List[List[Dict]]:
+        """retrieve() for many queries: one embeddings call and one matrix FAISS search per division level."""
+        divisions = divisions or [None] * len(queries)
+        citation_texts = citation_texts or [None] * len(queries)
+        levels = [division_level(division) for division in divisions]
+        results: List[Optional[List[Dict]]] = [None] * len(queries)
+        pending = []
+        for i, (query, citation_text) in enumerate(zip(queries, citation_texts)):
+            cited_rows = self.lexical.match_citations(query if citation_text is None else citation_text, self._masks.get(levels[i]), k)
+            if cited_rows:
+                results[i] = [self._doc(row, match='citation') for row in cited_rows]
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        if self.client is None and self.local_embedder is None:
+            return self._lexical_only(queries, levels, pending, k, results)  # Offline, and the index needs OpenAI query vectors
+        try:
+            query_vectors = await self.embed_batch([queries[i] for i in pending])
+        except (DeadlineExceeded, APITimeoutError):
+            # Out of time for the embedding: rank by BM25 alone rather than fail the question
+            FALLBACKS.inc(len(pending), stage="retrieve")
+            return self._lexical_only(queries, levels, pending, k, results)
+        if query_vectors.shape[1] != self.index.d:
+            raise ValueError(f"Query vector dimension {query_vectors.shape[1]} does not match index dimension {self.index.d}")
+        candidates = max(4 * k, 20)
+        # The id selector is per search call, so queries are grouped into one matrix search per division level
+        by_level = {}
+        for n, i in enumerate(pending):
+            by_level.setdefault(levels[i], []).append(n)
+        for level, positions in by_level.items():
+            # FAISS releases the GIL, so searching on a worker thread keeps the event loop free
+            with timed("faiss"):
+                vector_hits = await asyncio.to_thread(self._search, query_vectors[positions], candidates, level)
+            for n, hits in zip(positions, vector_hits):
+                i = pending[n]
+                with timed("bm25"):
+                    lexical_hits = self.lexical.search(queries[i], candidates, self._masks.get(level))
+                results[i] = self._fuse(hits, lexical_hits, k)
+        return results
+
+    def _lexical_only(self, queries: List[str], levels: List[Optional[str]], pending: List[int], k: int, results: List) -> List[List[Dict]]:
+        """Fill `results` for the `pending` queries from BM25 alone."""
+        candidates = max(4 * k, 20)
+        for i in pending:
+            with timed("bm25"):
+                results[i] = self._fuse([], self.lexical.search(queries[i], candidates, self._masks.get(levels[i])), k)
+        return results
+
+    def _search(self, query_vectors: np.ndarray, candidates: int, level: Optional[str]) -> List[List]:
+        """(row, L2 distance) hits per query row, restricted to the division level."""
+        mask = self._masks.get(level)
+        params = self._search_params.get(level)
+        post_filter = mask is not None and params is None
+        fetch = min(self.index.ntotal, 4 * candidates) if post_filter else candidates
+        distances, indices = self.index.search(np.ascontiguousarray(query_vectors), fetch, params=params)
+        return [
+            [
+                (int(i), float(d)) for d, i in zip(row_distances, row_indices)
+                if 0 <= i < len(self.store) and (not post_filter or mask[i])  # FAISS pads with -1
+            ][:candidates]
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+
+    def _fuse(self, vector_hits: List, lexical_hits: List, k: int) -> List[Dict]:
+        """Reciprocal rank fusion: robust to BM25 scores and L2 distances living on different scales."""
+        fused = {}
+        for hits in (vector_hits, lexical_hits):
+            for rank, (row, _) in enumerate(hits):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+        distances_by_row = dict(vector_hits)
+        bm25_by_row = dict(lexical_hits)
         relevant_docs = []
-        with open(self.data_path, 'r') as f:
-            for i, line in enumerate(f):
-                if i in indices[0]:
-                    doc = json.loads(line)
-                    doc['distance'] = float(distances[0][list(indices[0]).index(i)])
-                    doc['id'] = self.idmap.get(doc.get('source_file', str(i)), f"doc_{i}")
-                    relevant_docs.append(doc)
+        for row in sorted(fused, key=fused.get, reverse=True)[:k]:
+            doc = self._doc(row, match='hybrid')
+            doc['distance'] = distances_by_row.get(row)
+            doc['bm25'] = bm25_by_row.get(row)
+            doc['score'] = fused[row]
+            relevant_docs.append(doc)
         return relevant_docs
+
+    def _doc(self, row: int, match: str) -> Dict:
+        doc = self.store.get(row)
+        doc['id'] = self.catalog.chunk_id(row)
+        doc['row'] = row
+        doc['match'] = match
+        return doc
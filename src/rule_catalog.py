@@ -0,0 +1,82 @@
+import csv
+from typing import Dict, List, Optional, Tuple
+
+from .chunk_store import ChunkStore
+from .lexical import normalize_citation
+
+# Chunk type segment of the title ("rule.7.13 • note(1) • all") -> how the rulebook cites it
+CITATION_SUFFIXES = {"note": "NOTE", "exc": "EXCEPTION", "pen": "PENALTY", "ar": "APPROVED RULING", "ex": "EXAMPLE"}
+
+
+def rule_label(citation: str, title: str) -> str:
+    """Display label for a chunk: 'Rule 7.13 NOTE 1', 'Rule 6.09(b)', 'Rule 2.00 (Balk)'."""
+    parts = [part.strip() for part in title.split("•")]
+    label = f"Rule {normalize_citation(citation)}" if citation else "Rule"
+    chunk_type, _, number = parts[1].partition("(") if len(parts) > 1 else ("rule", "", "")
+    if chunk_type == "def" or citation in ("2", "2.00"):
+        # Definitions: "rule.2.002.appeal" -> "Appeal"
+        term = parts[0].rsplit(".", 1)[-1].replace("_", " ").title()
+        return f"{label} ({term})" if term and not term.isdigit() else label
+    suffix = CITATION_SUFFIXES.get(chunk_type)
+    if suffix:
+        label = f"{label} {suffix} {number.rstrip(')')}".rstrip()
+    return label
+
+
+class RuleCatalog:
+    def __init__(self, ids: List[str], citations: List[str], chapters: List[str], titles: List[str],
+                 sources: Optional[Dict[str, Tuple[str, str]]] = None):
+        """Immutable lookups from FAISS row id to chunk id, citation, chapter and display label, built once at startup.
+
+        `sources` maps a record id (the chunk id without '#n') to its (source_file, source_line) from the idmap.
+        """
+        if not len(ids) == len(citations) == len(chapters) == len(titles):
+            raise ValueError("Rule catalog columns have different lengths")
+        self.ids = tuple(ids)
+        self.citations = tuple(normalize_citation(citation) if citation else "" for citation in citations)
+        self.chapters = tuple(chapters)
+        self.titles = tuple(titles)
+        self.labels = tuple(rule_label(citation, title) for citation, title in zip(citations, titles))
+        sources = sources or {}
+        self.sources = tuple(sources.get(chunk_id.split("#", 1)[0], ("", "")) for chunk_id in ids)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_meta(cls, meta: Dict, idmap_path: Optional[str] = None) -> "RuleCatalog":
+        """Catalog from meta.json's `ids`, `citations`, `chapters` and `titles` columns."""
+        return cls(meta["ids"], meta["citations"], meta["chapters"], meta["titles"], load_sources(idmap_path))
+
+    @classmethod
+    def from_store(cls, store: ChunkStore, idmap_path: Optional[str] = None) -> "RuleCatalog":
+        """Catalog read from the chunks themselves, for indexes built without a meta.json."""
+        docs = [store.get(row) for row in range(len(store))]
+        return cls(
+            [doc.get("id", f"doc_{row}") for row, doc in enumerate(docs)], [doc.get("citation", "") for doc in docs],
+            [doc.get("chapter", "") for doc in docs], [doc.get("title", "") for doc in docs], load_sources(idmap_path)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def chunk_id(self, row: int) -> str:
+        return self.ids[row]
+
+    def citation(self, row: int) -> str:
+        return self.citations[row]
+
+    def label(self, row: int) -> str:
+        return self.labels[row]
+
+    def row(self, chunk_id: str) -> Optional[int]:
+        return self._rows.get(chunk_id)
+
+
+def load_sources(idmap_path: Optional[str]) -> Dict[str, Tuple[str, str]]:
+    """new_id -> (source_file, source_line) from rules.idmap.csv; empty when there is no idmap."""
+    if not idmap_path:
+        return {}
+    try:
+        with open(idmap_path, newline="") as f:
+            return {row["new_id"]: (row["source_file"], row["source_line"]) for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,133 @@
+"""Per-process admission control for OpenAI calls.
+
+Embedding and chat calls each get a Limiter: at most `limit` calls run at once and the rest wait in
+FIFO order, but never past the limiter's latency budget. A call whose expected wait is already over
+budget is refused at once with Overloaded, which the API turns into a 503 with Retry-After, so a
+spike sheds load quickly instead of every request timing out together.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from .config import OPENAI_EMBED_CONCURRENCY, OPENAI_CHAT_CONCURRENCY, EMBED_QUEUE_TIMEOUT, CHAT_QUEUE_TIMEOUT
+from .metrics import SHED, UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_WAIT_SECONDS
+
+EWMA_WEIGHT = 0.2  # Weight of the newest call in the service time estimate
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: float = 1.0, status_code: int = 503):
+        """Refused for capacity: 503 when this process sheds load, 429 when OpenAI rate-limited us."""
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def rate_limited(error: Exception) -> Overloaded:
+    """Overloaded (429) for an OpenAI RateLimitError, honouring its Retry-After header."""
+    response = getattr(error, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after", 1.0)) if response is not None else 1.0
+    except ValueError:
+        retry_after = 1.0
+    return Overloaded("OpenAI rate limit reached", retry_after=retry_after, status_code=429)
+
+
+class Limiter:
+    def __init__(self, name: str, limit: int, max_wait: float, service_time: float = 1.0):
+        """Cap concurrent calls to one upstream at `limit`, queueing for at most `max_wait` seconds.
+
+        `service_time` seeds the moving average of call duration used to predict queue waits.
+        """
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.service_time = service_time
+        self.in_flight = 0
+        self._waiters = deque()  # Futures of queued calls, oldest first; a slot is handed over by resolving one
+        self._publish()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def expected_wait(self) -> float:
+        """Seconds a call arriving now would queue, from the queue length and average call duration."""
+        ahead = self.in_flight + self.waiting - self.limit + 1
+        return 0.0 if ahead <= 0 else math.ceil(ahead / self.limit) * self.service_time
+
+    def admit(self, budget: Optional[float] = None):
+        """Raise Overloaded if a call arriving now would wait longer than `budget` (default max_wait)."""
+        budget = self.max_wait if budget is None else budget
+        expected = self.expected_wait()
+        if expected > budget:
+            SHED.inc(upstream=self.name, reason="expected_wait")
+            raise Overloaded(f"{self.name} queue is full (expected wait {expected:.1f}s)", retry_after=expected)
+
+    @asynccontextmanager
+    async def slot(self, budget: Optional[float] = None):
+        """Hold one of the `limit` slots for the block; queue for at most `budget` seconds (default max_wait).
+
+        A budget of 0 takes a free slot or fails at once, for calls that have a local fallback.
+        """
+        budget = self.max_wait if budget is None else budget
+        await self._acquire(budget)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service_time += EWMA_WEIGHT * (time.perf_counter() - start - self.service_time)
+            self._release()
+
+    async def _acquire(self, budget: float):
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            UPSTREAM_WAIT_SECONDS.observe(0.0, upstream=self.name)
+            self._publish()
+            return
+        self.admit(budget)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=budget)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                return  # Handed a slot just as the budget ran out: use it
+            waiter.cancel()
+            SHED.inc(upstream=self.name, reason="timeout")
+            raise Overloaded(f"{self.name} queue wait exceeded {budget:.1f}s", retry_after=self.expected_wait() or budget)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # The slot was ours; pass it on
+            waiter.cancel()
+            raise
+        finally:
+            UPSTREAM_WAIT_SECONDS.observe(time.perf_counter() - start, upstream=self.name)
+            self._publish()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # The slot moves to the oldest waiter; in_flight is unchanged
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    def _publish(self):
+        UPSTREAM_IN_FLIGHT.set(self.in_flight, upstream=self.name)
+        UPSTREAM_QUEUE_DEPTH.set(self.waiting, upstream=self.name)
+
+
+EMBEDDINGS = Limiter("embeddings", OPENAI_EMBED_CONCURRENCY, EMBED_QUEUE_TIMEOUT, service_time=0.3)
+CHAT = Limiter("chat", OPENAI_CHAT_CONCURRENCY, CHAT_QUEUE_TIMEOUT, service_time=3.0)
@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .intent import BASEBALL_VOCAB
+from .lexical import find_citations
+
+# A question that leans on the previous turn: a leading connective, or a pronoun standing in for the rule
+FOLLOW_UP_START = re.compile(r"^\s*(?:and|but|or|so|also|then|what about|how about|what if|and if|same|even if|does that|does it|is that|is it)\b", re.I)
+BACK_REFERENCE = re.compile(r"\b(?:it|that|this|those|these|they|them|the same|instead)\b", re.I)
+GENERIC_NOUNS = re.compile(r"\b(?:rules?|game|league|division)\b")  # "that rule" still points back
+MAX_QUERY_WORDS = 60  # Standalone queries stay compact: embeddings are cached per exact text
+
+
+def standalone_query(question: str, history: List[Tuple[str, str, str]]) -> str:
+    """The question to retrieve with: the question itself, or for a follow-up, the previous turn's
+    question followed by this one ("What is the infield fly rule? What about with two outs?").
+
+    A follow-up starts with a connective ("And if", "What about", "Does it") or points back with a
+    pronoun and names nothing of its own from the rulebook ("Why does it exist?"). `history` is the
+    session's (question, search query, answer) turns, oldest first; the previous question is used as
+    asked, so rewrites never chain from turn to turn.
+    """
+    question = question.strip()
+    if not history or find_citations(question):
+        return question
+    follow_up = FOLLOW_UP_START.search(question) or (
+        BACK_REFERENCE.search(question) and not BASEBALL_VOCAB.search(GENERIC_NOUNS.sub(" ", question.lower()))
+    )
+    if not follow_up:
+        return question
+    words = question.split()
+    previous = history[-1][0].split()
+    room = max(0, MAX_QUERY_WORDS - len(words))
+    return " ".join(previous[-room:] + words) if room else question
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800.0, max_turns: int = 3, db_path: Optional[str] = None):
+        """Conversation state per session id: division and the last `max_turns` turns.
+
+        In-process LRU with idle-time expiry, optionally written through to SQLite so sessions survive
+        restarts and are shared by the workers of one instance.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.db_path = db_path
+        self._sessions: "OrderedDict[str, dict]" = OrderedDict()  # id -> {"division", "turns", "updated"}
+        self._lock = threading.Lock()
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._create_table()
+
+    def _create_table(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    division TEXT,
+                    turns TEXT,
+                    updated REAL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated)")
+            conn.commit()
+
+    def open(self, session_id: str, division: Optional[str] = None) -> dict:
+        """The live session (a new one if unknown or expired), with `division` stored when given."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if self.db_path:
+            # The database wins: with several workers, another process may have answered the last turn
+            session = self._load(session_id, now) or session
+        if session is None or now - session["updated"] > self.ttl:
+            session = {"division": None, "turns": [], "updated": now}
+        if division:
+            session["division"] = division
+        session["updated"] = now
+        self._remember(session_id, session)
+        return session
+
+    def history(self, session_id: str) -> List[Tuple[str, str, str]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session["turns"]) if session else []
+
+    def append(self, session_id: str, question: str, search_query: str, answer: str):
+        """Add a turn to an open session; a no-op for ids that were never opened (e.g. batch requests)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session["turns"] = (session["turns"] + [(question, search_query, answer)])[-self.max_turns:]
+            session["updated"] = time.time()
+            row = (session_id, session["division"], json.dumps(session["turns"]), session["updated"])
+        if self.db_path:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("INSERT OR REPLACE INTO sessions (session_id, division, turns, updated) VALUES (?, ?, ?, ?)", row)
+                conn.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+                conn.commit()
+
+    def _load(self, session_id: str, now: float) -> Optional[dict]:
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT division, turns, updated FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or now - row[2] > self.ttl:
+            return None
+        return {"division": row[0], "turns": [tuple(turn) for turn in json.loads(row[1])], "updated": row[2]}
+
+    def _remember(self, session_id: str, session: dict):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            # Least recently used first, so expired sessions are evicted before live ones
+            while self._sessions and (len(self._sessions) > self.max_sessions
+                                      or time.time() - next(iter(self._sessions.values()))["updated"] > self.ttl):
+                self._sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        """Coalesce concurrent calls with the same key into one: the first caller runs it, the rest await its result."""
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(result of fn(), whether it was shared with an earlier caller). Exceptions are shared too.
+
+        The call runs as its own task, so a caller that disconnects (and is cancelled) does not cancel
+        it for the others; it is forgotten as soon as it finishes, so nothing is cached.
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Retrieved: no "exception was never retrieved" warning when every caller left
+
+    def __len__(self):
+        return len(self._tasks)
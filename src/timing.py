@@ -0,0 +1,37 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .metrics import STAGE_SECONDS
+
+# Stage -> seconds for the request being served; None outside a request
+request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """Add the time spent in the block to `stage` of the current request's timings and the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record(stage: str, seconds: float):
+    """Add `seconds` to `stage` of the current request's timings and the stage histogram."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Server-Timing header value ('embed;dur=12.3, search;dur=0.8') for the stage timings."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def timings_ms(timings: Dict[str, float]) -> Dict[str, float]:
+    """Stage timings in milliseconds, as logged and stored with each interaction."""
+    return {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
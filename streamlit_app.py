@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 import os
@@ -30,44 +31,58 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
+def stream_tokens(response):
+    """Answer text from the server-sent `token` events of /query/stream."""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event == "token":
+            yield json.loads(line[len("data: "):])["text"]
+        elif line.startswith("data: ") and event == "done":
+            done = json.loads(line[len("data: "):])
+            st.session_state.interaction_id = done["interaction_id"]
+            st.session_state.session_id = done["session_id"]  # Follow-ups continue this conversation on the server
+
 # Chat input
 if prompt := st.chat_input("Ask a rule question or validate a call (e.g., 'With two outs and runner on first, dropped third strike?')"):
     # Display user message
     st.chat_message("user").markdown(prompt)
     st.session_state.messages.append({"role": "user", "content": prompt})
 
-    # Prepare query with division
-    question = f"Division: {division}\n{prompt}" if division != "No Filters" else prompt
+    # Only the new question: the server keeps the conversation under the session id
+    # Always send the division: "No Filters" clears the one the session last used
+    params = {"question": prompt, "session_id": st.session_state.get("session_id"), "division": division,
+              "thumbs_up": 0, "thumbs_down": 0, "feedback_text": ""}
 
-    # Call backend API
+    # Call backend API, rendering the answer as it streams in
     with st.chat_message("assistant"):
-        with st.spinner("Umpiring the call..."):
-            try:
-                response = requests.get(f"{API_URL}/query", params={"question": question, "thumbs_up": 0, "thumbs_down": 0, "feedback_text": ""})
+        try:
+            with requests.get(f"{API_URL}/query/stream", params=params, stream=True) as response:
                 if response.status_code == 200:
-                    answer = response.json()["answer"]
-                    st.markdown(answer)
+                    answer = st.write_stream(stream_tokens(response))
                     st.session_state.messages.append({"role": "assistant", "content": answer})
 
-                    # Feedback buttons
+                    # Feedback attaches to this answer's logged interaction instead of re-asking the question
+                    interaction_id = st.session_state.get("interaction_id")
                     col1, col2, col3 = st.columns([1, 1, 6])
                     with col1:
                         if st.button("👍 Great"):
-                            requests.get(f"{API_URL}/query", params={"question": question, "thumbs_up": 1, "thumbs_down": 0, "feedback_text": "Great response!"})
+                            requests.post(f"{API_URL}/feedback", json={"interaction_id": interaction_id, "thumbs_up": 1, "thumbs_down": 0, "feedback_text": "Great response!"})
                             st.success("Thanks—logged! 👍")
                     with col2:
                         if st.button("👎 Not helpful"):
-                            requests.get(f"{API_URL}/query", params={"question": question, "thumbs_up": 0, "thumbs_down": 1, "feedback_text": "Not helpful"})
+                            requests.post(f"{API_URL}/feedback", json={"interaction_id": interaction_id, "thumbs_up": 0, "thumbs_down": 1, "feedback_text": "Not helpful"})
                             st.warning("Sorry—logged for improvement. 👎")
                     with col3:
                         feedback = st.text_input("Additional feedback (optional)")
                         if st.button("Submit Feedback") and feedback:
-                            requests.get(f"{API_URL}/query", params={"question": question, "thumbs_up": 0, "thumbs_down": 0, "feedback_text": feedback})
+                            requests.post(f"{API_URL}/feedback", json={"interaction_id": interaction_id, "feedback_text": feedback})
                             st.success("Feedback submitted—thanks for helping UmpGPT improve!")
                 else:
                     st.error(f"API error: {response.status_code}")
-            except Exception as e:
-                st.error(f"Connection error: {e}")
+        except Exception as e:
+            st.error(f"Connection error: {e}")
 
 # Sidebar info
 st.sidebar.markdown("---")
@@ -0,0 +1,30 @@
+import numpy as np
+
+from src.answer_cache import AnswerCache
+
+
+def test_similar_question_over_same_chunks_hits():
+    cache = AnswerCache(threshold=0.9)
+    base = np.array([1.0, 0.0, 0.0])
+    cache.store("Majors", "scenario_based", ["doc_1", "doc_2"], base, "Batter may run.", 120, version="v1")
+
+    assert cache.lookup("Majors", "scenario_based", ["doc_2", "doc_1"], np.array([0.98, 0.1, 0.0]), version="v1") == ("Batter may run.", 120)
+    assert cache.lookup("Majors", "scenario_based", ["doc_1", "doc_2"], np.array([0.0, 1.0, 0.0]), version="v1") is None
+    assert cache.lookup("Minors", "scenario_based", ["doc_1", "doc_2"], base, version="v1") is None
+    assert cache.lookup("Majors", "rule_reference", ["doc_1", "doc_2"], base, version="v1") is None
+    assert cache.lookup("Majors", "scenario_based", ["doc_1"], base, version="v1") is None
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_ttl_lru_and_version_invalidation():
+    vector = np.ones(3)
+    expired = AnswerCache(ttl=-1)
+    expired.store("All", "other", ["doc_1"], vector, "stale", 10)
+    assert expired.lookup("All", "other", ["doc_1"], vector) is None
+
+    cache = AnswerCache(max_entries=2)
+    for i in range(3):
+        cache.store("All", "other", [f"doc_{i}"], vector, f"answer {i}", 10, version="v1")
+    assert cache.lookup("All", "other", ["doc_0"], vector, version="v1") is None
+    assert cache.lookup("All", "other", ["doc_2"], vector, version="v1") == ("answer 2", 10)
+    assert cache.lookup("All", "other", ["doc_2"], vector, version="v2") is None
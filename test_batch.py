@@ -0,0 +1,56 @@
+from conftest import request
+
+
+def post_batch(app, questions):
+    return request(app, "POST", "/query/batch", json={"questions": questions})
+
+
+def test_batch_embeds_once_and_dedupes(main, monkeypatch):
+    generated = []
+    generate_answer = main.rag.generate_answer
+
+    async def counting(question, *args, **kwargs):
+        generated.append(question)
+        return await generate_answer(question, *args, **kwargs)
+
+    monkeypatch.setattr(main.rag, "generate_answer", counting)
+    questions = [
+        "Division: Majors\nCan the pitcher fake a throw to first?",
+        "What happens when a batted ball hits the runner?",
+        "Division: Majors\nCan the pitcher fake a throw to first?",
+        "When is the infield fly in effect?",
+    ]
+    response = post_batch(main.app, questions)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["question"] for r in results] == questions
+    assert all(r["answer"] for r in results)
+    assert results[0] == results[2]
+
+    # One embeddings call for the three distinct questions (without the Division: line), and no question is answered twice
+    assert len(main.fake_openai.embedded) == 1
+    assert sorted(main.fake_openai.embedded[0]) == sorted(set(question.split("\n")[-1] for question in questions))
+    assert len(generated) == len(set(generated)) <= 3
+
+
+def test_batch_reports_per_item_errors(main, monkeypatch):
+    generate_answer = main.rag.generate_answer
+
+    async def flaky(question, *args, **kwargs):
+        if "infield fly" in question:
+            raise RuntimeError("upstream timeout")
+        return await generate_answer(question, *args, **kwargs)
+
+    monkeypatch.setattr(main.rag, "generate_answer", flaky)
+    response = post_batch(main.app, ["What is a balk?", "When is the infield fly in effect?", ""])
+    assert response.status_code == 200
+    ok, failed, empty = response.json()["results"]
+    assert ok["answer"] and "error" not in ok
+    assert "upstream timeout" in failed["error"]
+    assert empty["error"] == "No question provided"
+
+
+def test_batch_size_limit(main, monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_QUESTIONS", 2)
+    assert post_batch(main.app, ["a", "b", "c"]).status_code == 413
+    assert post_batch(main.app, []).status_code == 400
@@ -0,0 +1,68 @@
+import json
+
+import faiss
+import numpy as np
+
+from src.build_index import build, split_text
+from src.embedders import HashEmbedder
+
+NORMALIZED = "data/normalized/rules.normalized.jsonl"
+
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self, dim):
+        super().__init__(dim)
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def test_build_reproduces_ids_and_rebuilds_incrementally(tmp_path):
+    out_dir = tmp_path / "chunks"
+    embedder = CountingEmbedder(dim=64)
+    stats = build(NORMALIZED, str(out_dir), embedder)
+    assert stats == {"chunks": 906, "embedded": len(embedder.embedded), "dim": 64}
+
+    with open("data/chunks/index/meta.json") as f:
+        checked_in = json.load(f)
+    with open(out_dir / "index" / "meta.json") as f:
+        meta = json.load(f)
+    assert meta["ids"] == checked_in["ids"]
+    assert meta["citations"] == checked_in["citations"]
+    assert (out_dir / "rules.idmap.csv").read_text() == open("data/chunks/rules.idmap.csv").read()
+    # The checked-in chunks collapse line breaks in a few records; everything else matches exactly
+    same_words = lambda chunk: {**chunk, "text": " ".join(chunk["text"].split())}
+    rebuilt = [json.loads(line) for line in open(out_dir / "rules.chunks.jsonl")]
+    committed = [json.loads(line) for line in open("data/chunks/rules.chunks.jsonl")]
+    assert [same_words(chunk) for chunk in rebuilt] == [same_words(chunk) for chunk in committed]
+    assert [chunk["text"] for chunk in rebuilt] == [json.loads(line)["text"] for line in open(NORMALIZED)]
+    index = faiss.read_index(str(out_dir / "index" / "rules.faiss"))
+    assert (index.ntotal, index.d) == (906, 64)
+
+    # Edit one rule: only that chunk is re-embedded
+    records = [json.loads(line) for line in open(NORMALIZED)]
+    records[10]["text"] += " Amended for the new edition."
+    edited = tmp_path / "edited.jsonl"
+    edited.write_text("".join(json.dumps(record) + "\n" for record in records))
+    embedder.embedded.clear()
+    assert build(str(edited), str(out_dir), embedder)["embedded"] == 1
+    assert embedder.embedded == [records[10]["text"]]
+
+    vectors = np.load(out_dir / "index" / "embeddings.npz")["vectors"]
+    np.testing.assert_allclose(vectors[10], embedder.embed_one(records[10]["text"]), rtol=1e-6)
+
+
+def test_split_text_keeps_pieces_under_limit():
+    text = " ".join(f"Sentence number {i} about the infield fly." for i in range(100))
+    pieces = split_text(text, max_chars=200)
+    assert len(pieces) > 1
+    assert all(len(piece) <= 200 for piece in pieces)
+    assert " ".join(pieces) == text
+
+
+def test_split_text_keeps_the_source_whitespace():
+    table = "EXAMPLE: Rule 4.11\nTeam 1 2 3\nVisitors 0 0 4"
+    assert split_text(table) == [table]
+    assert split_text("First part.\nSecond part.", max_chars=15) == ["First part.", "Second part."]
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import faiss
+
+from conftest import doc, request
+from src import rag as rag_module, retriever as retriever_module
+from src.chunk_store import ChunkStore
+from src.composer import compose_answer, describe_levels
+from src.embedders import HashEmbedder
+from src.embedding_cache import EmbeddingCache
+from src.retriever import Retriever
+
+
+CHAPTER = "RULE 6 - The Batter"
+CONTEXT = [
+    doc("a", "6.09", "all", "The batter becomes a runner when a fair ball is hit. The batter becomes a runner when the third strike "
+                            "is not caught, providing first base is unoccupied or there are two out.", chapter=CHAPTER),
+    doc("b", "6.05", "maj_up", "A batter is out when a third strike is legally caught by the catcher.", chapter=CHAPTER),
+    doc("c", "6.05", "min_down", "A batter is out when three strikes are called; the batter does not run on an uncaught third strike.", chapter=CHAPTER),
+]
+
+
+def test_describe_levels():
+    assert describe_levels("all") == "all divisions"
+    assert describe_levels("maj_up") == "Majors and up"
+    assert describe_levels("min_down") == "Minors and below"
+    assert describe_levels("int_jr") == "Intermediate (50/70) to Juniors"
+    assert describe_levels("tb") == "Tee Ball"
+
+
+def test_answer_has_the_ruling_structure():
+    answer = compose_answer("Can the batter run when the third strike is not caught?", CONTEXT, "Majors A (11U-12U)")
+    sections = [line.split(":")[0] for line in answer.split("\n\n")]
+    assert sections == ["**Ruling**", "**Why**", "**Rule References**", "**Division Note**"]
+    assert answer.startswith("**Ruling**: Rule 6.09: The batter becomes a runner when the third strike is not caught")
+    assert "**Rule References**: Rule 6.09 (RULE 6 - The Batter); Rule 6.05 (RULE 6 - The Batter)" in answer
+    assert "Other divisions have their own version of Rule 6.05 (Minors and below)." in answer
+    assert "uncaught third strike" not in answer  # The Minors variant does not apply to Majors
+
+
+def test_answer_without_division_notes_the_variants():
+    answer = compose_answer("uncaught third strike", CONTEXT)
+    assert "Rules differ by division: Rule 6.05 covers Majors and up; Rule 6.05 covers Minors and below." in answer
+    assert compose_answer("uncaught third strike", CONTEXT) == answer  # Deterministic
+
+
+def test_offline_retrieval_embeds_locally_for_a_hash_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(retriever_module, "USE_OPENAI", False)
+    monkeypatch.setattr(retriever_module, "EMBED_DIM", 256)
+    chunks_path = tmp_path / "rules.chunks.jsonl"
+    with open(chunks_path, "w") as f:
+        for item in CONTEXT:
+            f.write(json.dumps(item) + "\n")
+    embedder = HashEmbedder(256)
+    index = faiss.IndexFlatL2(256)
+    index.add(embedder.embed([item["text"] for item in CONTEXT]))
+    faiss.write_index(index, str(tmp_path / "rules.faiss"))
+
+    def retriever(embedder_name):
+        return Retriever(index_path=str(tmp_path / "rules.faiss"), idmap_path=None, store=ChunkStore(str(chunks_path)),
+                         cache=EmbeddingCache(), embedder_name=embedder_name)
+
+    docs = asyncio.run(retriever(embedder.name).retrieve("third strike legally caught by the catcher", k=2))
+    assert docs[0]["id"] == "b" and docs[0]["distance"] is not None
+    docs = asyncio.run(retriever("text-embedding-3-large").retrieve("third strike legally caught by the catcher", k=2))
+    assert docs[0]["id"] == "b" and docs[0]["distance"] is None  # OpenAI-built index: BM25 only
+
+
+def test_offline_mode_answers_without_any_api(cold_main, monkeypatch):
+    for module in (cold_main, rag_module, retriever_module):
+        monkeypatch.setattr(module, "USE_OPENAI", False)
+    cold_main.load_services()
+    assert cold_main.rag.client is None and cold_main.retriever.client is None
+
+    start = time.perf_counter()
+    response = request(cold_main.app, "GET", "/query", params={"question": "What is the infield fly rule?", "division": "Majors"})
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    answer = response.json()["answer"]
+    assert answer.startswith("**Ruling**: Rule") and "**Division Note**" in answer
+    assert elapsed < 1.0
+    cold_main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        assert conn.execute("SELECT api_used, tokens_used FROM interactions").fetchall() == [("Local", 0)]
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from conftest import app_client
+
+
+async def timed_batch(app, questions):
+    async with app_client(app) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/query", params={"question": q}) for q in questions))
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return elapsed
+
+
+def test_throughput_scales_with_in_flight_requests(main):
+    main.fake_openai.latency = 0.05
+    single = asyncio.run(timed_batch(main.app, ["What is the balk rule?"]))
+    in_flight = 16
+    batch = asyncio.run(timed_batch(main.app, [f"What does rule {i} say about the balk?" for i in range(in_flight)]))
+
+    # Serialized requests would take ~16x as long; the event loop must overlap them
+    assert batch < 4 * single
+    assert main.fake_openai.max_in_flight >= in_flight
+    print(f"1 request: {single:.3f}s, {in_flight} in flight: {batch:.3f}s ({in_flight * single / batch:.1f}x throughput)")
+
+
+def test_intent_classification_overlaps_retrieval(main):
+    main.fake_openai.latency = 0.05
+    # Low-confidence for the local classifier, so the LLM is consulted alongside retrieval
+    asyncio.run(timed_batch(main.app, ["Tell me about the bat"]))
+    assert main.fake_openai.overlapped
@@ -0,0 +1,93 @@
+import csv
+import sqlite3
+
+import pytest
+
+from src.db_logger import DBLogger
+from src.metrics import LOG_ROWS
+
+
+def log(logger, n, **fields):
+    for i in range(n):
+        logger.log_interaction(
+            query_text=f"question {i}", division="Majors A", response="answer", session_id="s", response_time=0.1,
+            query_type="rule_reference", api_used="OpenAI", tokens_used=42, **fields
+        )
+
+
+def count(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+
+
+def test_rows_are_written_behind_in_batches(tmp_path):
+    db_path = str(tmp_path / "app_data.db")
+    logger = DBLogger(db_path, batch_size=10, flush_interval=60)
+    log(logger, 25)
+    logger.flush()
+    assert count(db_path) == 25
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    logger.close()
+
+
+def test_close_flushes_and_overflow_is_counted(tmp_path, capsys):
+    db_path = str(tmp_path / "app_data.db")
+    logger = DBLogger(db_path, queue_size=5, batch_size=1000, flush_interval=60)
+    logger.close()  # Writer stopped, so nothing drains the queue
+    dropped = LOG_ROWS.value(outcome="dropped")
+    log(logger, 8)
+    assert logger.dropped == 3
+    assert LOG_ROWS.value(outcome="dropped") == dropped + 3
+    assert capsys.readouterr().out == ""  # Counted, not printed per row
+
+    logger = DBLogger(db_path, batch_size=1000, flush_interval=60)
+    log(logger, 7)
+    logger.close()
+    assert count(db_path) == 7
+    assert logger.written == 7 and logger.dropped == 0
+
+
+def test_existing_table_gains_interaction_id(tmp_path):
+    db_path = str(tmp_path / "app_data.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE interactions (id INTEGER PRIMARY KEY AUTOINCREMENT, query_text TEXT, division TEXT, response TEXT, "
+                     "timestamp TEXT, session_id TEXT, response_time REAL, query_type TEXT, api_used TEXT, tokens_used INTEGER, "
+                     "thumbs_up INTEGER, thumbs_down INTEGER, feedback_text TEXT, rule_reference TEXT)")
+    logger = DBLogger(db_path)
+    logger.log_interaction("q", "All", "a", "s", 0.1, "rule_reference", "OpenAI", 1, interaction_id="i-1")
+    logger.log_feedback("i-1", thumbs_down=1)
+    logger.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT thumbs_down FROM interactions WHERE interaction_id = 'i-1'").fetchone() == (1,)
+
+
+def test_export_streams_quoted_csv_incrementally(tmp_path):
+    db_path = str(tmp_path / "app_data.db")
+    logger = DBLogger(db_path)
+    logger.log_interaction("q, with comma", "All", 'line one\nline "two"', "s", 0.1, "rule_reference", "OpenAI", 1)
+    log(logger, 4)
+    out = str(tmp_path / "interactions.csv")
+    assert logger.export(out, "csv", mark="nightly", chunk_size=2) == {"rows": 5, "last_id": 5}
+    with open(out, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 5
+    assert rows[0]["query_text"] == "q, with comma" and rows[0]["response"] == 'line one\nline "two"'
+
+    log(logger, 2)
+    assert logger.export(out, "csv", mark="nightly") == {"rows": 2, "last_id": 7}
+    assert logger.export(out, "csv", mark="nightly") == {"rows": 0, "last_id": 7}
+    logger.close()
+
+
+def test_export_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    db_path = str(tmp_path / "app_data.db")
+    logger = DBLogger(db_path)
+    log(logger, 5, thumbs_up=1)
+    out = str(tmp_path / "interactions.parquet")
+    assert logger.export(out, "parquet", since_id=2, chunk_size=2)["rows"] == 3
+    table = pq.read_table(out)
+    assert table.column("id").to_pylist() == [3, 4, 5]
+    assert table.column("tokens_used").to_pylist() == [42] * 3
+    logger.close()
@@ -0,0 +1,33 @@
+import sqlite3
+
+from conftest import request
+
+
+def test_feedback_updates_the_logged_interaction(main):
+    answer = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"}).json()
+    assert answer["interaction_id"] and answer["session_id"]
+    calls = dict(main.fake_openai.calls)
+
+    response = request(main.app, "POST", "/feedback", json={"interaction_id": answer["interaction_id"], "thumbs_up": 1})
+    assert response.status_code == 202 and response.json()["status"] == "queued"
+    response = request(main.app, "POST", "/feedback", json={"interaction_id": answer["interaction_id"], "feedback_text": "Spot on"})
+    assert response.status_code == 202
+    assert main.fake_openai.calls == calls  # No classification, embedding or completion
+
+    main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        rows = conn.execute("SELECT thumbs_up, thumbs_down, feedback_text, session_id FROM interactions").fetchall()
+    assert rows == [(1, None, "Spot on", answer["session_id"])]
+    assert main.logger.unmatched_feedback == 0
+
+
+def test_feedback_for_an_unknown_interaction_is_counted(main):
+    response = request(main.app, "POST", "/feedback", json={"interaction_id": "no-such-id", "thumbs_down": 1})
+    assert response.status_code == 202
+    main.logger.flush()
+    assert main.logger.unmatched_feedback == 1
+
+
+def test_feedback_requires_a_field(main):
+    response = request(main.app, "POST", "/feedback", json={"interaction_id": "abc"})
+    assert response.status_code == 400
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import numpy as np
+
+from src.db_logger import DBLogger
+from src.intent import IntentClassifier, load_interactions, train
+
+
+def test_keyword_rules():
+    classifier = IntentClassifier()
+    assert classifier.predict("Two outs, runner on first, dropped third strike - was the call right?")[0] == "scenario_based"
+    assert classifier.predict("What is the infield fly rule?") == ("rule_reference", 0.9)
+    assert classifier.predict("Why do we have the infield fly rule?")[0] == "philosophical"
+    assert classifier.predict("What's your favorite umpire story?")[0] == "scenario_based"  # 'umpire' still wins
+    assert classifier.predict("Tell me a funny story")[0] == "opinion"
+    assert classifier.predict("Best pizza in Naperville?")[1] < 0.7
+    # 'about' used to match the old 'out ' substring check
+    assert classifier.predict("Tell me about the balk")[0] != "scenario_based"
+    # As before, 'out' only counts with more of the sentence after it
+    assert classifier.predict("What is a force out?")[0] == "rule_reference"
+    assert classifier.predict("What is an out?")[0] == "rule_reference"
+    assert classifier.predict("With one out and nobody on, the batter bunts foul on strike three")[0] == "scenario_based"
+    assert classifier.predict("Is it an out if the ball hits the runner?")[0] == "scenario_based"
+
+
+def test_predict_is_sub_millisecond():
+    classifier = IntentClassifier()
+    start = time.perf_counter()
+    for _ in range(1000):
+        classifier.predict("Why is a balk called when the pitcher stops his motion?")
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_train_from_interactions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logger = DBLogger()
+    examples = {
+        "philosophical": ["purpose of the balk", "reason for the dropped third strike", "point of tagging up"],
+        "rule_reference": ["define a balk", "definition of obstruction", "meaning of tag up"],
+        "off_topic": ["pizza near the park", "weather tomorrow", "best movie this year"],
+    }
+    for label, texts in examples.items():
+        for text in texts:
+            logger.log_interaction(text, "All", "answer", "s", 0.1, label, "OpenAI", 10)
+    logger.flush()
+
+    rows = load_interactions(logger.db_path)
+    assert len(rows) == 9
+    np.savez(tmp_path / "model.npz", **train(rows))
+    classifier = IntentClassifier(str(tmp_path / "model.npz"))
+    assert classifier.predict("pizza near the park")[0] == "off_topic"
+    assert classifier.predict("definition of obstruction")[0] == "rule_reference"
+
+
+def test_llm_only_called_when_unsure(main):
+    asyncio.run(main.rag.classify_intent("What is the infield fly rule?"))
+    assert main.fake_openai.calls["chat"] == 0
+    assert asyncio.run(main.rag.classify_intent("Tell me about the bat")) == "rule_reference"
+    assert main.fake_openai.calls["chat"] == 1
+
+
+def test_one_completion_per_answered_request(main):
+    asyncio.run(main.query_rule(question="What is the infield fly rule?"))
+    assert main.fake_openai.calls == {"embeddings": 1, "chat": 1}
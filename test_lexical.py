@@ -0,0 +1,76 @@
+import asyncio
+
+from src.chunk_store import ChunkStore
+from src.lexical import LexicalIndex, normalize_citation
+
+store = ChunkStore("data/chunks/rules.chunks.jsonl")
+lexical = LexicalIndex(store)
+
+
+def test_normalize_citation():
+    assert normalize_citation("6.09 (B)") == "6.09(b)"
+    assert normalize_citation("1.1") == "1.10"
+    assert normalize_citation("2") == "2.00"
+    assert lexical.match_citations("Rule 6.9(b)") == lexical.match_citations("Rule 6.09(b)")
+
+
+def test_citation_lookup():
+    rows = lexical.match_citations("What does Rule 6.09(b) say?")
+    assert rows and all(store.get(row)["citation"].startswith("6.09(b)") for row in rows)
+    section = lexical.match_citations("rule 6.09")
+    assert set(rows) < set(section)
+    notes = lexical.match_citations("Explain 7.13 NOTE")
+    assert notes and all("• note" in store.get(row)["title"] for row in notes)
+    assert lexical.match_citations("How far is it from home plate to second base?") == []
+
+
+def test_bare_decimals_are_not_citations():
+    assert lexical.match_citations("Game was delayed 1.5 hours by rain, can we resume?") == []
+    assert lexical.match_citations("Our leadoff hitter is batting .300") == []
+    assert lexical.match_citations("Can a pitcher with a 3.25 ERA pitch two games in a day?") == []
+    assert lexical.match_citations("What do Rules 6.09 and 7.13 say?") == sorted(
+        lexical.match_citations("Rule 6.09") + lexical.match_citations("Rule 7.13"))
+    assert lexical.match_citations("§6.09(b)") == lexical.match_citations("Rule 6.09(b)")
+
+
+def test_decimal_questions_use_hybrid_retrieval(main):
+    docs = asyncio.run(main.retriever.retrieve("Game was delayed 1.5 hours by rain, can we resume?"))
+    assert docs and all(doc["match"] == "hybrid" for doc in docs)
+
+
+def test_broad_citations_rank_by_the_rest_of_the_question():
+    definitions = lexical.match_citations("What does Rule 2.00 say?")
+    assert len(definitions) > 5
+    assert lexical.match_citations("What does Rule 2.00 say?", k=5) == definitions[:5]
+    balk = lexical.match_citations("What does Rule 2.00 say about a balk?", k=5)
+    assert len(balk) == 5 and store.get(balk[0])["text"].startswith("A BALK")
+
+
+def test_bm25_ranks_matching_text_first():
+    hits = lexical.search("infield fly", 5)
+    assert len(hits) == 5
+    assert "infield fly" in store.get(hits[0][0])["text"].lower()
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_citation_questions_skip_the_embedding_call(main):
+    docs = asyncio.run(main.retriever.retrieve("What does Rule 6.09(b) say?", division="Majors A"))
+    assert docs and all(doc["match"] == "citation" for doc in docs)
+    assert main.fake_openai.calls["embeddings"] == 0
+
+
+def test_hybrid_search_fuses_lexical_hits(main):
+    docs = asyncio.run(main.retriever.retrieve("infield fly", k=5))
+    assert main.fake_openai.calls["embeddings"] == 1
+    # Fake embeddings are random, so any infield fly chunks in the top 5 came from BM25
+    assert any("infield fly" in doc["text"].lower() for doc in docs)
+    assert all(doc["match"] == "hybrid" for doc in docs)
+
+
+def test_citation_answers_are_cached_per_question(main):
+    async def key(question):
+        return await main.answer_cache_key(question, await main.retriever.retrieve(question))
+
+    ids, _ = asyncio.run(key("What does Rule 6.09(b) say?"))
+    assert asyncio.run(key("what does rule 6.09(b) say"))[0] == ids
+    assert set(asyncio.run(key("Does Rule 6.09(b) apply in tee ball games?"))[0]) != set(ids)
@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
+
+from benchmarks import fake_openai
+from benchmarks.bench_load import parse_server_timing
+from conftest import request
+from src.embedders import HashEmbedder
+
+
+def fake_client():
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai.app))
+    return AsyncOpenAI(api_key="sk-fake", base_url="http://fake/v1", http_client=http_client)
+
+
+def test_fake_server_speaks_the_openai_protocol(monkeypatch):
+    monkeypatch.setattr(fake_openai, "EMBED_LATENCY", 0.0)
+    monkeypatch.setattr(fake_openai, "CHAT_LATENCY", 0.0)
+
+    async def run():
+        client = fake_client()
+        embedded = await client.embeddings.create(input=["balk", "infield fly"], model="text-embedding-3-large", dimensions=256)
+        messages = [{"role": "system", "content": "You are UmpGPT"}, {"role": "user", "content": "Question: What is a balk?"}]
+        completion = await client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+        stream = await client.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True, stream_options={"include_usage": True})
+        chunks = [chunk async for chunk in stream]
+        return embedded, completion, chunks
+
+    embedded, completion, chunks = asyncio.run(run())
+    expected = HashEmbedder(256).embed(["balk", "infield fly"])
+    assert np.allclose([item.embedding for item in embedded.data], expected, atol=1e-6)
+    assert "What is a balk?" in completion.choices[0].message.content
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks if chunk.choices) == completion.choices[0].message.content
+    assert chunks[-1].usage.total_tokens == completion.usage.total_tokens
+
+
+def test_responses_carry_stage_timings(main):
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+    timings = parse_server_timing(response.headers["server-timing"])
+    assert {"intent", "retrieve", "embed", "faiss", "bm25", "generate", "log", "total"} <= set(timings)
+    assert timings["total"] >= timings["retrieve"]
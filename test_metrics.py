@@ -0,0 +1,70 @@
+import json
+import sqlite3
+
+from conftest import request
+from src import metrics
+from src.metrics import Counter, Histogram
+
+
+def test_text_exposition():
+    histogram = Histogram("stage_seconds", "Stage latency.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="embed")
+    histogram.observe(0.5, stage="embed")
+    histogram.observe(3.0, stage="embed")
+    counter = Counter("errors_total", "Errors.", ["operation"])
+    counter.inc(operation='chat "stream"')
+    counter.inc(2, operation='chat "stream"')
+
+    assert histogram.render() == [
+        "# HELP stage_seconds Stage latency.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="embed",le="0.1"} 1',
+        'stage_seconds_bucket{stage="embed",le="1"} 2',
+        'stage_seconds_bucket{stage="embed",le="+Inf"} 3',
+        'stage_seconds_sum{stage="embed"} 3.55',
+        'stage_seconds_count{stage="embed"} 3',
+    ]
+    assert counter.render()[-1] == 'errors_total{operation="chat \\"stream\\""} 3'
+
+
+def test_metrics_cover_stages_tokens_and_caches(main):
+    stage_count = metrics.STAGE_SECONDS.count(stage="generate")
+    tokens = metrics.TOKENS.value(intent="rule_reference")
+    answer_misses = metrics.CACHE_LOOKUPS.value(cache="answer", result="miss")
+    answer_hits = metrics.CACHE_LOOKUPS.value(cache="answer", result="hit")
+
+    for _ in range(2):
+        assert request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"}).status_code == 200
+    response = request(main.app, "GET", "/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'umpiregpt_stage_seconds_count{stage="faiss"}' in response.text
+    assert 'umpiregpt_request_seconds_count{route="/query",status="200"}' in response.text
+    assert metrics.STAGE_SECONDS.count(stage="generate") == stage_count + 2
+    assert metrics.TOKENS.value(intent="rule_reference") == tokens + 42  # The second answer came from the cache
+    assert metrics.CACHE_LOOKUPS.value(cache="answer", result="miss") == answer_misses + 1
+    assert metrics.CACHE_LOOKUPS.value(cache="answer", result="hit") == answer_hits + 1
+
+
+def test_openai_errors_are_counted(main):
+    async def failing_chat(**kwargs):
+        raise TimeoutError("upstream timed out")
+
+    main.fake_openai.chat.completions.create = failing_chat
+    errors = metrics.OPENAI_ERRORS.value(operation="chat", error="TimeoutError")
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+
+    assert response.status_code == 200  # Answered with the fallback message
+    assert metrics.OPENAI_ERRORS.value(operation="chat", error="TimeoutError") == errors + 1
+
+
+def test_stage_timings_are_stored_with_the_interaction(main):
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+
+    main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        stored, = conn.execute("SELECT stage_timings FROM interactions WHERE interaction_id = ?", (response.json()["interaction_id"],)).fetchone()
+    stages = json.loads(stored)
+    assert {"intent", "retrieve", "embed", "faiss", "bm25", "generate"} <= set(stages)
+    assert all(ms >= 0 for ms in stages.values())
@@ -0,0 +1,129 @@
+import asyncio
+
+from conftest import request
+from src import metrics, rag as rag_module, retriever as retriever_module
+from src.openai_client import DeadlineExceeded, deadline, hedged, start_deadline
+from src.scheduler import Limiter
+
+
+def test_rag_and_retriever_share_one_client(cold_main):
+    cold_main.load_services()
+    assert cold_main.rag.client is cold_main.retriever.client
+    assert cold_main.rag.client.max_retries == 0
+
+
+def test_hedge_wins_against_a_slow_call():
+    async def run():
+        latencies, calls = [1.0, 0.01], []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(latencies[len(calls) - 1])
+            return len(calls)
+
+        won = metrics.HEDGES.value(operation="test", outcome="won")
+        result = await hedged(call, 0.02, "test")
+        return result, len(calls), metrics.HEDGES.value(operation="test", outcome="won") - won
+
+    assert asyncio.run(run()) == (2, 2, 1)
+
+
+def test_no_hedge_without_a_free_slot_or_for_fast_calls():
+    async def run():
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "vector"
+
+        results = [await hedged(call, 0.01, "test", can_hedge=lambda: False), await hedged(call, 1.0, "test")]
+        return results, len(calls)
+
+    assert asyncio.run(run()) == (["vector", "vector"], 2)
+
+
+def test_embedding_hedges_hold_their_own_slot(main, monkeypatch):
+    limiter = Limiter("embeddings", limit=2, max_wait=1.0)
+    monkeypatch.setattr(retriever_module, "EMBEDDINGS", limiter)
+    monkeypatch.setattr(retriever_module, "EMBED_HEDGE_DELAY", 0.01)
+    main.fake_openai.latency = 0.05
+    in_flight = []
+    create = main.fake_openai.embeddings.create
+
+    async def counting(**kwargs):
+        in_flight.append(limiter.in_flight)
+        return await create(**kwargs)
+
+    main.fake_openai.embeddings.create = counting
+    asyncio.run(main.retriever.embed("What is a balk?"))
+
+    assert in_flight == [1, 2]  # The hedge counted against OPENAI_EMBED_CONCURRENCY
+    assert limiter.in_flight == 0
+
+
+def test_calls_get_what_is_left_of_the_request_budget():
+    async def run():
+        start_deadline(0.1)
+        try:
+            async with deadline(10):
+                await asyncio.sleep(1)
+        except DeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("Not cut off at the request budget")
+        try:
+            async with deadline(10):
+                raise AssertionError("Started with no budget left")
+        except DeadlineExceeded:
+            return True
+
+    assert asyncio.run(run())
+
+
+def test_slow_completion_falls_back_to_the_rule_text(main, monkeypatch):
+    monkeypatch.setattr(rag_module, "CHAT_TIMEOUT", 0.05)
+    main.fake_openai.latency = 0.2
+    monkeypatch.setattr(main.rag.intent_classifier, "predict", lambda query: ("rule_reference", 1.0))
+    monkeypatch.setattr(retriever_module, "EMBED_TIMEOUT", 1.0)
+    fallbacks = metrics.FALLBACKS.value(stage="generate")
+    local = metrics.ANSWERS.value(intent="rule_reference", api_used="Local")
+    stored = []
+    monkeypatch.setattr(main.answer_cache, "store", lambda *args, **kwargs: stored.append(args))
+
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+
+    assert response.status_code == 200
+    assert response.json()["answer"].startswith("**Ruling**: Rule")
+    assert metrics.FALLBACKS.value(stage="generate") == fallbacks + 1
+    assert metrics.ANSWERS.value(intent="rule_reference", api_used="Local") == local + 1  # Logged as what it is
+    assert stored == []  # Fallbacks are not cached as answers
+
+
+def test_stream_deadline_covers_the_first_chunk(main, monkeypatch):
+    monkeypatch.setattr(rag_module, "CHAT_TIMEOUT", 0.05)
+    stream = main.fake_openai._stream
+
+    async def slow_start(content):
+        await asyncio.sleep(0.2)
+        async for chunk in stream(content):
+            yield chunk
+
+    monkeypatch.setattr(main.fake_openai, "_stream", slow_start)
+    context = asyncio.run(main.retriever.retrieve("What is the infield fly rule?"))
+
+    async def collect():
+        return [piece async for piece in main.rag.stream_answer("What is the infield fly rule?", context, intent="rule_reference")]
+
+    (answer, tokens_used, source), = asyncio.run(collect())
+    assert answer.startswith("**Ruling**: Rule") and (tokens_used, source) == (0, "Local")
+
+
+def test_slow_embedding_falls_back_to_bm25(main, monkeypatch):
+    monkeypatch.setattr(retriever_module, "EMBED_TIMEOUT", 0.05)
+    main.fake_openai.latency = 0.2
+
+    docs = asyncio.run(main.retriever.retrieve("What happens when the pitcher balks with runners on base?", division="Majors"))
+
+    assert docs and all(doc["distance"] is None and doc["bm25"] for doc in docs)
+    assert metrics.FALLBACKS.value(stage="retrieve") >= 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from conftest import doc
+from src import prompt
+from src.prompt import SYSTEM_PROMPT, build_messages, count_tokens, fit_history, pack_context
+
+
+CONTEXT = [
+    doc("a", "1.01", "maj_up", "Little League Baseball is a game between two teams of nine players each."),
+    doc("a", "1.01", "maj_up", "Little League Baseball is a game between two teams of nine players each."),
+    doc("b", "1.01", "min_down", "Tee Ball/Minor League Instructional Division is a game between two teams under a manager."),
+    doc("c", "1.01", "all", "Little League Baseball is a game between two teams of nine players each, under one manager."),
+    doc("d", "6.09", "all", "The batter becomes a runner when the third strike is not caught, with first base unoccupied or two out."),
+]
+
+
+def test_count_tokens_is_close_to_words():
+    text = "The batter becomes a runner when the third strike is not caught (Rule 6.09(b))."
+    assert len(text.split()) <= count_tokens(text) <= 2 * len(text.split())
+    assert count_tokens("") == 0
+
+
+def test_count_tokens_estimates_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(prompt, "_encoder", lambda: None)
+    text = "The batter becomes a runner when the third strike is not caught (Rule 6.09(b))."
+    assert len(text.split()) <= count_tokens(text) <= 2 * len(text.split())
+
+
+def test_count_tokens_is_exact_with_tiktoken():
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        pytest.skip("o200k_base encoding not available offline")
+    text = "The batter becomes a runner when the third strike is not caught (Rule 6.09(b))."
+    assert count_tokens(text) == len(encoding.encode(text))
+
+
+def test_pack_drops_repeats_overlaps_and_other_divisions():
+    lines = pack_context(CONTEXT, budget=1000, division="Majors A (11U-12U)")
+    assert lines == [
+        "Rule 1.01: Little League Baseball is a game between two teams of nine players each.",
+        "Rule 6.09: The batter becomes a runner when the third strike is not caught, with first base unoccupied or two out.",
+    ]
+
+
+def test_pack_without_division_keeps_variants_apart():
+    lines = pack_context(CONTEXT, budget=1000)
+    assert [line.split(":")[0] for line in lines] == ["Rule 1.01 [maj_up]", "Rule 1.01 [min_down]", "Rule 6.09"]
+
+
+def test_pack_respects_the_budget():
+    budget = count_tokens(pack_context(CONTEXT[:1], budget=1000)[0]) + 5
+    lines = pack_context(CONTEXT, budget=budget, division="Majors")
+    assert len(lines) == 1
+    assert sum(count_tokens(line) for line in lines) <= budget
+
+    long_doc = doc("e", "2.00", "all", "word " * 500)
+    truncated = pack_context([long_doc], budget=50)
+    assert len(truncated) == 1 and count_tokens(truncated[0]) <= 50
+
+
+def test_history_keeps_the_newest_turns_that_fit():
+    history = [("q1", "q1", "old " * 200), ("q2", "q2", "a2"), ("q3", "q3", "a3")]
+    turns, used = fit_history(history, budget=100)
+    assert turns == history[1:]
+    assert used == sum(count_tokens(question) + count_tokens(answer) for question, _, answer in turns)
+    assert fit_history(history, budget=0) == ([], 0)
+
+
+def test_system_prompt_is_sent_once(main):
+    context = [main.retriever._doc(row, match="hybrid") for row in range(5)]
+    messages, answer = asyncio.run(main.rag._prepare("What is the infield fly rule?", context, "rule_reference", "Majors"))
+
+    assert answer is None
+    assert [message["role"] for message in messages] == ["system", "user"]
+    assert messages[0]["content"] == SYSTEM_PROMPT
+    assert SYSTEM_PROMPT not in messages[1]["content"]
+    assert "Question: What is the infield fly rule?" in messages[1]["content"]
+
+
+def test_intents_share_the_response_structure():
+    messages = {intent: build_messages("Why?", ["Rule 2.00: text"], intent) for intent in ("rule_reference", "philosophical", "opinion", "scenario_based")}
+    assert len({m[1]["content"] for m in messages.values()}) == 4
+    assert all(m[0]["content"] == SYSTEM_PROMPT for m in messages.values())
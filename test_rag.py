@@ -1,6 +1,6 @@
 from src.rag import RAG
 from src.retriever import Retriever
-import pandas as pd
+import asyncio
 import json
 
 try:
@@ -11,11 +11,9 @@ try:
     print("DEBUG: Initialized RAG")
     retriever = Retriever(index_path="data/chunks/index/rules.faiss", idmap_path="data/chunks/rules.idmap.csv")
     print("DEBUG: Initialized Retriever")
-    idmap = pd.read_csv("data/chunks/rules.idmap.csv")
-    print("DEBUG: Loaded idmap")
-    context = retriever.retrieve("dropped third strike rule")
+    context = asyncio.run(retriever.retrieve("dropped third strike rule"))
     print(f"DEBUG: Retrieved {len(context)} docs")
-    answer = rag.generate_answer("What is the dropped third strike rule?", context, idmap)
+    answer = asyncio.run(rag.generate_answer("What is the dropped third strike rule?", context))
     print("DEBUG: Answer:", answer[:100])
 except Exception as e:
     print(f"DEBUG: Error: {e}")
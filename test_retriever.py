@@ -0,0 +1,182 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+import pytest
+
+from src.chunk_store import ChunkStore
+from src.embedding_cache import EmbeddingCache
+from src.retriever import Retriever
+
+DIM = 3072
+
+
+class FakeEmbeddings:
+    def __init__(self, vector):
+        self.vector = vector
+        self.calls = 0
+
+    async def create(self, input, model, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=self.vector.tolist())])
+
+
+def build_fixture(tmp_path, n=20):
+    chunks_path = tmp_path / "rules.chunks.jsonl"
+    with open(chunks_path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"chunk-{i}#0", "citation": f"{i}.01", "text": f"Rule text {i} – ünïcode"}) + "\n")
+    vectors = np.random.default_rng(0).standard_normal((n, DIM)).astype("float32")
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors)
+    index_path = tmp_path / "rules.faiss"
+    faiss.write_index(index, str(index_path))
+    idmap_path = tmp_path / "rules.idmap.csv"
+    idmap_path.write_text("source_file,source_line,base_id,new_id\n")
+    return str(chunks_path), str(index_path), str(idmap_path), vectors
+
+
+def test_chunk_store_lookup_by_row(tmp_path):
+    chunks_path, _, _, _ = build_fixture(tmp_path)
+    store = ChunkStore(chunks_path)
+    assert len(store) == 20
+    assert store.get(7)["id"] == "chunk-7#0"
+    assert store.get(19)["text"] == "Rule text 19 – ünïcode"
+    # Callers mutate returned docs, so every lookup must be a fresh copy
+    store.get(3)["distance"] = 1.0
+    assert "distance" not in store.get(3)
+
+
+def test_retrieve_returns_docs_in_faiss_rank_order(tmp_path):
+    chunks_path, index_path, idmap_path, vectors = build_fixture(tmp_path)
+    store = ChunkStore(chunks_path)
+    retriever = Retriever(index_path=index_path, idmap_path=idmap_path, store=store, cache=EmbeddingCache())
+    query = vectors[12] + 0.01 * vectors[4]
+    retriever.client = SimpleNamespace(embeddings=FakeEmbeddings(query))
+
+    docs = asyncio.run(retriever.retrieve("anything", k=5))
+
+    _, expected = retriever.index.search(query.reshape(1, -1), 5)
+    assert [doc["citation"] for doc in docs] == [f"{i}.01" for i in expected[0]]
+    assert docs[0]["citation"] == "12.01"
+    assert docs == sorted(docs, key=lambda doc: doc["distance"])
+
+
+def test_repeat_queries_skip_the_embedding_call(tmp_path):
+    chunks_path, index_path, idmap_path, vectors = build_fixture(tmp_path)
+    retriever = Retriever(index_path=index_path, idmap_path=idmap_path, store=ChunkStore(chunks_path), cache=EmbeddingCache())
+    embeddings = FakeEmbeddings(vectors[2])
+    retriever.client = SimpleNamespace(embeddings=embeddings)
+
+    first = asyncio.run(retriever.retrieve("What is the infield fly rule?"))
+    second = asyncio.run(retriever.retrieve("  what is the INFIELD fly rule "))
+
+    assert embeddings.calls == 1
+    assert first == second
+    assert retriever.cache.stats()["hits"] == 1
+
+
+def test_embedding_cache_evicts_lru_and_persists(tmp_path):
+    db_path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(db_path, max_entries=2)
+    for i in range(3):
+        cache.put(f"q{i}", "m", np.full(4, i, dtype="float32"))
+    assert cache.stats()["size"] == 2
+    assert cache.get("q0", "m") is not None  # Evicted from memory, served from disk
+    assert cache.disk_hits == 1
+    assert cache.get("q0", "other-model") is None
+
+    restarted = EmbeddingCache(db_path, max_entries=2)
+    assert restarted.get("q2", "m").tolist() == [2.0] * 4
+    assert restarted.stats() == {"hits": 1, "disk_hits": 1, "misses": 0, "size": 1}
+
+
+def test_embedding_cache_batches_disk_lookups(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_entries=8)
+    for i in range(3):
+        cache.put(f"q{i}", "m", np.full(4, i, dtype="float32"))
+    restarted = EmbeddingCache(cache.db_path, max_entries=8)
+    restarted.get("q2", "m")
+
+    assert [vector is None for vector in restarted.get_many(["q0", "q2", "new"], "m", disk=False)] == [True, False, True]
+    vectors = restarted.get_many(["q0", "q1", "new", "q0"], "m")
+    assert [None if vector is None else vector[0] for vector in vectors] == [0.0, 1.0, None, 0.0]
+    assert restarted.stats() == {"hits": 5, "disk_hits": 4, "misses": 1, "size": 3}
+
+
+def test_division_filter_only_returns_applicable_chunks(tmp_path):
+    chunks_path, index_path, idmap_path, vectors = build_fixture(tmp_path)
+    divs = ["tb", "maj_up", "min_down", "all", "jr_sr"]
+    with open(chunks_path, "w") as f:
+        for i in range(len(vectors)):
+            f.write(json.dumps({"id": f"chunk-{i}#0", "title": f"rule.{i} • rule • {divs[i % 5]}", "text": "x"}) + "\n")
+    retriever = Retriever(index_path=index_path, idmap_path=idmap_path, store=ChunkStore(chunks_path), cache=EmbeddingCache())
+    retriever.client = SimpleNamespace(embeddings=FakeEmbeddings(vectors[0]))
+
+    def divs_for(division):
+        docs = asyncio.run(retriever.retrieve("q", k=5, division=division))
+        return {doc["title"].rsplit(" ", 1)[-1] for doc in docs}
+
+    assert divs_for("Majors A (11U-12U)") == {"maj_up", "all"}
+    assert divs_for("Tee Ball") == {"tb", "min_down", "all"}
+    assert divs_for("Juniors (13U-14U)") == {"maj_up", "all", "jr_sr"}
+    assert len(divs_for("No Filters")) > 3
+    assert asyncio.run(retriever.retrieve("q", k=5, division="Tee Ball"))[0]["title"].endswith("tb")
+
+
+def test_compressed_reduced_dimension_indexes(tmp_path, monkeypatch):
+    import src.retriever
+    from src.build_index import build_faiss_index
+
+    dim = 256
+    monkeypatch.setattr(src.retriever, "EMBED_DIM", dim)
+    chunks_path, _, idmap_path, _ = build_fixture(tmp_path, n=300)
+    vectors = np.random.default_rng(1).standard_normal((300, dim)).astype("float32")
+    for factory in ["SQ8", "IVF4,Flat", "PQ16x4"]:  # PQ has no id-selector support: divisions are post-filtered
+        index_path = str(tmp_path / f"{factory}.faiss")
+        faiss.write_index(build_faiss_index(vectors, factory), index_path)
+        retriever = Retriever(index_path=index_path, idmap_path=idmap_path, store=ChunkStore(chunks_path), cache=EmbeddingCache())
+        embeddings = FakeEmbeddings(vectors[42])
+        retriever.client = SimpleNamespace(embeddings=embeddings)
+        docs = asyncio.run(retriever.retrieve("q", k=5, division="Majors"))
+        assert docs[0]["citation"] == "42.01", factory
+        assert retriever.model_key == f"text-embedding-3-large@{dim}"
+
+    with pytest.raises(ValueError, match="EMBED_DIM"):
+        monkeypatch.setattr(src.retriever, "EMBED_DIM", 3072)
+        Retriever(index_path=index_path, idmap_path=idmap_path, store=ChunkStore(chunks_path), cache=EmbeddingCache())
+
+
+def test_mmapped_vectors_match_the_faiss_index(tmp_path):
+    from src.build_index import build_faiss_index
+    from src.mmap_index import MmapFlatIndex, flat_vectors, write_vectors
+
+    chunks_path, index_path, idmap_path, vectors = build_fixture(tmp_path)
+    divs = ["tb", "maj_up", "min_down", "all", "jr_sr"]
+    with open(chunks_path, "w") as f:
+        for i in range(len(vectors)):
+            f.write(json.dumps({"id": f"chunk-{i}#0", "title": f"rule.{i} • rule • {divs[i % 5]}", "text": "x"}) + "\n")
+    vectors_path = str(tmp_path / "rules.vectors.npy")
+    write_vectors(flat_vectors(faiss.read_index(index_path)), vectors_path)
+    assert flat_vectors(build_faiss_index(vectors[:, :64].copy(), "SQ8")) is None
+
+    retrievers = [
+        Retriever(index_path=index_path, idmap_path=idmap_path, store=ChunkStore(chunks_path), cache=EmbeddingCache(), vectors_path=path)
+        for path in [None, vectors_path]
+    ]
+    assert isinstance(retrievers[1].index, MmapFlatIndex) and not retrievers[1].index.vectors.flags.writeable
+    query = vectors[7] + 0.3 * vectors[11]
+    for retriever in retrievers:
+        retriever.client = SimpleNamespace(embeddings=FakeEmbeddings(query))
+    for division in [None, "Majors A (11U-12U)", "Tee Ball"]:
+        faiss_docs, mmap_docs = (asyncio.run(retriever.retrieve("q", k=5, division=division)) for retriever in retrievers)
+        assert [doc["id"] for doc in mmap_docs] == [doc["id"] for doc in faiss_docs]
+        assert [doc["distance"] for doc in mmap_docs] == pytest.approx([doc["distance"] for doc in faiss_docs], rel=1e-4)
+
+    # Fewer rows in the division than asked for: padded with -1 like faiss
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[[3, 5]] = True
+    _, indices = retrievers[1].index.search(query.reshape(1, -1), 4, params=mask)
+    assert sorted(indices[0][:2]) == [3, 5] and list(indices[0][2:]) == [-1, -1]
@@ -0,0 +1,25 @@
+import json
+
+from src.rule_catalog import RuleCatalog, rule_label
+
+
+def test_labels_follow_rulebook_citations():
+    assert rule_label("6.09(b)", "rule.6.09.b • rule • all") == "Rule 6.09(b)"
+    assert rule_label("7.13", "rule.7.13 • note(1) • all") == "Rule 7.13 NOTE 1"
+    assert rule_label("1.1", "rule.1.1.p1 • rule • all") == "Rule 1.10"
+    assert rule_label("2", "rule.2.005.balk • def • all") == "Rule 2.00 (Balk)"
+    assert rule_label("8.05", "rule.8.05 • pen • maj_down") == "Rule 8.05 PENALTY"
+
+
+def test_catalog_from_meta_and_idmap():
+    with open("data/chunks/index/meta.json") as f:
+        meta = json.load(f)
+    catalog = RuleCatalog.from_meta(meta, "data/chunks/rules.idmap.csv")
+    assert len(catalog) == len(meta["ids"])
+    row = meta["ids"].index("lli-bb-x-rule.1.01-x-note1-min_up#0")
+    assert catalog.row("lli-bb-x-rule.1.01-x-note1-min_up#0") == row
+    assert catalog.chunk_id(row) == meta["ids"][row]
+    assert catalog.label(row) == "Rule 1.01 NOTE 1"
+    # Rows from the same source file keep their own source line
+    assert catalog.sources[row] == ("RULE_1_Objectives_of_the_Game.stable.20250928-2213.jsonl", "25")
+    assert catalog.sources[0][1] != catalog.sources[row][1]
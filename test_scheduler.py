@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from conftest import request
+from src import metrics, scheduler
+from src.scheduler import Limiter, Overloaded
+
+
+def test_limiter_caps_concurrency_in_fifo_order():
+    async def run():
+        limiter, running, peak, order = Limiter("test", limit=2, max_wait=5.0, service_time=0.01), 0, 0, []
+
+        async def work(n):
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                order.append(n)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(work(n) for n in range(8)))
+        return peak, order, limiter.in_flight
+
+    peak, order, in_flight = asyncio.run(run())
+    assert peak == 2
+    assert order == list(range(8))
+    assert in_flight == 0
+
+
+def test_over_budget_calls_are_shed_fast():
+    async def run():
+        limiter = Limiter("test", limit=1, max_wait=0.5, service_time=10.0)
+        async with limiter.slot():
+            start = time.perf_counter()
+            with pytest.raises(Overloaded) as shed:
+                async with limiter.slot():
+                    pass
+            return time.perf_counter() - start, shed.value
+
+    elapsed, shed = asyncio.run(run())
+    assert elapsed < 0.05  # Refused without queueing
+    assert shed.status_code == 503 and shed.retry_after_header == "10"
+
+
+def test_queue_wait_is_bounded_and_cancelled_waiters_pass_their_slot_on():
+    async def run():
+        limiter = Limiter("test", limit=1, max_wait=0.05, service_time=0.01)
+
+        async def hold(seconds):
+            async with limiter.slot():
+                await asyncio.sleep(seconds)
+
+        holder = asyncio.ensure_future(hold(0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+        waiter = asyncio.ensure_future(hold(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        return limiter.in_flight, limiter.waiting
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_saturated_chat_sheds_with_retry_after(main, monkeypatch):
+    monkeypatch.setattr(scheduler.CHAT, "in_flight", scheduler.CHAT.limit)
+    monkeypatch.setattr(scheduler.CHAT, "service_time", 60.0)
+    shed = metrics.SHED.value(upstream="chat", reason="expected_wait")
+
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "60"
+    assert main.fake_openai.calls == {"embeddings": 1, "chat": 0}  # Shed before the completion
+    assert metrics.SHED.value(upstream="chat", reason="expected_wait") == shed + 1
+
+
+def test_saturated_chat_still_serves_answers_that_need_no_completion(main, monkeypatch):
+    assert request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"}).status_code == 200
+    monkeypatch.setattr(scheduler.CHAT, "in_flight", scheduler.CHAT.limit)
+    monkeypatch.setattr(scheduler.CHAT, "service_time", 60.0)
+
+    cached = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+    fixed = request(main.app, "GET", "/query", params={"question": "Was the umpire right to call the runner out?"})
+
+    assert cached.status_code == 200 and fixed.status_code == 200
+    assert "more info" in fixed.json()["answer"]
+    assert main.fake_openai.calls["chat"] == 1
+
+
+def test_openai_rate_limits_become_429(main):
+    async def rate_limited(**kwargs):
+        response = httpx.Response(429, headers={"retry-after": "7"}, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+    main.fake_openai.chat.completions.create = rate_limited
+    response = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "7"
@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+import time
+
+from conftest import request
+from src.sessions import SessionStore, standalone_query
+
+HISTORY = [("What is the infield fly rule?", "What is the infield fly rule?", "**Ruling**: ...")]
+
+
+def test_follow_ups_are_rewritten_standalone():
+    assert standalone_query("What about with two outs?", HISTORY) == "What is the infield fly rule? What about with two outs?"
+    assert standalone_query("Does it apply with a runner on first only?", HISTORY).startswith("What is the infield fly rule?")
+    # Self-contained questions and rule citations are searched as asked
+    assert standalone_query("Can the pitcher fake a throw to first base from the rubber?", HISTORY) == "Can the pitcher fake a throw to first base from the rubber?"
+    assert standalone_query("And Rule 6.09(b)?", HISTORY) == "And Rule 6.09(b)?"
+    assert standalone_query("What about with two outs?", []) == "What about with two outs?"
+    assert standalone_query("Where does that rule come from?", HISTORY).startswith("What is the infield fly rule?")
+
+
+def test_only_explicit_follow_ups_are_rewritten_and_rewrites_do_not_chain():
+    scenario = [("Runner on first, was the umpire call right?", "Runner on first, was the umpire call right?", "...")]
+    # Short, but a question of its own
+    assert standalone_query("What is a balk?", scenario) == "What is a balk?"
+    assert standalone_query("Is this a balk?", scenario) == "Is this a balk?"
+    follow_up = [("What about with two outs?", "What is the infield fly rule? What about with two outs?", "...")]
+    assert standalone_query("And if the ball is foul?", follow_up) == "What about with two outs? And if the ball is foul?"
+
+
+def test_a_standalone_question_after_a_scenario_keeps_its_own_intent(main):
+    first = request(main.app, "GET", "/query", params={"question": "Runner on first, was the umpire call right?"}).json()
+    assert "more info" in first["answer"]
+    second = request(main.app, "GET", "/query", params={"question": "What is a balk?", "session_id": first["session_id"]}).json()
+    assert "more info" not in second["answer"]
+    main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        assert conn.execute("SELECT query_type FROM interactions WHERE query_text = 'What is a balk?'").fetchone() == ("rule_reference",)
+
+
+def test_store_keeps_recent_turns_and_expires(monkeypatch):
+    store = SessionStore(max_sessions=2, ttl=60, max_turns=2)
+    store.open("a", "Majors")
+    for n in range(3):
+        store.append("a", f"q{n}", f"q{n}", f"a{n}")
+    assert [turn[0] for turn in store.history("a")] == ["q1", "q2"]
+    assert store.open("a")["division"] == "Majors"
+
+    store.append("never-opened", "q", "q", "a")  # Batch sessions are not conversations
+    assert store.history("never-opened") == []
+
+    store.open("b")
+    store.open("c")
+    assert store.history("a") == [] and len(store) == 2  # Least recently used session evicted
+
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.open("c")["turns"] == []
+
+
+def test_sqlite_backing_survives_restarts(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(db_path=db_path)
+    store.open("s", "Minors")
+    store.append("s", "What is a balk?", "What is a balk?", "**Ruling**: ...")
+
+    restarted = SessionStore(db_path=db_path)
+    session = restarted.open("s")
+    assert session["division"] == "Minors"
+    assert session["turns"] == [("What is a balk?", "What is a balk?", "**Ruling**: ...")]
+
+
+def test_no_filters_clears_the_session_division(main):
+    session_id, division, *_ = asyncio.run(main.start_turn("What is a balk?", division="Tee Ball"))
+    assert division == "Tee Ball"
+    assert asyncio.run(main.start_turn("And a catcher's interference?", session_id))[1] == "Tee Ball"
+    assert asyncio.run(main.start_turn("And obstruction?", session_id, "No Filters"))[1] == "All"
+    assert asyncio.run(main.start_turn("And an appeal?", session_id))[1] == "All"
+
+
+def test_follow_up_embeds_a_compact_query_and_generates_with_history(main, monkeypatch):
+    prepared = []
+    prepare = main.rag._prepare
+
+    async def recording(query, context, intent, division=None, history=()):
+        messages, answer = await prepare(query, context, intent, division, history)
+        prepared.append(messages)
+        return messages, answer
+
+    monkeypatch.setattr(main.rag, "_prepare", recording)
+    first = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?", "division": "Majors"}).json()
+    second = request(main.app, "GET", "/query", params={"question": "Why does it exist?", "session_id": first["session_id"]}).json()
+
+    assert second["session_id"] == first["session_id"]
+    assert main.fake_openai.embedded == [["What is the infield fly rule?"], ["What is the infield fly rule? Why does it exist?"]]
+    roles = [message["role"] for message in prepared[-1]]
+    assert roles == ["system", "user", "assistant", "user"]
+    assert prepared[-1][1]["content"] == "What is the infield fly rule?"
+    assert prepared[-1][2]["content"] == first["answer"]
+
+
+def test_follow_ups_bypass_the_answer_cache(main):
+    context = asyncio.run(main.retriever.retrieve("What is the infield fly rule?"))
+    answer = lambda history=(): asyncio.run(main.generate_or_reuse_answer("What is the infield fly rule?", context, "All", "rule_reference", history))
+
+    assert answer(HISTORY)[2] == "OpenAI"
+    assert answer()[2] == "OpenAI"  # The follow-up's answer was not stored
+    assert answer()[2] == "AnswerCache"
+    assert answer(HISTORY)[2] == "OpenAI"
+    assert main.fake_openai.calls["chat"] == 3
+
+
+def test_a_standalone_second_question_is_answered_from_the_cache(main):
+    first = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"}).json()
+    assert asyncio.run(main.start_turn("What is a balk?", first["session_id"]))[4] == []  # Not a follow-up: no history
+
+    other = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?"}).json()
+    again = request(main.app, "GET", "/query", params={"question": "What is the infield fly rule?", "session_id": other["session_id"]}).json()
+    assert again["answer"] == first["answer"]
+    assert main.fake_openai.calls["chat"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from conftest import app_client
+from src.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    async def run():
+        flight, runs = SingleFlight(), []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(5)), flight.run("other", work))
+        return results, runs, len(flight)
+
+    results, runs, pending = asyncio.run(run())
+    assert results[:5] == [("answer", False)] + [("answer", True)] * 4
+    assert results[5] == ("answer", False)
+    assert len(runs) == 2 and pending == 0
+
+
+def test_errors_are_shared_and_not_remembered():
+    async def run():
+        flight, calls = SingleFlight(), []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.run("key", failing) for _ in range(3)), return_exceptions=True)
+        with pytest.raises(ValueError):
+            await flight.run("key", failing)
+        return results, calls
+
+    results, calls = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        first = asyncio.ensure_future(flight.run("key", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.run("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == ("answer", True)
+
+
+def test_identical_questions_in_flight_are_answered_once(main):
+    main.fake_openai.latency = 0.05
+
+    async def run():
+        async with app_client(main.app) as client:
+            return await asyncio.gather(*(
+                client.get("/query", params={"question": question})
+                for question in ["What is the infield fly rule?"] * 4 + ["what is the  infield fly rule"]
+            ))
+
+    responses = [response.json() for response in asyncio.run(run())]
+    assert len({response["answer"] for response in responses}) == 1
+    assert len({response["interaction_id"] for response in responses}) == 5
+    assert main.fake_openai.calls["embeddings"] == 1
+    assert main.fake_openai.calls["chat"] <= 2  # At most one intent call and one completion
+
+    main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        rows = conn.execute("SELECT api_used, tokens_used FROM interactions").fetchall()
+    assert sorted(rows) == [("Coalesced", 0)] * 4 + [("OpenAI", 42)]
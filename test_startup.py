@@ -0,0 +1,41 @@
+import json
+import os
+
+from conftest import request
+from src.bundle import Bundle, write_bundle
+
+
+def test_write_bundle_is_versioned_and_idempotent(data_dir, tmp_path):
+    source = Bundle.from_build(str(data_dir / "data" / "chunks"))
+    bundle = write_bundle(source, str(tmp_path / "bundles"))
+    assert open(tmp_path / "bundles" / "CURRENT").read().strip() == bundle.version
+    with open(os.path.join(tmp_path, "bundles", bundle.version, "manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["ntotal"] == 906 and set(manifest["files"]) == {"rules.faiss", "meta.json", "rules.chunks.jsonl", "rules.idmap.csv"}
+    assert manifest["vectors"] == "rules.vectors.npy" and bundle.paths["vectors"].endswith("rules.vectors.npy")
+    assert write_bundle(source, str(tmp_path / "bundles")).version == bundle.version
+    assert Bundle.open(str(tmp_path / "bundles")).paths == bundle.paths
+
+
+def test_readiness_follows_loading(cold_main, monkeypatch):
+    bundle = write_bundle(Bundle.from_build("data/chunks"), "bundles")
+    monkeypatch.setattr(cold_main, "BUNDLE_PATH", "bundles")
+    assert cold_main.retriever is None
+    assert request(cold_main.app, "GET", "/healthz").status_code == 200
+    response = request(cold_main.app, "GET", "/readyz")
+    assert response.status_code == 503 and response.json()["status"] == "loading"
+
+    cold_main.load_services()
+    response = request(cold_main.app, "GET", "/readyz")
+    assert response.status_code == 200
+    assert response.json()["bundle"] == bundle.version
+    assert type(cold_main.retriever.index).__name__ == "MmapFlatIndex"  # Shared by all workers through the page cache
+    assert {"imports", "meta", "chunk_store", "catalog", "rag", "retriever"} <= set(response.json()["startup"])
+
+
+def test_failed_load_is_reported(cold_main, monkeypatch):
+    monkeypatch.setattr(cold_main, "BUNDLE_PATH", "missing")
+    response = request(cold_main.app, "GET", "/query?question=What+is+a+balk")
+    assert response.status_code == 503
+    response = request(cold_main.app, "GET", "/readyz")
+    assert response.status_code == 503 and response.json()["status"] == "failed"
@@ -0,0 +1,41 @@
+import asyncio
+import json
+import sqlite3
+
+from conftest import app_client
+
+
+async def stream_events(app, path, question):
+    async with app_client(app) as client:
+        async with client.stream("GET", path, params={"question": question}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events, event = [], None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_query_stream_sends_tokens_then_logs_the_full_answer(main):
+    events = asyncio.run(stream_events(main.app, "/query/stream", "What is the infield fly rule?"))
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert events[-1][0] == "done"
+    done = events[-1][1]
+    assert done["answer"] == "".join(tokens) == "**Ruling**: Fake answer.\n**Rule References**: Rule 6.09(b)"
+    assert done["tokens_used"] == 42
+
+    main.logger.flush()
+    with sqlite3.connect("logs/app_data.db") as conn:
+        response, tokens_used = conn.execute("SELECT response, tokens_used FROM interactions ORDER BY id DESC LIMIT 1").fetchone()
+    assert (response, tokens_used) == (done["answer"], 42)
+
+
+def test_validate_call_stream_short_circuits_non_scenarios(main):
+    events = asyncio.run(stream_events(main.app, "/validate_call/stream", "What is the infield fly rule?"))
+    assert [event for event, _ in events] == ["token", "done"]
+    assert events[-1][1]["answer"].startswith("This endpoint is for validating umpire calls")
+    assert main.fake_openai.calls["chat"] == 0